@@ -0,0 +1,399 @@
+"""initial schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('crops',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('type', sa.String(), nullable=True),
+    sa.Column('variety', sa.String(), nullable=True),
+    sa.Column('planting_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('harvest_date_est', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('location', sa.String(), nullable=True),
+    sa.Column('image_url', sa.String(), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_crops_id'), 'crops', ['id'], unique=False)
+    op.create_index(op.f('ix_crops_name'), 'crops', ['name'], unique=False)
+
+    op.create_table('inventory',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('category', sa.String(), nullable=True),
+    sa.Column('quantity', sa.Float(), nullable=True),
+    sa.Column('unit', sa.String(), nullable=True),
+    sa.Column('low_stock_threshold', sa.Float(), nullable=True),
+    sa.Column('image_url', sa.String(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_inventory_id'), 'inventory', ['id'], unique=False)
+    op.create_index('ix_inventory_low_stock', 'inventory', ['id'], unique=False, postgresql_where=sa.text('quantity <= low_stock_threshold'), sqlite_where=sa.text('quantity <= low_stock_threshold'))
+    op.create_index(op.f('ix_inventory_name'), 'inventory', ['name'], unique=False)
+
+    op.create_table('livestock',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('breed', sa.String(), nullable=True),
+    sa.Column('birth_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('health_status', sa.String(), nullable=True),
+    sa.Column('image_url', sa.String(), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_livestock_id'), 'livestock', ['id'], unique=False)
+    op.create_index(op.f('ix_livestock_name'), 'livestock', ['name'], unique=False)
+
+    op.create_table('reports',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=True),
+    sa.Column('type', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_reports_id'), 'reports', ['id'], unique=False)
+
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('hashed_password', sa.String(), nullable=False),
+    sa.Column('full_name', sa.String(), nullable=True),
+    sa.Column('role', sa.String(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+
+    op.create_table('stock_movements',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('change', sa.Float(), nullable=False),
+    sa.Column('balance_after', sa.Float(), nullable=False),
+    sa.Column('reason', sa.String(), nullable=True),
+    sa.Column('note', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['item_id'], ['inventory.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_stock_movements_id'), 'stock_movements', ['id'], unique=False)
+    op.create_index('ix_stock_movements_item_created', 'stock_movements', ['item_id', 'created_at'], unique=False)
+
+    op.create_table('tasks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('due_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('is_completed', sa.Boolean(), nullable=True),
+    sa.Column('assigned_to_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['assigned_to_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_tasks_id'), 'tasks', ['id'], unique=False)
+    op.create_index(op.f('ix_tasks_title'), 'tasks', ['title'], unique=False)
+
+    op.create_table('avocadoharvest',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('variety', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('quantity_kg', sa.Float(), nullable=False),
+    sa.Column('grade', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=True),
+    sa.Column('notes', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('avocadosale',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('quantity_kg', sa.Float(), nullable=False),
+    sa.Column('price_per_kg', sa.Float(), nullable=False),
+    sa.Column('buyer_name', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('date', sa.DateTime(), nullable=True),
+    sa.Column('payment_status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('notes', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('avocadostock',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('variety', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('grade', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('harvested_kg', sa.Float(), nullable=False),
+    sa.Column('sold_kg', sa.Float(), nullable=False),
+    sa.Column('unsold_kg', sa.Float(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('harvest_records', sa.Integer(), nullable=False),
+    sa.Column('sales_records', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('variety', 'grade')
+    )
+    op.create_index(op.f('ix_avocadostock_variety'), 'avocadostock', ['variety'], unique=False)
+
+    op.create_table('cow',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tag_no', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('breed', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('lactation_no', sa.Integer(), nullable=False),
+    sa.Column('age', sa.Integer(), nullable=True),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('dog',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('breed', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('gender', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('dob', sa.DateTime(), nullable=True),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('factory',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('rate_per_kg', sa.Float(), nullable=False),
+    sa.Column('transport_deduction', sa.Float(), nullable=False),
+    sa.Column('location', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('contact', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('active', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('flock',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('breed', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('date_added', sa.DateTime(), nullable=True),
+    sa.Column('current_count', sa.Integer(), nullable=False),
+    sa.Column('mortality', sa.Integer(), nullable=False),
+    sa.Column('housing_unit', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('staff',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('role', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('pay_type', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('pay_rate', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_staff_name'), 'staff', ['name'], unique=False)
+
+    op.create_table('transaction',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=True),
+    sa.Column('category', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('description', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('unit', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('avocadostockmovement',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('stock_id', sa.Integer(), nullable=False),
+    sa.Column('source', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('harvested_kg', sa.Float(), nullable=False),
+    sa.Column('sold_kg', sa.Float(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('balance_kg', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['stock_id'], ['avocadostock.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_avocadostockmovement_source_id'), 'avocadostockmovement', ['source_id'], unique=False)
+    op.create_index(op.f('ix_avocadostockmovement_stock_id'), 'avocadostockmovement', ['stock_id'], unique=False)
+
+    op.create_table('bonuspayment',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('factory_id', sa.Integer(), nullable=False),
+    sa.Column('period', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('date_received', sa.DateTime(), nullable=True),
+    sa.Column('fertilizer_deductions', sa.Float(), nullable=False),
+    sa.Column('net_bonus', sa.Float(), nullable=False),
+    sa.Column('notes', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.ForeignKeyConstraint(['factory_id'], ['factory.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_bonuspayment_factory_id'), 'bonuspayment', ['factory_id'], unique=False)
+
+    op.create_table('eggproduction',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('flock_id', sa.Integer(), nullable=False),
+    sa.Column('date_collected', sa.DateTime(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('broken', sa.Integer(), nullable=False),
+    sa.Column('comments', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.ForeignKeyConstraint(['flock_id'], ['flock.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_eggproduction_date_collected'), 'eggproduction', ['date_collected'], unique=False)
+    op.create_index(op.f('ix_eggproduction_flock_id'), 'eggproduction', ['flock_id'], unique=False)
+
+    op.create_table('fertilizerpurchase',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('factory_id', sa.Integer(), nullable=False),
+    sa.Column('bags', sa.Integer(), nullable=False),
+    sa.Column('cost_per_bag', sa.Float(), nullable=False),
+    sa.Column('total_cost', sa.Float(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=True),
+    sa.Column('payment_method', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('paid', sa.Boolean(), nullable=False),
+    sa.Column('payment_date', sa.DateTime(), nullable=True),
+    sa.Column('notes', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.ForeignKeyConstraint(['factory_id'], ['factory.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_fertilizerpurchase_factory_id'), 'fertilizerpurchase', ['factory_id'], unique=False)
+
+    op.create_table('litter',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('mother_id', sa.Integer(), nullable=False),
+    sa.Column('father_id', sa.Integer(), nullable=True),
+    sa.Column('date_of_birth', sa.DateTime(), nullable=True),
+    sa.Column('puppies_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['father_id'], ['dog.id'], ),
+    sa.ForeignKeyConstraint(['mother_id'], ['dog.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('milkrecord',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cow_id', sa.Integer(), nullable=False),
+    sa.Column('date_recorded', sa.DateTime(), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('notes', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.ForeignKeyConstraint(['cow_id'], ['cow.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_milkrecord_cow_id'), 'milkrecord', ['cow_id'], unique=False)
+    op.create_index(op.f('ix_milkrecord_date_recorded'), 'milkrecord', ['date_recorded'], unique=False)
+
+    op.create_table('monthlypayroll',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('worker_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('total_kg', sa.Float(), nullable=False),
+    sa.Column('gross_earnings', sa.Float(), nullable=False),
+    sa.Column('total_advances', sa.Float(), nullable=False),
+    sa.Column('net_pay', sa.Float(), nullable=False),
+    sa.Column('paid', sa.Boolean(), nullable=False),
+    sa.Column('payment_date', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['worker_id'], ['staff.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_monthlypayroll_worker_id'), 'monthlypayroll', ['worker_id'], unique=False)
+
+    op.create_table('teaplucking',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('worker_id', sa.Integer(), nullable=False),
+    sa.Column('factory_id', sa.Integer(), nullable=True),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=True),
+    sa.Column('comment', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('worker_rate', sa.Float(), nullable=True),
+    sa.Column('factory_rate', sa.Float(), nullable=True),
+    sa.Column('transport_deduction', sa.Float(), nullable=True),
+    sa.Column('worker_payment', sa.Float(), nullable=True),
+    sa.Column('factory_gross', sa.Float(), nullable=True),
+    sa.Column('factory_net_to_farm', sa.Float(), nullable=True),
+    sa.Column('farm_profit', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['factory_id'], ['factory.id'], ),
+    sa.ForeignKeyConstraint(['worker_id'], ['staff.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_teaplucking_date'), 'teaplucking', ['date'], unique=False)
+    op.create_index(op.f('ix_teaplucking_factory_id'), 'teaplucking', ['factory_id'], unique=False)
+    op.create_index(op.f('ix_teaplucking_worker_id'), 'teaplucking', ['worker_id'], unique=False)
+
+    op.create_table('workeradvance',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('worker_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=True),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('deducted', sa.Boolean(), nullable=False),
+    sa.Column('notes', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.ForeignKeyConstraint(['worker_id'], ['staff.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_workeradvance_worker_id'), 'workeradvance', ['worker_id'], unique=False)
+
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_workeradvance_worker_id'), table_name='workeradvance')
+    op.drop_table('workeradvance')
+    op.drop_index(op.f('ix_teaplucking_worker_id'), table_name='teaplucking')
+    op.drop_index(op.f('ix_teaplucking_factory_id'), table_name='teaplucking')
+    op.drop_index(op.f('ix_teaplucking_date'), table_name='teaplucking')
+    op.drop_table('teaplucking')
+    op.drop_index(op.f('ix_monthlypayroll_worker_id'), table_name='monthlypayroll')
+    op.drop_table('monthlypayroll')
+    op.drop_index(op.f('ix_milkrecord_date_recorded'), table_name='milkrecord')
+    op.drop_index(op.f('ix_milkrecord_cow_id'), table_name='milkrecord')
+    op.drop_table('milkrecord')
+    op.drop_table('litter')
+    op.drop_index(op.f('ix_fertilizerpurchase_factory_id'), table_name='fertilizerpurchase')
+    op.drop_table('fertilizerpurchase')
+    op.drop_index(op.f('ix_eggproduction_flock_id'), table_name='eggproduction')
+    op.drop_index(op.f('ix_eggproduction_date_collected'), table_name='eggproduction')
+    op.drop_table('eggproduction')
+    op.drop_index(op.f('ix_bonuspayment_factory_id'), table_name='bonuspayment')
+    op.drop_table('bonuspayment')
+    op.drop_index(op.f('ix_avocadostockmovement_stock_id'), table_name='avocadostockmovement')
+    op.drop_index(op.f('ix_avocadostockmovement_source_id'), table_name='avocadostockmovement')
+    op.drop_table('avocadostockmovement')
+    op.drop_table('transaction')
+    op.drop_index(op.f('ix_staff_name'), table_name='staff')
+    op.drop_table('staff')
+    op.drop_table('flock')
+    op.drop_table('factory')
+    op.drop_table('dog')
+    op.drop_table('cow')
+    op.drop_index(op.f('ix_avocadostock_variety'), table_name='avocadostock')
+    op.drop_table('avocadostock')
+    op.drop_table('avocadosale')
+    op.drop_table('avocadoharvest')
+    op.drop_index(op.f('ix_tasks_title'), table_name='tasks')
+    op.drop_index(op.f('ix_tasks_id'), table_name='tasks')
+    op.drop_table('tasks')
+    op.drop_index('ix_stock_movements_item_created', table_name='stock_movements')
+    op.drop_index(op.f('ix_stock_movements_id'), table_name='stock_movements')
+    op.drop_table('stock_movements')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+    op.drop_index(op.f('ix_reports_id'), table_name='reports')
+    op.drop_table('reports')
+    op.drop_index(op.f('ix_livestock_name'), table_name='livestock')
+    op.drop_index(op.f('ix_livestock_id'), table_name='livestock')
+    op.drop_table('livestock')
+    op.drop_index(op.f('ix_inventory_name'), table_name='inventory')
+    op.drop_index('ix_inventory_low_stock', table_name='inventory', postgresql_where=sa.text('quantity <= low_stock_threshold'), sqlite_where=sa.text('quantity <= low_stock_threshold'))
+    op.drop_index(op.f('ix_inventory_id'), table_name='inventory')
+    op.drop_table('inventory')
+    op.drop_index(op.f('ix_crops_name'), table_name='crops')
+    op.drop_index(op.f('ix_crops_id'), table_name='crops')
+    op.drop_table('crops')
@@ -0,0 +1,123 @@
+"""partition teaplucking and milkrecord by year
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 12:00:00.000000
+
+Postgres only: each table is rebuilt as a RANGE-partitioned table with one
+partition per year of existing data (plus the next year) and a DEFAULT
+partition. The primary key becomes (id, <date column>) because Postgres
+requires the partition key in every unique constraint; ids keep coming from
+the original sequence. app/core/partitions.py creates later years.
+
+On SQLite this revision is a no-op and the tables stay as they are.
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+YEARS_AHEAD = 1
+
+
+def _teaplucking_columns(partitioned: bool):
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('teaplucking_id_seq'::regclass)"), nullable=False),
+        sa.Column('worker_id', sa.Integer(), nullable=False),
+        sa.Column('factory_id', sa.Integer(), nullable=True),
+        sa.Column('quantity', sa.Float(), nullable=False),
+        sa.Column('date', sa.DateTime(), nullable=not partitioned),
+        sa.Column('comment', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column('worker_rate', sa.Float(), nullable=True),
+        sa.Column('factory_rate', sa.Float(), nullable=True),
+        sa.Column('transport_deduction', sa.Float(), nullable=True),
+        sa.Column('worker_payment', sa.Float(), nullable=True),
+        sa.Column('factory_gross', sa.Float(), nullable=True),
+        sa.Column('factory_net_to_farm', sa.Float(), nullable=True),
+        sa.Column('farm_profit', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['factory_id'], ['factory.id'], ),
+        sa.ForeignKeyConstraint(['worker_id'], ['staff.id'], ),
+        sa.PrimaryKeyConstraint(*(['id', 'date'] if partitioned else ['id'])),
+    ]
+
+
+def _milkrecord_columns(partitioned: bool):
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('milkrecord_id_seq'::regclass)"), nullable=False),
+        sa.Column('cow_id', sa.Integer(), nullable=False),
+        sa.Column('date_recorded', sa.DateTime(), nullable=False),
+        sa.Column('quantity', sa.Float(), nullable=False),
+        sa.Column('notes', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.ForeignKeyConstraint(['cow_id'], ['cow.id'], ),
+        sa.PrimaryKeyConstraint(*(['id', 'date_recorded'] if partitioned else ['id'])),
+    ]
+
+
+# table -> (partition key, column factory, indexed columns)
+TABLES = {
+    'teaplucking': ('date', _teaplucking_columns, ['date', 'factory_id', 'worker_id']),
+    'milkrecord': ('date_recorded', _milkrecord_columns, ['cow_id', 'date_recorded']),
+}
+
+
+def _rebuild(table: str, partitioned: bool) -> None:
+    """Swap ``table`` for a partitioned (or plain) copy holding the same rows"""
+    key, columns, indexed = TABLES[table]
+    old = f'{table}_{"unpartitioned" if partitioned else "partitioned"}'
+    bind = op.get_bind()
+
+    op.rename_table(table, old)
+    op.execute(f'ALTER INDEX {table}_pkey RENAME TO {old}_pkey')
+    for column in indexed:
+        op.drop_index(f'ix_{table}_{column}', table_name=old)
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY NONE')
+
+    if partitioned:
+        # The partition key is part of the primary key, so it cannot be NULL;
+        # the API always stamps a date, this only catches legacy rows
+        op.execute(f'UPDATE {old} SET {key} = CURRENT_TIMESTAMP WHERE {key} IS NULL')
+        op.create_table(table, *columns(True), postgresql_partition_by=f'RANGE ({key})')
+    else:
+        op.create_table(table, *columns(False))
+    for column in indexed:
+        op.create_index(f'ix_{table}_{column}', table, [column], unique=False)
+
+    if partitioned:
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+        first, last = bind.execute(sa.text(
+            f'SELECT min(extract(year FROM {key})), max(extract(year FROM {key})) FROM {old}'
+        )).one()
+        this_year = date.today().year
+        first = int(first) if first is not None else this_year
+        last = max(int(last) if last is not None else this_year, this_year) + YEARS_AHEAD
+        for year in range(first, last + 1):
+            op.execute(
+                f"CREATE TABLE {table}_y{year} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+            )
+
+    names = ', '.join(column.name for column in columns(partitioned) if isinstance(column, sa.Column))
+    op.execute(f'INSERT INTO {table} ({names}) SELECT {names} FROM {old}')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    op.drop_table(old)  # drops the old partitions along with a partitioned parent
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        _rebuild(table, partitioned=True)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        _rebuild(table, partitioned=False)
@@ -0,0 +1,36 @@
+"""archived periods
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 17:29:28.747106
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('archivedperiod',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('table_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('path', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('table_name', 'year')
+    )
+    op.create_index(op.f('ix_archivedperiod_table_name'), 'archivedperiod', ['table_name'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_archivedperiod_table_name'), table_name='archivedperiod')
+    op.drop_table('archivedperiod')
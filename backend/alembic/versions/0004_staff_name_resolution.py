@@ -0,0 +1,58 @@
+"""staff name resolution
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 17:41:59.628894
+
+Adds staff.normalized_name (backfilled here, maintained by
+app/services/name_resolution.py afterwards) and the staffalias table of
+confirmed alternative spellings.
+"""
+import re
+import unicodedata
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def _normalize(name):
+    # Frozen copy of name_resolution.normalize_name as of this revision
+    folded = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode()
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', folded.lower()).split())
+
+
+def upgrade() -> None:
+    op.create_table('staffalias',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('staff_id', sa.Integer(), nullable=False),
+    sa.Column('alias', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['staff_id'], ['staff.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('alias')
+    )
+    op.create_index(op.f('ix_staffalias_staff_id'), 'staffalias', ['staff_id'], unique=False)
+
+    op.add_column('staff', sa.Column('normalized_name', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.create_index(op.f('ix_staff_normalized_name'), 'staff', ['normalized_name'], unique=False)
+
+    bind = op.get_bind()
+    staff = sa.table('staff', sa.column('id', sa.Integer), sa.column('name', sa.String), sa.column('normalized_name', sa.String))
+    for staff_id, name in bind.execute(sa.select(staff.c.id, staff.c.name)).all():
+        bind.execute(staff.update().where(staff.c.id == staff_id).values(normalized_name=_normalize(name)))
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_staff_normalized_name'), table_name='staff')
+    with op.batch_alter_table('staff', schema=None) as batch_op:
+        batch_op.drop_column('normalized_name')
+
+    op.drop_index(op.f('ix_staffalias_staff_id'), table_name='staffalias')
+    op.drop_table('staffalias')
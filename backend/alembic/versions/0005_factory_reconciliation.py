@@ -0,0 +1,63 @@
+"""factory reconciliation
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 17:44:47.011670
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('factoryreconciliation',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('factory_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('statement_file', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('amount_basis', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('statement_kg', sa.Float(), nullable=False),
+    sa.Column('recorded_kg', sa.Float(), nullable=False),
+    sa.Column('statement_amount', sa.Float(), nullable=True),
+    sa.Column('recorded_amount', sa.Float(), nullable=False),
+    sa.Column('days_matched', sa.Integer(), nullable=False),
+    sa.Column('days_with_discrepancies', sa.Integer(), nullable=False),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['factory_id'], ['factory.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('factory_id', 'month', 'year')
+    )
+    op.create_index(op.f('ix_factoryreconciliation_factory_id'), 'factoryreconciliation', ['factory_id'], unique=False)
+
+    op.create_table('reconciliationline',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('reconciliation_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.DateTime(), nullable=False),
+    sa.Column('statement_kg', sa.Float(), nullable=True),
+    sa.Column('recorded_kg', sa.Float(), nullable=True),
+    sa.Column('kg_difference', sa.Float(), nullable=False),
+    sa.Column('statement_amount', sa.Float(), nullable=True),
+    sa.Column('recorded_amount', sa.Float(), nullable=True),
+    sa.Column('amount_difference', sa.Float(), nullable=True),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.ForeignKeyConstraint(['reconciliation_id'], ['factoryreconciliation.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_reconciliationline_reconciliation_id'), 'reconciliationline', ['reconciliation_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_reconciliationline_reconciliation_id'), table_name='reconciliationline')
+    op.drop_table('reconciliationline')
+    op.drop_index(op.f('ix_factoryreconciliation_factory_id'), table_name='factoryreconciliation')
+    op.drop_table('factoryreconciliation')
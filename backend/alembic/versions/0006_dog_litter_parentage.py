@@ -0,0 +1,33 @@
+"""dog litter parentage
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 17:47:41.594120
+
+Links each dog to the litter it was born in (dog.litter_id), which gives the
+pedigree graph its sire and dam edges (app/analytics/pedigree.py).
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('dog', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('litter_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_dog_litter_id_litter', 'litter', ['litter_id'], ['id'])
+    op.create_index(op.f('ix_dog_litter_id'), 'dog', ['litter_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_dog_litter_id'), table_name='dog')
+    with op.batch_alter_table('dog', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_dog_litter_id_litter', type_='foreignkey')
+        batch_op.drop_column('litter_id')
@@ -0,0 +1,75 @@
+"""finance ledger
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 17:57:04.480021
+
+Adds the double-entry ledger kept by app/services/ledger.py: accounts with
+running balances, the journal, and the monthly P&L rollup. Records written
+before this revision are booked by POST /finance/ledger/backfill.
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('ledgeraccount',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('code', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('kind', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('balance', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('code')
+    )
+    op.create_table('ledgerentry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('enterprise', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('source', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('debit', sa.Float(), nullable=False),
+    sa.Column('credit', sa.Float(), nullable=False),
+    sa.Column('balance_after', sa.Float(), nullable=False),
+    sa.Column('memo', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['ledgeraccount.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ledgerentry_account_id'), 'ledgerentry', ['account_id'], unique=False)
+    op.create_index(op.f('ix_ledgerentry_date'), 'ledgerentry', ['date'], unique=False)
+    op.create_index('ix_ledgerentry_source', 'ledgerentry', ['source', 'source_id'], unique=False)
+
+    op.create_table('profitlossmonth',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('enterprise', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('income', sa.Float(), nullable=False),
+    sa.Column('expense', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['ledgeraccount.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('year', 'month', 'enterprise', 'account_id')
+    )
+    op.create_index(op.f('ix_profitlossmonth_enterprise'), 'profitlossmonth', ['enterprise'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_profitlossmonth_enterprise'), table_name='profitlossmonth')
+    op.drop_table('profitlossmonth')
+
+    op.drop_index('ix_ledgerentry_source', table_name='ledgerentry')
+    op.drop_index(op.f('ix_ledgerentry_date'), table_name='ledgerentry')
+    op.drop_index(op.f('ix_ledgerentry_account_id'), table_name='ledgerentry')
+    op.drop_table('ledgerentry')
+    op.drop_table('ledgeraccount')
@@ -0,0 +1,41 @@
+"""fertilizer bonus settlement
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 18:21:40.118312
+
+Links a settled bonus-deduction fertilizer purchase to the bonus it was
+deducted from, and adds a partial index over the purchases still waiting for
+a bonus (app/services/bonus_settlement.py).
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+UNSETTLED = sa.text("NOT paid AND payment_method = 'bonus_deduction'")
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('fertilizerpurchase', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('bonus_payment_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_fertilizerpurchase_bonus_payment_id_bonuspayment', 'bonuspayment', ['bonus_payment_id'], ['id'])
+    op.create_index(op.f('ix_fertilizerpurchase_bonus_payment_id'), 'fertilizerpurchase', ['bonus_payment_id'], unique=False)
+    op.create_index(
+        'ix_fertilizerpurchase_unsettled', 'fertilizerpurchase', ['factory_id', 'date'], unique=False,
+        postgresql_where=UNSETTLED, sqlite_where=UNSETTLED,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_fertilizerpurchase_unsettled', table_name='fertilizerpurchase')
+    op.drop_index(op.f('ix_fertilizerpurchase_bonus_payment_id'), table_name='fertilizerpurchase')
+    with op.batch_alter_table('fertilizerpurchase', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_fertilizerpurchase_bonus_payment_id_bonuspayment', type_='foreignkey')
+        batch_op.drop_column('bonus_payment_id')
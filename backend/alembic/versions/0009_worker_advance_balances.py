@@ -0,0 +1,84 @@
+"""worker advance balances
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 18:20:49.816714
+
+Adds the per-worker outstanding advance balance kept by
+app/services/worker_balance.py, its journal, and the brought/carried forward
+amounts of a payroll run. Until now payroll recovered every advance it
+marked deducted, so the opening balance of each worker is the sum of their
+advances not yet deducted.
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('workerbalance',
+    sa.Column('worker_id', sa.Integer(), nullable=False),
+    sa.Column('outstanding', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['worker_id'], ['staff.id'], ),
+    sa.PrimaryKeyConstraint('worker_id')
+    )
+    op.create_table('workerbalanceentry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('worker_id', sa.Integer(), nullable=False),
+    sa.Column('source', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('source_id', sa.Integer(), nullable=True),
+    sa.Column('change', sa.Float(), nullable=False),
+    sa.Column('balance_after', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['worker_id'], ['staff.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_workerbalanceentry_source', 'workerbalanceentry', ['source', 'source_id'], unique=False)
+    op.create_index(op.f('ix_workerbalanceentry_worker_id'), 'workerbalanceentry', ['worker_id'], unique=False)
+
+    with op.batch_alter_table('monthlypayroll', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('brought_forward', sa.Float(), server_default=sa.text('0'), nullable=False))
+        batch_op.add_column(sa.Column('carried_forward', sa.Float(), server_default=sa.text('0'), nullable=False))
+
+    advances = sa.table('workeradvance', sa.column('worker_id'), sa.column('amount'), sa.column('deducted'))
+    balances = sa.table('workerbalance', sa.column('worker_id'), sa.column('outstanding'), sa.column('updated_at'))
+    entries = sa.table(
+        'workerbalanceentry', sa.column('worker_id'), sa.column('source'), sa.column('change'),
+        sa.column('balance_after'), sa.column('created_at')
+    )
+    opening = (
+        sa.select(
+            advances.c.worker_id,
+            sa.func.sum(advances.c.amount).label('outstanding'),
+            sa.func.current_timestamp().label('updated_at'),
+        )
+        .where(advances.c.deducted == sa.false())
+        .group_by(advances.c.worker_id)
+    )
+    op.execute(balances.insert().from_select(['worker_id', 'outstanding', 'updated_at'], opening))
+    op.execute(entries.insert().from_select(
+        ['worker_id', 'source', 'change', 'balance_after', 'created_at'],
+        sa.select(
+            balances.c.worker_id, sa.literal('backfill'), balances.c.outstanding,
+            balances.c.outstanding, balances.c.updated_at,
+        )
+    ))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('monthlypayroll', schema=None) as batch_op:
+        batch_op.drop_column('carried_forward')
+        batch_op.drop_column('brought_forward')
+
+    op.drop_index(op.f('ix_workerbalanceentry_worker_id'), table_name='workerbalanceentry')
+    op.drop_index('ix_workerbalanceentry_source', table_name='workerbalanceentry')
+    op.drop_table('workerbalanceentry')
+    op.drop_table('workerbalance')
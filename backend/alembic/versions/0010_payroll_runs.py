@@ -0,0 +1,66 @@
+"""payroll runs
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 18:31:07.204118
+
+Adds the payroll run registry (app/services/payroll_runs.py), tags each
+payroll with the run that calculated it, and makes (worker_id, month, year)
+unique on monthlypayroll. Duplicates left by concurrent calculations must be
+resolved by hand first; the upgrade stops and lists them.
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def _check_duplicates() -> None:
+    payrolls = sa.table('monthlypayroll', sa.column('worker_id'), sa.column('month'), sa.column('year'))
+    duplicates = op.get_bind().execute(
+        sa.select(payrolls.c.worker_id, payrolls.c.month, payrolls.c.year)
+        .group_by(payrolls.c.worker_id, payrolls.c.month, payrolls.c.year)
+        .having(sa.func.count() > 1)
+    ).all()
+    if duplicates:
+        listed = ', '.join(f'worker {worker} {month}/{year}' for worker, month, year in duplicates[:20])
+        raise RuntimeError(f'monthlypayroll has {len(duplicates)} duplicated worker months ({listed}); remove the extra rows first')
+
+
+def upgrade() -> None:
+    _check_duplicates()
+    op.create_table('payrollrun',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('workers_processed', sa.Integer(), nullable=False),
+    sa.Column('error', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_payrollrun_period', 'payrollrun', ['year', 'month'], unique=False)
+
+    with op.batch_alter_table('monthlypayroll', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('run_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_monthlypayroll_run_id_payrollrun', 'payrollrun', ['run_id'], ['id'])
+        batch_op.create_unique_constraint('uq_monthlypayroll_worker_id_month_year', ['worker_id', 'month', 'year'])
+    op.create_index(op.f('ix_monthlypayroll_run_id'), 'monthlypayroll', ['run_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_monthlypayroll_run_id'), table_name='monthlypayroll')
+    with op.batch_alter_table('monthlypayroll', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_monthlypayroll_worker_id_month_year', type_='unique')
+        batch_op.drop_constraint('fk_monthlypayroll_run_id_payrollrun', type_='foreignkey')
+        batch_op.drop_column('run_id')
+
+    op.drop_index('ix_payrollrun_period', table_name='payrollrun')
+    op.drop_table('payrollrun')
@@ -0,0 +1,35 @@
+"""record versions
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 18:33:48.175827
+
+Adds the ``version`` column that PUT endpoints compare-and-swap on
+(app/core/versioning.py). Existing records start at version 1.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = (
+    'avocadoharvest', 'bonuspayment', 'cow', 'dog', 'eggproduction', 'factory', 'fertilizerpurchase',
+    'flock', 'litter', 'milkrecord', 'monthlypayroll', 'staff', 'teaplucking', 'transaction', 'workeradvance',
+)
+
+
+def upgrade() -> None:
+    for table in VERSIONED_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False))
+
+
+def downgrade() -> None:
+    for table in reversed(VERSIONED_TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('version')
@@ -0,0 +1,32 @@
+"""table versions
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19 19:18:21.948669
+
+Moves the ETag change counters of app/core/etag.py from process memory into
+the database, one row per table, so every worker and script sees the others'
+writes. Tables start without a row (version 0).
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('tableversion',
+    sa.Column('table_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('tableversion')
@@ -0,0 +1,29 @@
+"""avocado sale version
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-19 19:40:12.508114
+
+Gives avocado sales the ``version`` the other editable records carry
+(migration 0011), so the sales list hands clients a version to send back as
+If-Match. Existing sales start at version 1.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0014'
+down_revision = '0013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('avocadosale', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('avocadosale', schema=None) as batch_op:
+        batch_op.drop_column('version')
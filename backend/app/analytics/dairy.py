@@ -0,0 +1,179 @@
+from __future__ import annotations
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from sqlmodel import Session, select
+from app.core.cache import ResultCache
+from app.core.lazy import lazy_import
+from app.models import MilkRecord
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+HISTORY_DAYS = 400          # default look-back loaded into a cow's cache entry
+DRY_PERIOD_GAP_DAYS = 45    # a gap this long between records starts a new lactation
+DROP_ALERT_THRESHOLD = 0.2  # alert when a day falls 20% below the prior 7-day mean
+MIN_PRIOR_DAYS = 3          # prior days needed before a drop alert is raised
+
+# cow_id -> (history start date, daily totals Series indexed by day)
+daily_totals_cache = ResultCache(maxsize=256)
+
+
+def _as_day(value) -> Optional[date]:
+    if value is None:
+        return None
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _load_daily_totals(session: Session, cow_id: int, since: date) -> pd.Series:
+    """Sum a cow's milk records per day from ``since`` onwards"""
+    rows = session.exec(
+        select(MilkRecord.date_recorded, MilkRecord.quantity).where(
+            MilkRecord.cow_id == cow_id,
+            MilkRecord.date_recorded >= datetime.combine(since, time.min)
+        )
+    ).all()
+    if not rows:
+        return pd.Series(dtype="float64", index=pd.DatetimeIndex([], name="day"))
+
+    frame = pd.DataFrame(rows, columns=["day", "quantity"])
+    frame["day"] = pd.to_datetime(frame["day"]).dt.normalize()
+    return frame.groupby("day")["quantity"].sum().sort_index()
+
+
+def get_daily_totals(session: Session, cow_id: int, start: date) -> pd.Series:
+    """Cached per-cow daily totals covering at least ``start`` onwards"""
+    cached = daily_totals_cache.get(cow_id)
+    if cached is not None and cached[0] <= start:
+        return cached[1]
+
+    since = min(start, date.today() - timedelta(days=HISTORY_DAYS))
+    totals = _load_daily_totals(session, cow_id, since)
+    daily_totals_cache.set(cow_id, (since, totals))
+    return totals
+
+
+def invalidate_daily_totals(*cow_ids):
+    """Drop cached daily totals for the given cows"""
+    touched = {cow_id for cow_id in cow_ids if cow_id is not None}
+    if touched:
+        daily_totals_cache.invalidate(lambda key: key in touched)
+
+
+def apply_milk_change(cow_id: Optional[int], day, quantity: float):
+    """
+    Fold a written (or removed, with negative quantity) milk record into the
+    cached daily totals for its cow instead of reloading the whole history.
+    """
+    day = _as_day(day)
+    if cow_id is None or day is None:
+        return
+    cached = daily_totals_cache.get(cow_id)
+    if cached is None:
+        return
+    since, totals = cached
+    if day < since:
+        return
+
+    key = pd.Timestamp(day)
+    updated = totals.copy()
+    updated.loc[key] = updated.get(key, 0.0) + quantity
+    if abs(updated.loc[key]) < 1e-9:
+        updated = updated.drop(key)
+    daily_totals_cache.set(cow_id, (since, updated.sort_index()))
+
+
+def _lactation_start(days: pd.DatetimeIndex) -> Optional[pd.Timestamp]:
+    """First recorded day after the most recent dry-period gap"""
+    if len(days) == 0:
+        return None
+    gaps = np.flatnonzero(np.diff(days.values).astype("timedelta64[D]").astype(int) >= DRY_PERIOD_GAP_DAYS)
+    return days[gaps[-1] + 1] if len(gaps) else days[0]
+
+
+def fit_lactation_curve(totals: pd.Series):
+    """
+    Fit Wood's lactation curve y = a * t^b * e^(-c t) (t = days in milk)
+    by least squares on ln y = ln a + b ln t - c t.
+    """
+    start = _lactation_start(totals.index)
+    if start is None:
+        return None
+
+    current = totals[totals.index >= start]
+    current = current[current > 0]
+    days_in_milk = (current.index - start).days.values + 1
+    fit = {
+        "lactation_start": start.date().isoformat(),
+        "days_in_milk": int((totals.index[-1] - start).days) + 1,
+        "points": int(len(current)),
+    }
+    if len(current) < 5:
+        return {**fit, "a": None, "b": None, "c": None, "peak_day": None, "peak_yield": None}
+
+    t = days_in_milk.astype(float)
+    design = np.column_stack([np.ones_like(t), np.log(t), -t])
+    (ln_a, b, c), *_ = np.linalg.lstsq(design, np.log(current.values), rcond=None)
+    a = float(np.exp(ln_a))
+
+    peak_day = peak_yield = None
+    if b > 0 and c > 0:
+        peak_day = b / c
+        peak_yield = a * peak_day ** b * np.exp(-b)
+
+    return {
+        **fit,
+        "a": round(a, 4),
+        "b": round(float(b), 4),
+        "c": round(float(c), 6),
+        "peak_day": round(float(peak_day), 1) if peak_day is not None else None,
+        "peak_yield": round(float(peak_yield), 2) if peak_yield is not None else None,
+    }
+
+
+def compute_cow_analytics(session: Session, cow_id: int, start: date, end: date):
+    """Daily totals, 7/30-day rolling means, drop alerts and lactation fit for a cow"""
+    history = get_daily_totals(session, cow_id, start)
+
+    # Rolling windows are computed over the full cached history so the first
+    # days of the requested range still see their preceding records.
+    frame = pd.DataFrame({"total": history})
+    frame["avg_7d"] = history.rolling("7D", min_periods=1).mean()
+    frame["avg_30d"] = history.rolling("30D", min_periods=1).mean()
+    prior = history.rolling("7D", closed="left")
+    frame["prior_avg_7d"] = prior.mean()
+    frame["prior_days"] = prior.count()
+    frame["drop_pct"] = 1 - frame["total"] / frame["prior_avg_7d"]
+    frame["alert"] = (frame["drop_pct"] >= DROP_ALERT_THRESHOLD) & (frame["prior_days"] >= MIN_PRIOR_DAYS)
+
+    window = frame.loc[pd.Timestamp(start):pd.Timestamp(end)]
+    daily = [
+        {
+            "date": day.date().isoformat(),
+            "total": round(float(row.total), 2),
+            "avg_7d": round(float(row.avg_7d), 2),
+            "avg_30d": round(float(row.avg_30d), 2),
+        }
+        for day, row in window.iterrows()
+    ]
+    alerts = [
+        {
+            "date": day.date().isoformat(),
+            "total": round(float(row.total), 2),
+            "expected": round(float(row.prior_avg_7d), 2),
+            "drop_pct": round(float(row.drop_pct) * 100, 1),
+        }
+        for day, row in window[window["alert"]].iterrows()
+    ]
+
+    return {
+        "cow_id": cow_id,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "total_quantity": round(float(window["total"].sum()), 2),
+        "days_recorded": int(len(window)),
+        "latest_avg_7d": daily[-1]["avg_7d"] if daily else 0,
+        "latest_avg_30d": daily[-1]["avg_30d"] if daily else 0,
+        "daily": daily,
+        "alerts": alerts,
+        "lactation_curve": fit_lactation_curve(history[history.index <= pd.Timestamp(end)]),
+    }
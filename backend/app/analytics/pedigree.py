@@ -0,0 +1,188 @@
+"""
+Dog pedigree graph.
+
+Parentage is stored as Dog.litter_id -> Litter (father_id, mother_id).
+Walking it one get_dog/get_litter call per generation costs a round trip per
+ancestor, so the whole breeding graph (one row per dog with its sire and dam)
+is loaded with a single query and kept until a dog or litter is written
+(invalidate()).
+
+Kinship coefficients are computed recursively and memoized on the graph, so
+each pair of dogs is worked out once per graph and scoring every candidate
+sire against a dam costs little more than scoring the first:
+
+    f(a, a) = (1 + f(sire(a), dam(a))) / 2
+    f(a, b) = (f(sire(a), b) + f(dam(a), b)) / 2    (a the younger, never an
+                                                      ancestor of b)
+
+with f = 0 for an unknown parent. Wright's inbreeding coefficient of a dog,
+or of the puppies of a proposed pairing, is the kinship of the two parents.
+"""
+from __future__ import annotations
+import logging
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+from sqlmodel import Session, select
+from app.core.cache import ResultCache
+from app.models import Dog, Litter
+
+logger = logging.getLogger(__name__)
+
+Parents = Tuple[Optional[int], Optional[int]]  # (sire, dam)
+
+# Holds the one current graph; dog and litter writes clear it
+graph_cache = ResultCache(maxsize=1)
+
+
+class DogNode(NamedTuple):
+    id: int
+    name: str
+    breed: Optional[str]
+    gender: str
+    status: str
+
+
+class PedigreeGraph:
+    """Every dog with its sire and dam, plus memoized kinship coefficients"""
+
+    def __init__(self, dogs: Dict[int, DogNode], parents: Dict[int, Parents]):
+        self.dogs = dogs
+        self.parents = parents
+        self.depth = self._depths()
+        self._kinship: Dict[Tuple[int, int], float] = {}
+        self._lineage: Dict[int, FrozenSet[int]] = {}
+
+    def _known_parents(self, dog_id: int) -> List[int]:
+        return [parent for parent in self.parents.get(dog_id, (None, None)) if parent is not None]
+
+    def _depths(self) -> Dict[int, int]:
+        """Generations between each dog and its furthest known ancestor"""
+        depth: Dict[int, int] = {}
+        for start in self.dogs:
+            stack, expanded = [start], set()
+            while stack:
+                dog_id = stack[-1]
+                if dog_id in depth:
+                    stack.pop()
+                elif dog_id not in expanded:
+                    expanded.add(dog_id)
+                    for parent in self._known_parents(dog_id):
+                        if parent in expanded:
+                            # Bad data: a dog listed among its own ancestors.
+                            # Drop the edge rather than loop forever.
+                            logger.warning("Pedigree loop through dogs %s and %s", dog_id, parent)
+                            sire, dam = self.parents[dog_id]
+                            self.parents[dog_id] = (None if sire == parent else sire, None if dam == parent else dam)
+                        elif parent not in depth:
+                            stack.append(parent)
+                else:
+                    stack.pop()
+                    expanded.discard(dog_id)
+                    depth[dog_id] = 1 + max((depth[parent] for parent in self._known_parents(dog_id)), default=-1)
+        return depth
+
+    def kinship(self, a: Optional[int], b: Optional[int]) -> float:
+        """Probability that a gene drawn from ``a`` and one from ``b`` are identical by descent"""
+        if a is None or b is None:
+            return 0.0
+        key = (a, b) if a <= b else (b, a)
+        cached = self._kinship.get(key)
+        if cached is not None:
+            return cached
+
+        if a == b:
+            value = (1 + self.kinship(*self.parents[a])) / 2
+        else:
+            # Expand the younger dog: an ancestor is always shallower than
+            # its descendants, so the younger cannot be an ancestor of the other
+            if self.depth[a] < self.depth[b]:
+                a, b = b, a
+            sire, dam = self.parents[a]
+            value = (self.kinship(sire, b) + self.kinship(dam, b)) / 2
+        self._kinship[key] = value
+        return value
+
+    def inbreeding(self, dog_id: int) -> float:
+        """Wright's inbreeding coefficient of a dog"""
+        return self.kinship(*self.parents[dog_id])
+
+    def lineage(self, dog_id: int) -> FrozenSet[int]:
+        """The dog and all its known ancestors (memoized, built parents first)"""
+        cached = self._lineage.get(dog_id)
+        if cached is None:
+            cached = frozenset({dog_id}).union(*(self.lineage(parent) for parent in self._known_parents(dog_id)))
+            self._lineage[dog_id] = cached
+        return cached
+
+    def would_loop(self, dog_ids: Iterable[int], parents: Iterable[Optional[int]]) -> bool:
+        """Whether giving ``dog_ids`` these parents would make a dog its own ancestor"""
+        return any(
+            dog_id in self.lineage(parent)
+            for parent in parents if parent is not None
+            for dog_id in dog_ids
+        )
+
+    def tree(self, dog_id: int, generations: int) -> Optional[dict]:
+        """The dog and its ancestors ``generations`` deep, as nested sire/dam nodes"""
+        return self._node(dog_id, 0, generations) if dog_id in self.dogs else None
+
+    def _node(self, dog_id: Optional[int], generation: int, generations: int) -> Optional[dict]:
+        if dog_id is None or generation > generations:
+            return None
+        sire, dam = self.parents[dog_id]
+        return {
+            **self.dogs[dog_id]._asdict(),
+            "generation": generation,
+            "inbreeding_coefficient": round(self.inbreeding(dog_id), 6),
+            "sire": self._node(sire, generation + 1, generations),
+            "dam": self._node(dam, generation + 1, generations),
+        }
+
+    def pairing(self, sire_id: int, dam_id: int) -> dict:
+        """Inbreeding coefficient of the puppies of a proposed pairing"""
+        sire = self.dogs[sire_id]
+        coefficient = self.kinship(sire_id, dam_id)
+        # Unrelated dogs (coefficient 0) share no ancestor, so skip the set work
+        common = self.lineage(sire_id) & self.lineage(dam_id) if coefficient else ()
+        return {
+            "sire_id": sire_id,
+            "sire_name": sire.name,
+            "breed": sire.breed,
+            "inbreeding_coefficient": round(coefficient, 6),
+            "common_ancestors": sorted(common),
+        }
+
+    def pairings(self, dam_id: int, sire_ids: Optional[Iterable[int]] = None) -> List[dict]:
+        """Score candidate sires for a dam, least inbred first; default every active male"""
+        if sire_ids is None:
+            sire_ids = [
+                dog.id for dog in self.dogs.values()
+                if dog.gender.lower() == "male" and dog.status.lower() == "active" and dog.id != dam_id
+            ]
+        scores = [self.pairing(sire_id, dam_id) for sire_id in dict.fromkeys(sire_ids)]
+        return sorted(scores, key=lambda score: (score["inbreeding_coefficient"], score["sire_name"]))
+
+
+def load_graph(session: Session) -> PedigreeGraph:
+    """Every dog and its parents from one query"""
+    rows = session.exec(
+        select(Dog.id, Dog.name, Dog.breed, Dog.gender, Dog.status, Litter.father_id, Litter.mother_id)
+        .outerjoin(Litter, Dog.litter_id == Litter.id)
+    ).all()
+    dogs = {row[0]: DogNode(row[0], row[1], row[2], row[3] or "", row[4] or "") for row in rows}
+    parents = {
+        dog_id: (sire if sire in dogs else None, dam if dam in dogs else None)
+        for dog_id, *_, sire, dam in rows
+    }
+    return PedigreeGraph(dogs, parents)
+
+
+def get_graph(session: Session) -> PedigreeGraph:
+    graph = graph_cache.get("graph")
+    if graph is None:
+        graph = load_graph(session)
+        graph_cache.set("graph", graph)
+    return graph
+
+
+def invalidate() -> None:
+    graph_cache.clear()
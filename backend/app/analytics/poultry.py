@@ -0,0 +1,119 @@
+from __future__ import annotations
+from datetime import date, datetime, time, timedelta
+from sqlmodel import Session, select
+from sqlalchemy import func
+from app.core.cache import ResultCache
+from app.core.lazy import lazy_import
+from app.models import EggProduction, Flock
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+DROP_THRESHOLD = 0.15       # flag a day 15% below the prior 7-day mean lay rate
+BREAKAGE_THRESHOLD = 0.10   # flag days where over 10% of collected eggs broke
+MIN_PRIOR_DAYS = 3
+
+# (flock_id, start_date, end_date) -> analytics result
+flock_analytics_cache = ResultCache(maxsize=128)
+
+
+def invalidate_flock_analytics(*flock_ids):
+    """Drop cached results for the given flocks"""
+    touched = {flock_id for flock_id in flock_ids if flock_id is not None}
+    if touched:
+        flock_analytics_cache.invalidate(lambda key: key[0] in touched)
+
+
+def _daily_production(session: Session, flock_id: int, start: date, end: date) -> pd.DataFrame:
+    """Eggs and breakage per day joined with the flock's hen count, grouped in SQL"""
+    day = func.date(EggProduction.date_collected)
+    rows = session.exec(
+        select(
+            day.label("day"),
+            func.sum(EggProduction.quantity).label("eggs"),
+            func.sum(EggProduction.broken).label("broken"),
+            Flock.current_count,
+        )
+        .join(Flock, Flock.id == EggProduction.flock_id)
+        .where(
+            EggProduction.flock_id == flock_id,
+            EggProduction.date_collected >= datetime.combine(start, time.min),
+            EggProduction.date_collected < datetime.combine(end + timedelta(days=1), time.min),
+        )
+        .group_by(day, Flock.current_count)
+        .order_by(day)
+    ).all()
+
+    frame = pd.DataFrame(rows, columns=["day", "eggs", "broken", "hens"])
+    frame["day"] = pd.to_datetime(frame["day"])
+    return frame.set_index("day").astype(float)
+
+
+def compute_flock_analytics(session: Session, flock_id: int, start: date, end: date):
+    """Hen-day lay rate, rolling trends and anomaly flags for a flock"""
+    cache_key = (flock_id, start, end)
+    cached = flock_analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    frame = _daily_production(session, flock_id, start, end)
+
+    hens = frame["hens"].where(frame["hens"] > 0)
+    frame["lay_rate"] = frame["eggs"] / hens * 100
+    frame["breakage_rate"] = (frame["broken"] / frame["eggs"].where(frame["eggs"] > 0)).fillna(0)
+    frame["avg_7d"] = frame["lay_rate"].rolling("7D", min_periods=1).mean()
+    frame["avg_28d"] = frame["lay_rate"].rolling("28D", min_periods=1).mean()
+    prior = frame["lay_rate"].rolling("7D", closed="left")
+    frame["prior_avg_7d"] = prior.mean()
+    frame["prior_days"] = prior.count()
+
+    drop = (frame["lay_rate"] < frame["prior_avg_7d"] * (1 - DROP_THRESHOLD)) & (frame["prior_days"] >= MIN_PRIOR_DAYS)
+    over = frame["lay_rate"] > 100
+    breakage = frame["breakage_rate"] > BREAKAGE_THRESHOLD
+    flags = np.select(
+        [drop & breakage, drop, over, breakage],
+        ["drop,high_breakage", "drop", "over_100_percent", "high_breakage"],
+        default="",
+    )
+
+    daily = [
+        {
+            "date": day.date().isoformat(),
+            "eggs": int(eggs),
+            "broken": int(broken),
+            "hens": int(hens_count),
+            "lay_rate": round(rate, 2) if not np.isnan(rate) else None,
+            "avg_7d": round(avg_7d, 2) if not np.isnan(avg_7d) else None,
+            "avg_28d": round(avg_28d, 2) if not np.isnan(avg_28d) else None,
+            "flags": flag.split(",") if flag else [],
+        }
+        for day, eggs, broken, hens_count, rate, avg_7d, avg_28d, flag in zip(
+            frame.index, frame["eggs"], frame["broken"], frame["hens"],
+            frame["lay_rate"], frame["avg_7d"], frame["avg_28d"], flags,
+        )
+    ]
+
+    # Trend: slope of the daily lay rate in percentage points per week
+    trend = None
+    valid = frame["lay_rate"].dropna()
+    if len(valid) >= 2:
+        days = (valid.index - valid.index[0]).days.values.astype(float)
+        if days[-1] > 0:
+            trend = round(float(np.polyfit(days, valid.values, 1)[0] * 7), 3)
+
+    total_eggs = float(frame["eggs"].sum())
+    result = {
+        "flock_id": flock_id,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "days_recorded": len(daily),
+        "total_eggs": int(total_eggs),
+        "total_broken": int(frame["broken"].sum()),
+        "average_lay_rate": round(float(valid.mean()), 2) if len(valid) else None,
+        "latest_avg_7d": daily[-1]["avg_7d"] if daily else None,
+        "trend_per_week": trend,
+        "anomaly_days": int(sum(1 for d in daily if d["flags"])),
+        "daily": daily,
+    }
+    flock_analytics_cache.set(cache_key, result)
+    return result
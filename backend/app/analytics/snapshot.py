@@ -0,0 +1,191 @@
+"""
+Columnar snapshot of the farm tables for multi-year reports.
+
+Year-over-year reports scan every row of a table, which row-wise queries on
+the transactional database handle badly. Instead the tables the reports need
+are copied into an in-memory DuckDB database (through Arrow record batches)
+and the report SQL runs there, vectorized and multi-threaded. Years archived
+to Parquet (app.services.archive) are loaded straight from their files, so
+reports cover the full history.
+
+The copy is taken over a dedicated, unpooled connection, so a refresh never
+holds one of the API's pooled connections, and at most
+ANALYTICS_MAX_CONCURRENCY report queries run at a time. A snapshot older than
+ANALYTICS_REFRESH_SECONDS is still served while a fresh one is built in the
+background.
+"""
+from __future__ import annotations
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import create_engine, select
+from sqlalchemy.pool import NullPool
+from app.core.config import settings
+from app.core.lazy import lazy_import
+from app.models import (
+    ArchivedPeriod,
+    AvocadoHarvest,
+    AvocadoSale,
+    MilkRecord,
+    MonthlyPayroll,
+    TeaPlucking,
+    Transaction,
+)
+from app.services.archive import ARCHIVED_MODELS, arrow_schema
+
+duckdb = lazy_import("duckdb")
+pa = lazy_import("pyarrow")
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MODELS = [TeaPlucking, MonthlyPayroll, MilkRecord, AvocadoHarvest, AvocadoSale, Transaction]
+BATCH_ROWS = 50_000
+
+# Report queries allowed to run at once, so they cannot tie up the threadpool
+_query_slots = threading.BoundedSemaphore(settings.ANALYTICS_MAX_CONCURRENCY)
+
+_extract_engine = None
+_engine_lock = threading.Lock()
+
+
+def extract_engine():
+    """Engine used only for snapshot extracts; NullPool keeps it off the OLTP pool"""
+    global _extract_engine
+    with _engine_lock:
+        if _extract_engine is None:
+            _extract_engine = create_engine(settings.DATABASE_URL, poolclass=NullPool)
+        return _extract_engine
+
+
+class Snapshot:
+    """An immutable DuckDB copy of the report tables"""
+
+    def __init__(self, connection, built_at: datetime, build_seconds: float, row_counts: Dict[str, int]):
+        self._connection = connection
+        self.built_at = built_at
+        self.build_seconds = build_seconds
+        self.row_counts = row_counts
+        self._created = time.monotonic()
+
+    @property
+    def age_seconds(self) -> float:
+        return time.monotonic() - self._created
+
+    def query(self, sql: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Run report SQL against the snapshot; rows come back as dicts"""
+        with _query_slots:
+            # Each cursor is its own DuckDB connection to the same database,
+            # so concurrent requests do not share statement state
+            cursor = self._connection.cursor()
+            try:
+                cursor.execute(sql, params or {})
+                names = [column[0] for column in cursor.description]
+                return [dict(zip(names, row)) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+
+
+def _load_table(target, conn, model) -> None:
+    """Stream a table from the database into DuckDB, one Arrow record batch at a time"""
+    schema = arrow_schema(model)
+    table = model.__tablename__
+    # The empty table gives DuckDB the column types; each batch is then
+    # inserted as it arrives, so at most one batch is held in memory
+    target.register("_extract", schema.empty_table())
+    target.execute(f'CREATE TABLE "{table}" AS SELECT * FROM _extract')
+    target.unregister("_extract")
+    result = conn.execution_options(yield_per=BATCH_ROWS).execute(select(*model.__table__.columns))
+    for rows in result.partitions():
+        columns = list(zip(*rows))
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema,
+        )
+        target.register("_extract", pa.Table.from_batches([batch]))
+        target.execute(f'INSERT INTO "{table}" SELECT * FROM _extract')
+        target.unregister("_extract")
+
+
+def build_snapshot() -> Snapshot:
+    """Copy the report tables (hot rows and archived years) into a new DuckDB database"""
+    started = time.perf_counter()
+    target = duckdb.connect(":memory:")
+    engine = extract_engine()
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            # One repeatable-read transaction: every table is copied as of
+            # the same moment
+            conn = conn.execution_options(isolation_level="REPEATABLE READ")
+        with conn.begin():
+            for model in SNAPSHOT_MODELS:
+                _load_table(target, conn, model)
+            archives = conn.execute(select(ArchivedPeriod.table_name, ArchivedPeriod.path)).all()
+
+    snapshot_tables = {model.__tablename__ for model in SNAPSHOT_MODELS}
+    for table, path in archives:
+        if table in snapshot_tables and table in ARCHIVED_MODELS:
+            target.execute(
+                f'INSERT INTO "{table}" BY NAME '
+                "SELECT * FROM read_parquet($files, hive_partitioning = false, union_by_name = true)",
+                {"files": [f"{path}/month=*/*.parquet"]},
+            )
+
+    row_counts = {
+        table: target.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+        for table in sorted(snapshot_tables)
+    }
+    elapsed = time.perf_counter() - started
+    logger.info("Built analytics snapshot in %.2fs: %s", elapsed, row_counts)
+    return Snapshot(target, datetime.now(), elapsed, row_counts)
+
+
+class SnapshotManager:
+    """Holds the current snapshot and refreshes it once it goes stale"""
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self._current: Optional[Snapshot] = None
+        self._build_lock = threading.Lock()
+
+    @property
+    def refreshing(self) -> bool:
+        return self._build_lock.locked()
+
+    def current(self) -> Snapshot:
+        snapshot = self._current
+        if snapshot is None:
+            # Nothing to serve yet: the first request waits for the build
+            with self._build_lock:
+                if self._current is None:
+                    self._current = build_snapshot()
+            return self._current
+        if snapshot.age_seconds > self.max_age:
+            self.refresh_in_background()
+        return snapshot
+
+    def refresh(self) -> Snapshot:
+        """Build a new snapshot now and swap it in"""
+        with self._build_lock:
+            self._current = build_snapshot()
+            return self._current
+
+    def refresh_in_background(self) -> bool:
+        """Start a rebuild unless one is already running; returns whether it started"""
+        if not self._build_lock.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self._current = build_snapshot()
+            except Exception:
+                logger.exception("Analytics snapshot refresh failed")
+            finally:
+                self._build_lock.release()
+
+        threading.Thread(target=run, name="analytics-snapshot", daemon=True).start()
+        return True
+
+
+snapshots = SnapshotManager(max_age=settings.ANALYTICS_REFRESH_SECONDS)
@@ -0,0 +1,125 @@
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from sqlmodel import Session, select
+from sqlalchemy import func
+from app.core.cache import ResultCache
+from app.models import TeaPlucking, Staff
+
+# Leaderboards keyed by (start_date, end_date, limit)
+worker_stats_cache = ResultCache(maxsize=64)
+
+
+def current_week(today: Optional[date] = None):
+    """Monday..Sunday of the week containing ``today``"""
+    today = today or date.today()
+    start = today - timedelta(days=today.weekday())
+    return start, start + timedelta(days=6)
+
+
+def invalidate_worker_stats(*days):
+    """Evict cached stats for every period that contains one of ``days``"""
+    touched = {d.date() if isinstance(d, datetime) else d for d in days if d}
+    if not touched:
+        return
+    worker_stats_cache.invalidate(
+        lambda key: any(key[0] <= day <= key[1] for day in touched)
+    )
+
+
+def compute_worker_stats(session: Session, start: date, end: date, limit: int = 5):
+    """Rank workers for a period using window functions in the database.
+
+    - rank: RANK() by total kg plucked (1 = most)
+    - percentile: PERCENT_RANK() of average kg per worked day (100 = best)
+    - rolling_7day_avg_kg: average of the worker's last 7 worked days
+    """
+    cache_key = (start, end, limit)
+    cached = worker_stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    day = func.date(TeaPlucking.date)
+
+    # One row per worker per day
+    daily = (
+        select(
+            TeaPlucking.worker_id.label("worker_id"),
+            day.label("day"),
+            func.sum(TeaPlucking.quantity).label("kg"),
+        )
+        .where(
+            TeaPlucking.date >= datetime.combine(start, time.min),
+            TeaPlucking.date < datetime.combine(end + timedelta(days=1), time.min),
+        )
+        .group_by(TeaPlucking.worker_id, day)
+        .subquery()
+    )
+
+    # Rolling average over each worker's trailing 7 worked days
+    rolling = select(
+        daily.c.worker_id,
+        func.avg(daily.c.kg).over(
+            partition_by=daily.c.worker_id, order_by=daily.c.day, rows=(-6, 0)
+        ).label("rolling_avg"),
+        func.row_number().over(
+            partition_by=daily.c.worker_id, order_by=daily.c.day.desc()
+        ).label("recency"),
+    ).subquery()
+
+    latest = (
+        select(rolling.c.worker_id, rolling.c.rolling_avg)
+        .where(rolling.c.recency == 1)
+        .subquery()
+    )
+
+    totals = (
+        select(
+            daily.c.worker_id,
+            func.sum(daily.c.kg).label("total_kg"),
+            func.count().label("days_worked"),
+            (func.sum(daily.c.kg) / func.count()).label("avg_kg_per_day"),
+        )
+        .group_by(daily.c.worker_id)
+        .subquery()
+    )
+
+    statement = (
+        select(
+            totals.c.worker_id,
+            Staff.name,
+            totals.c.total_kg,
+            totals.c.days_worked,
+            totals.c.avg_kg_per_day,
+            latest.c.rolling_avg,
+            func.rank().over(order_by=totals.c.total_kg.desc()).label("rank"),
+            func.percent_rank().over(order_by=totals.c.avg_kg_per_day).label("percentile"),
+        )
+        .join(latest, latest.c.worker_id == totals.c.worker_id)
+        .outerjoin(Staff, Staff.id == totals.c.worker_id)
+        .order_by("rank", totals.c.worker_id)
+    )
+
+    workers = [
+        {
+            "worker_id": row.worker_id,
+            "worker_name": row.name or "Unknown",
+            "rank": row.rank,
+            "total_kg": round(row.total_kg or 0, 2),
+            "days_worked": row.days_worked,
+            "avg_kg_per_day": round(row.avg_kg_per_day or 0, 2),
+            "rolling_7day_avg_kg": round(row.rolling_avg or 0, 2),
+            "percentile": round(float(row.percentile or 0) * 100, 1),
+        }
+        for row in session.exec(statement).all()
+    ]
+
+    result = {
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "total_workers": len(workers),
+        "top": workers[:limit],
+        "bottom": workers[::-1][:limit],
+        "workers": workers,
+    }
+    worker_stats_cache.set(cache_key, result)
+    return result
@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app import models, schemas
 from app.api import deps
+from app.services import inventory as stock
 
 router = APIRouter()
 
@@ -23,8 +24,65 @@ def create_inventory_item(
     item_in: schemas.InventoryCreate,
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
-    item = models.InventoryItem(**item_in.dict())
+    item = models.InventoryItem(**item_in.dict(exclude={"quantity"}), quantity=0.0)
     db.add(item)
+    db.flush()
+    if item_in.quantity:
+        stock.record_movement(db, item, item_in.quantity, models.StockMovementReason.INITIAL)
     db.commit()
     db.refresh(item)
     return item
+
+@router.get("/low-stock", response_model=List[schemas.Inventory])
+def read_low_stock(
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    return stock.low_stock_items(db)
+
+@router.post("/{item_id}/movements", response_model=schemas.StockMovement)
+def create_stock_movement(
+    *,
+    db: Session = Depends(deps.get_db),
+    item_id: int,
+    movement_in: schemas.StockMovementCreate,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    item = db.query(models.InventoryItem).filter(models.InventoryItem.id == item_id).first()
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    movement = stock.record_movement(db, item, movement_in.change, movement_in.reason, movement_in.note)
+    db.commit()
+    db.refresh(movement)
+    return movement
+
+@router.get("/{item_id}/movements", response_model=List[schemas.StockMovement])
+def read_stock_movements(
+    *,
+    db: Session = Depends(deps.get_db),
+    item_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    return (
+        db.query(models.StockMovement)
+        .filter(models.StockMovement.item_id == item_id)
+        .order_by(models.StockMovement.created_at.desc(), models.StockMovement.id.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+@router.get("/{item_id}/forecast", response_model=schemas.InventoryForecast)
+def read_consumption_forecast(
+    *,
+    db: Session = Depends(deps.get_db),
+    item_id: int,
+    days: int = 30,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    item = db.query(models.InventoryItem).filter(models.InventoryItem.id == item_id).first()
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return stock.consumption_forecast(db, item, days)
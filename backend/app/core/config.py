@@ -14,6 +14,24 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = "farm_db"
     DATABASE_URL: Optional[str] = None
     BACKEND_CORS_ORIGINS: List[str] = []
+    # Responses smaller than this are sent uncompressed
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+
+    AVOCADO_TREE_COUNT: int = 40  # Over 40 grafted trees
+
+    # Closed payroll years exported by app.services.archive
+    ARCHIVE_DIR: str = "archive"
+
+    # DuckDB snapshot behind the /reports endpoints (app.analytics.snapshot)
+    ANALYTICS_REFRESH_SECONDS: int = 900
+    ANALYTICS_MAX_CONCURRENCY: int = 2
+
+    # Heaviest plausible weigh-in: more is refused by imports and bulk updates
+    TEA_MAX_KG_PER_DAY: float = 120.0
+
+    # Responses kept for replay to POSTs retried with the same Idempotency-Key
+    IDEMPOTENCY_TTL_SECONDS: int = 60 * 60 * 24
+    IDEMPOTENCY_CACHE_SIZE: int = 1024
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
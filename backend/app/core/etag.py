@@ -0,0 +1,115 @@
+"""
+Weak ETags for GET endpoints whose body depends only on some tables.
+
+Each table has a change counter in the tableversion table. A transaction that
+writes a table (ORM flushes and bulk statements alike, tracked by the hooks
+below) bumps its counter as it commits, in the same transaction, so the
+counter moves exactly when the change becomes visible. The counters live in
+the database, so every process sees every other's writes: a second uvicorn
+worker, the archive CLI or a seeding script. A GET reads the counters of its
+tables with one indexed query.
+"""
+import hashlib
+from itertools import chain
+from typing import Iterable
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.database import dialect_insert, get_session
+from app.models import TableVersion
+
+_PENDING_KEY = "etag_changed_tables"
+_versions = TableVersion.__table__
+
+
+def _pending(session: Session) -> set:
+    return session.info.setdefault(_PENDING_KEY, set())
+
+
+def touch(session: Session, *tables: str) -> None:
+    """Count a write the hooks cannot see (raw SQL such as dropping a partition)"""
+    _pending(session).update(tables)
+
+
+def snapshot(session: Session, tables: Iterable[str]) -> str:
+    """The tables' counters, in order, as one string"""
+    tables = list(tables)
+    versions = dict(session.execute(
+        select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(tables))
+    ).all())
+    return ".".join(str(versions.get(table, 0)) for table in tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    # new/dirty/deleted still hold the pre-flush state at this point
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table = getattr(obj, "__table__", None)
+        if table is not None:
+            _pending(session).add(table.name)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_statement(orm_execute_state):
+    # Guarded UPDATE ... RETURNING ledgers and bulk deletes bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _pending(orm_execute_state.session).add(orm_execute_state.statement.table.name)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_versions(session):
+    # Flush first: the commit's own flush comes after this hook
+    session.flush()
+    tables = sorted(session.info.get(_PENDING_KEY, ()))
+    if not tables:
+        return
+    connection = session.connection()
+    insert = dialect_insert(connection)
+    # One row per table, always bumped in name order so writers never deadlock
+    for table in tables:
+        statement = insert(_versions).values(table_name=table, version=1)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[_versions.c.table_name], set_={"version": _versions.c.version + 1}
+        ))
+
+
+@event.listens_for(Session, "after_commit")
+def _clear_changes(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison (RFC 9110 13.1.2) against an If-None-Match header"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def conditional(*tables: str):
+    """
+    Dependency for GET endpoints whose body depends only on ``tables``.
+    Sets a weak ETag derived from the URL and the tables' change counters,
+    and short-circuits with 304 when the client already holds that version.
+    """
+    def dependency(request: Request, response: Response, session: Session = Depends(get_session)):
+        # Read before the endpoint does (it shares this session), so a
+        # concurrent write can only make the tag older than the body (a
+        # wasted refetch, never stale data)
+        digest = hashlib.sha1(
+            f"{request.url.path}?{request.url.query}|{snapshot(session, tables)}".encode()
+        ).hexdigest()[:16]
+        etag = f'W/"{digest}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
@@ -0,0 +1,212 @@
+"""
+Idempotency keys for POST requests.
+
+A client that may retry a POST (the PWA on a patchy field connection) sends an
+``Idempotency-Key`` header, one fresh random value per submission. The first
+request with a key runs normally and its response is stored; a retry with the
+same key gets the stored response back, marked ``Idempotent-Replayed: true``,
+without the handler running again or the domain tables being touched.
+
+- The key is claimed (a row without a response yet) before the handler runs,
+  so a retry arriving while the first attempt is still running gets 409
+  rather than running it a second time.
+- Reusing a key for a different body is a client bug: 422.
+- 5xx responses are not kept; the claim is dropped so the retry runs again.
+- Responses are kept for IDEMPOTENCY_TTL_SECONDS. Finished keys are looked up
+  in an LRU cache in front of the table, so most replays cost no query, and
+  expired rows are swept by requests claiming new keys, at most once a minute.
+"""
+import hashlib
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.cache import ResultCache
+from app.models import IdempotencyKey
+
+HEADER = "idempotency-key"
+METHODS = {"POST"}
+MAX_KEY_LENGTH = 255
+
+# How long a claim holds its key if the process dies before answering
+CLAIM_TIMEOUT = timedelta(minutes=5)
+SWEEP_INTERVAL = timedelta(minutes=1)
+CLAIM_ATTEMPTS = 3
+
+_keys = IdempotencyKey.__table__
+
+
+class Stored(NamedTuple):
+    fingerprint: str
+    status_code: Optional[int]  # None while the first attempt is still running
+    content_type: Optional[str]
+    body: Optional[bytes]
+    expires_at: datetime
+
+
+def _stored(row) -> Stored:
+    return Stored(row.fingerprint, row.status_code, row.content_type, row.body, row.expires_at)
+
+
+class IdempotencyStore:
+    """Stored responses by key: the idempotencykey table behind an LRU cache"""
+
+    def __init__(self, engine: Engine, ttl_seconds: int, cache_size: int):
+        self.engine = engine
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.cache = ResultCache(maxsize=cache_size)
+        self._next_sweep = datetime.min
+
+    def claim(self, key: str, fingerprint: str) -> Optional[Stored]:
+        """
+        Claim ``key`` for a request about to run (returns None), or return
+        what is stored under it: a finished response, or a claim whose
+        request is still running (status_code None).
+        """
+        now = datetime.now()
+        stored = self.cache.get(key)
+        if stored is not None and stored.expires_at > now:
+            return stored
+        self._sweep(now)
+
+        for _ in range(CLAIM_ATTEMPTS):
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(
+                        insert(_keys).values(key=key, fingerprint=fingerprint, expires_at=now + CLAIM_TIMEOUT)
+                    )
+                return None
+            except IntegrityError:
+                pass
+            with self.engine.begin() as connection:
+                row = connection.execute(select(_keys).where(_keys.c.key == key)).first()
+                if row is not None and row.expires_at > now:
+                    stored = _stored(row)
+                    if stored.status_code is not None:
+                        self.cache.set(key, stored)
+                    return stored
+                # Gone, or expired before the sweep got to it: try again
+                connection.execute(delete(_keys).where(_keys.c.key == key, _keys.c.expires_at <= now))
+        # Lost every race for the key, so another request holds it
+        return Stored(fingerprint, None, None, None, now)
+
+    def complete(self, key: str, status_code: int, content_type: Optional[str], body: bytes) -> None:
+        """Store the response a claimed request answered with"""
+        with self.engine.begin() as connection:
+            row = connection.execute(
+                update(_keys)
+                .where(_keys.c.key == key)
+                .values(
+                    status_code=status_code,
+                    content_type=content_type,
+                    body=body,
+                    expires_at=datetime.now() + self.ttl,
+                )
+                .returning(*_keys.c)
+            ).first()
+        if row is not None:
+            self.cache.set(key, _stored(row))
+
+    def release(self, key: str) -> None:
+        """Drop a claim without a response, so the next attempt runs the request"""
+        with self.engine.begin() as connection:
+            connection.execute(delete(_keys).where(_keys.c.key == key, _keys.c.status_code.is_(None)))
+
+    def _sweep(self, now: datetime) -> None:
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + SWEEP_INTERVAL
+        with self.engine.begin() as connection:
+            connection.execute(delete(_keys).where(_keys.c.expires_at <= now))
+
+
+def _scoped_key(scope: Scope, client_key: str) -> str:
+    """Keys are the client's own, so scope them to the endpoint they were sent to"""
+    return hashlib.sha256(f"{scope['method']} {scope['path']} {client_key}".encode()).hexdigest()
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks: List[bytes] = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+class IdempotencyMiddleware:
+    """Replay the stored response to a POST retried with the same Idempotency-Key"""
+
+    def __init__(self, app: ASGIApp, engine: Engine, ttl_seconds: int, cache_size: int):
+        self.app = app
+        self.store = IdempotencyStore(engine, ttl_seconds, cache_size)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in METHODS:
+            return await self.app(scope, receive, send)
+        client_key = Headers(scope=scope).get(HEADER)
+        if client_key is None:
+            return await self.app(scope, receive, send)
+        if not 0 < len(client_key) <= MAX_KEY_LENGTH:
+            response = ORJSONResponse({"detail": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"}, 400)
+            return await response(scope, receive, send)
+
+        body = await _read_body(receive)
+        key = _scoped_key(scope, client_key)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        stored = await run_in_threadpool(self.store.claim, key, fingerprint)
+        if stored is not None:
+            if stored.fingerprint != fingerprint:
+                response = ORJSONResponse({"detail": "Idempotency-Key was already used for a different request"}, 422)
+            elif stored.status_code is None:
+                response = ORJSONResponse({"detail": "A request with this Idempotency-Key is still being processed"}, 409)
+            else:
+                response = Response(
+                    stored.body, stored.status_code, {"Idempotent-Replayed": "true"}, stored.content_type
+                )
+            return await response(scope, receive, send)
+
+        replayed = False
+
+        async def receive_body() -> Message:
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        # Hold the response until it is stored, so a client that has it can
+        # never retry ahead of the store
+        start: Message = {}
+        chunks: List[bytes] = []
+
+        async def capture(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        try:
+            await self.app(scope, receive_body, capture)
+        except Exception:
+            await run_in_threadpool(self.store.release, key)
+            raise
+
+        content = b"".join(chunks)
+        if start["status"] >= 500:
+            await run_in_threadpool(self.store.release, key)
+        else:
+            content_type = Headers(raw=start["headers"]).get("content-type")
+            await run_in_threadpool(self.store.complete, key, start["status"], content_type, content)
+        await send(start)
+        await send({"type": "http.response.body", "body": content})
@@ -0,0 +1,47 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+_local_locks: Dict[Tuple[int, int], threading.Lock] = {}
+_local_guard = threading.Lock()
+
+
+def _local_lock(namespace: int, key: int) -> threading.Lock:
+    with _local_guard:
+        return _local_locks.setdefault((namespace, key), threading.Lock())
+
+
+@contextmanager
+def advisory_lock(engine: Engine, namespace: int, key: int) -> Iterator[bool]:
+    """Hold an exclusive lock on (namespace, key) for the block.
+
+    Yields True when the lock was free, or False when another holder had it
+    and the block only runs once they let go, so callers can tell that
+    someone else just did the same work.
+
+    On Postgres this is a session-level advisory lock held on a connection of
+    its own, so it spans the caller's commits and is shared by every process.
+    Other databases get a lock within this process only.
+    """
+    if engine.dialect.name == "postgresql":
+        params = {"namespace": namespace, "key": key}
+        with engine.connect() as connection:
+            acquired = connection.execute(text("SELECT pg_try_advisory_lock(:namespace, :key)"), params).scalar()
+            if not acquired:
+                connection.execute(text("SELECT pg_advisory_lock(:namespace, :key)"), params)
+            try:
+                yield acquired
+            finally:
+                connection.execute(text("SELECT pg_advisory_unlock(:namespace, :key)"), params)
+        return
+
+    lock = _local_lock(namespace, key)
+    acquired = lock.acquire(blocking=False)
+    if not acquired:
+        lock.acquire()
+    try:
+        yield acquired
+    finally:
+        lock.release()
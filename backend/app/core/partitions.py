@@ -0,0 +1,110 @@
+"""
+Yearly range partitions for the append-only history tables (Postgres only).
+
+Migration 0002 turns teaplucking and milkrecord into tables partitioned by
+year on their date column, with a DEFAULT partition catching anything outside
+the yearly ranges. This module keeps the yearly partitions ahead of the
+calendar; it runs at deploy (python -m app.init_db), at server startup, and can
+be run from cron:
+
+    python -m app.core.partitions
+
+On SQLite (and on a Postgres schema that is not partitioned yet) everything
+here is a no-op, so the same ORM models work unchanged.
+"""
+import logging
+from datetime import date
+from typing import Iterable, Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# table -> partition key column
+PARTITIONED_TABLES = {
+    "teaplucking": "date",
+    "milkrecord": "date_recorded",
+}
+YEARS_AHEAD = 1
+
+
+def partition_name(table: str, year: int) -> str:
+    return f"{table}_y{year}"
+
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    return bool(conn.execute(
+        text(
+            "SELECT 1 FROM pg_partitioned_table p "
+            "JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = :table AND c.relnamespace = current_schema()::regnamespace"
+        ),
+        {"table": table},
+    ).scalar())
+
+
+def ensure_year_partition(conn: Connection, table: str, column: str, year: int) -> bool:
+    """
+    Create and attach the partition for ``year`` unless it exists.
+    Rows for that year already sitting in the DEFAULT partition are moved
+    into it first, otherwise Postgres refuses the attach. Returns True if a
+    partition was created.
+    """
+    name = partition_name(table, year)
+    # Serialise with any other process doing the same (deploy vs. startup)
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:table))"), {"table": table})
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return False
+
+    bounds = {"start": date(year, 1, 1), "end": date(year + 1, 1, 1)}
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conn.execute(
+        text(
+            f"WITH moved AS ("
+            f"DELETE FROM {table}_default WHERE {column} >= :start AND {column} < :end RETURNING *"
+            f") INSERT INTO {name} SELECT * FROM moved"
+        ),
+        bounds,
+    )
+    conn.execute(text(
+        f"ALTER TABLE {table} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+    ))
+    logger.info("Created partition %s", name)
+    return True
+
+
+def _default_partition_years(conn: Connection, table: str, column: str) -> Iterable[int]:
+    """Years of rows that landed in the DEFAULT partition (back-dated imports)"""
+    return [
+        int(year) for year in conn.execute(
+            text(f"SELECT DISTINCT extract(year FROM {column}) FROM {table}_default")
+        ).scalars()
+    ]
+
+
+def ensure_partitions(engine: Engine, today: Optional[date] = None) -> list:
+    """Make sure this year's and next year's partitions exist for every table"""
+    if engine.dialect.name != "postgresql":
+        return []
+
+    year = (today or date.today()).year
+    created = []
+    with engine.begin() as conn:
+        for table, column in PARTITIONED_TABLES.items():
+            if not is_partitioned(conn, table):
+                continue
+            years = set(range(year, year + YEARS_AHEAD + 1))
+            years.update(_default_partition_years(conn, table, column))
+            for target in sorted(years):
+                if ensure_year_partition(conn, table, column, target):
+                    created.append(partition_name(table, target))
+    return created
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    from app.database import engine
+
+    created = ensure_partitions(engine)
+    logger.info("Partitions created: %s", ", ".join(created) or "none")
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Iterable, Optional, Set
+import orjson
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+
+# Sent instead of whatever a slow client missed: drop local state and reconnect
+RESYNC = b"event: resync\ndata: {}\n\n"
+KEEPALIVE = b": keep-alive\n\n"
+
+
+def event_frame(event: str, data) -> bytes:
+    """One server-sent event, encoded once however many clients receive it"""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+class Subscription:
+    """One client's bounded queue of encoded events, read on its own event loop"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.loop = loop
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=queue_size)
+
+    def offer(self, frame: bytes) -> None:
+        # Runs on the subscriber's loop. A client that fell a queue behind
+        # loses the backlog and is told to resync, so publishers never wait
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            return
+        self.queue.put_nowait(frame)
+
+    async def get(self) -> bytes:
+        return await self.queue.get()
+
+
+class Hub:
+    """In-process publish/subscribe for server-sent events.
+
+    ``publish`` may be called from any thread (sync endpoints run in the
+    threadpool) and never blocks: each subscriber has a bounded queue, and
+    one that overflows is sent a single resync event in place of its backlog.
+    Subscribers only see events published by this process.
+    """
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[Subscription]:
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscription)
+
+    def publish(self, frame: bytes) -> int:
+        """Queue an encoded event for every subscriber; returns how many there were"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, frame)
+            except RuntimeError:
+                # Its loop has shut down; the subscription goes with it
+                pass
+        return len(subscribers)
+
+    def stream(self, opening: Optional[Callable[[], Iterable[bytes]]] = None, keepalive: float = 15.0) -> StreamingResponse:
+        """
+        An event-stream response: the frames ``opening()`` returns (a snapshot,
+        say), then everything published. ``opening`` runs once subscribed, so
+        nothing published meanwhile is missed.
+        """
+        async def frames():
+            async with self.subscribe() as subscription:
+                if opening is not None:
+                    for frame in await run_in_threadpool(opening):
+                        yield frame
+                while True:
+                    try:
+                        yield await asyncio.wait_for(subscription.get(), keepalive)
+                    except asyncio.TimeoutError:
+                        # Keeps proxies from closing an idle connection
+                        yield KEEPALIVE
+
+        return StreamingResponse(
+            frames(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
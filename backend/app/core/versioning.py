@@ -0,0 +1,92 @@
+"""
+Optimistic concurrency for the mutable tables.
+
+Every editable record carries a ``version`` that starts at 1 and goes up by
+one on each write. A PUT names the version the client last saw, in an
+If-Match header or as ``version`` in the body, and the update is one
+compare-and-swap statement:
+
+    UPDATE ... SET ..., version = version + 1
+    WHERE id = :id AND version = :expected RETURNING *
+
+No row back means the record is gone (404) or someone else wrote it first
+(409, and the client reloads). Clients that name no version keep
+last-writer-wins, but still move the version on.
+
+Writes the server makes itself (a payroll run closing advances, a bonus
+settling fertilizer, ...) bump the version too, in their UPDATE statements or
+through the flush hook below, so a client editing from a stale copy is
+refused rather than overwriting them.
+"""
+from typing import Optional, Type, TypeVar
+from fastapi import Header, HTTPException
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+from sqlmodel import SQLModel, select
+
+Record = TypeVar("Record", bound=SQLModel)
+
+
+def if_match(if_match: Optional[str] = Header(None)) -> Optional[int]:
+    """Dependency: the record version named by an If-Match header (3, "3" or W/"3")"""
+    if if_match is None:
+        return None
+    value = if_match.strip().removeprefix("W/").strip('"')
+    if not value.isdigit():
+        raise HTTPException(400, "If-Match must name a record version")
+    return int(value)
+
+
+def expected_version(body: SQLModel, header: Optional[int], read: Optional[int] = None) -> Optional[int]:
+    """
+    The version a PUT was made against: If-Match, else a version sent in the
+    body. Handlers that read the record first (to undo its old effects) pass
+    the version they read, so a write landing in between is refused rather
+    than undone with the wrong values.
+    """
+    if header is not None:
+        return header
+    if "version" in body.model_fields_set:
+        return body.version
+    return read
+
+
+def compare_and_swap(
+    session: Session,
+    model: Type[Record],
+    record_id: int,
+    values: dict,
+    expected: Optional[int],
+    not_found: str = "Record not found",
+) -> Record:
+    """Apply ``values`` to one record in a single versioned UPDATE ... RETURNING"""
+    statement = update(model).where(model.id == record_id)
+    if expected is not None:
+        statement = statement.where(model.version == expected)
+    record = session.execute(
+        statement.values(**values, version=model.version + 1).returning(model)
+    ).scalar_one_or_none()
+    if record is None:
+        current = session.execute(select(model.version).where(model.id == record_id)).scalar_one_or_none()
+        session.rollback()
+        if current is None:
+            raise HTTPException(404, not_found)
+        raise HTTPException(
+            409, f"Changed by someone else since version {expected} (now version {current}); reload and try again"
+        )
+    return record
+
+
+def commit_returning(session: Session, record: Record) -> Record:
+    """Commit and hand back ``record`` as written, without reloading it"""
+    session.flush()
+    session.expunge(record)
+    session.commit()
+    return record
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_versions(session, flush_context, instances):
+    for record in session.dirty:
+        if "version" in getattr(type(record), "model_fields", {}) and session.is_modified(record, include_collections=False):
+            record.version = (record.version or 0) + 1
@@ -1,10 +1,14 @@
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlmodel import Session
 from app.core.config import settings
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
+# Creating the engine does not connect; the schema is managed by Alembic
+# (see app/init_db.py), never at import time.
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -16,3 +20,12 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_session():
+    """SQLModel session dependency used by the app/routers modules"""
+    with Session(engine) as session:
+        yield session
+
+def dialect_insert(bind):
+    """The INSERT construct of the bind's dialect, which has ON CONFLICT (Postgres and SQLite)"""
+    return postgresql.insert if bind.dialect.name == "postgresql" else sqlite.insert
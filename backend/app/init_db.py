@@ -1,9 +1,33 @@
-from sqlmodel import SQLModel
-from app.database import engine
-from app import models
+"""
+Schema migration + seed step. Run once per deploy, before starting the server:
 
-print("Initializing database and creating tables...")
+    python -m app.init_db
+"""
+import logging
+from pathlib import Path
+from alembic import command
+from alembic.config import Config
 
-SQLModel.metadata.create_all(engine)
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
-print("✅ All tables created successfully.")
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+def run_migrations():
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "alembic"))
+    command.upgrade(config, "head")
+
+
+if __name__ == "__main__":
+    logger.info("Applying database migrations...")
+    run_migrations()
+
+    from app.core.partitions import ensure_partitions
+    from app.database import engine
+    ensure_partitions(engine)
+
+    from app.initial_data import init_db
+    init_db()
+    logger.info("✅ Database is up to date.")
@@ -1,5 +1,5 @@
 import logging
-from app.database import SessionLocal, engine, Base
+from app.database import SessionLocal
 from app.models import User, UserRole
 from app.core.security import get_password_hash
 
@@ -7,8 +7,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
-    
+    """Seed the default admin user (tables come from Alembic migrations)"""
     db = SessionLocal()
     try:
         user = db.query(User).filter(User.email == "admin@farm.com").first()
@@ -1,17 +1,46 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from brotli_asgi import BrotliMiddleware
 from app.core.config import settings
-from app.api import auth, crops, tasks, inventory
-from app.database import engine, Base
+from app.core.idempotency import IdempotencyMiddleware
+from app.core.partitions import ensure_partitions
+from app.database import engine
+from app.routers.registry import include_routers
 
-# Create tables on startup (for now, until we use Alembic)
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+# The schema is owned by Alembic migrations, run as a separate step
+# (python -m app.init_db) before the server starts.
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep next year's history partitions ahead of the calendar (Postgres only)
+    try:
+        ensure_partitions(engine)
+    except Exception:
+        logger.exception("Could not create yearly partitions")
+    yield
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     docs_url="/docs",
     redoc_url="/redoc",
+    # Responses are validated against typed response_models and rendered with
+    # orjson, which is several times faster than the stdlib json encoder
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
+
+# Innermost, so replays get the same CORS headers and compression as any response
+app.add_middleware(
+    IdempotencyMiddleware,
+    engine=engine,
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+    cache_size=settings.IDEMPOTENCY_CACHE_SIZE,
 )
 
 # Set all CORS enabled origins
@@ -22,6 +51,7 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["ETag", "Idempotent-Replayed"],
     )
 else:
     # Default to allow all for dev
@@ -31,12 +61,19 @@ else:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["ETag", "Idempotent-Replayed"],
     )
 
-app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
-app.include_router(crops.router, prefix=f"{settings.API_V1_STR}/crops", tags=["crops"])
-app.include_router(tasks.router, prefix=f"{settings.API_V1_STR}/tasks", tags=["tasks"])
-app.include_router(inventory.router, prefix=f"{settings.API_V1_STR}/inventory", tags=["inventory"])
+# Brotli when the client accepts it, gzip otherwise (not for event streams,
+# whose events would sit in the compressor's buffer)
+app.add_middleware(
+    BrotliMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    gzip_fallback=True,
+    excluded_handlers=[r"/stream$"],
+)
+
+include_routers(app)
 
 @app.get("/")
 def root():
@@ -1,6 +1,9 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Float, Enum, Text
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Float, Enum, Text, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
 import enum
 from app.database import Base
 
@@ -61,6 +64,43 @@ class InventoryItem(Base):
     image_url = Column(String, nullable=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
 
+    movements = relationship("StockMovement", back_populates="item", cascade="all, delete-orphan")
+
+    # Only items at or below their threshold are indexed, so low-stock
+    # lookups stay cheap however large the catalogue grows
+    __table_args__ = (
+        Index(
+            "ix_inventory_low_stock",
+            "id",
+            postgresql_where=quantity <= low_stock_threshold,
+            sqlite_where=quantity <= low_stock_threshold,
+        ),
+    )
+
+class StockMovementReason(str, enum.Enum):
+    INITIAL = "initial"
+    PURCHASE = "purchase"
+    USAGE = "usage"
+    ADJUSTMENT = "adjustment"
+
+class StockMovement(Base):
+    """Append-only journal of inventory quantity changes"""
+    __tablename__ = "stock_movements"
+
+    id = Column(Integer, primary_key=True, index=True)
+    item_id = Column(Integer, ForeignKey("inventory.id", ondelete="CASCADE"), nullable=False)
+    change = Column(Float, nullable=False)  # positive = stock in, negative = stock out
+    balance_after = Column(Float, nullable=False)
+    reason = Column(String, default=StockMovementReason.ADJUSTMENT)
+    note = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    item = relationship("InventoryItem", back_populates="movements")
+
+    __table_args__ = (
+        Index("ix_stock_movements_item_created", "item_id", "created_at"),
+    )
+
 class Task(Base):
     __tablename__ = "tasks"
 
@@ -82,3 +122,372 @@ class Report(Base):
     content = Column(Text)
     type = Column(String) # Yield, Expense, General
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# ==================== TEA ESTATE (SQLModel) ====================
+
+class Staff(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(index=True)
+    # Lower-cased, accent- and punctuation-free name; kept in sync with name
+    # by app.services.name_resolution
+    normalized_name: Optional[str] = Field(default=None, index=True)
+    role: str = "Tea Plucker"
+    pay_type: str = "per_kilo"  # per_kilo, monthly, daily
+    pay_rate: float = 0.0
+    version: int = 1  # bumped on every write, see app/core/versioning.py
+
+class StaffAlias(SQLModel, table=True):
+    """Another spelling of a worker's name, learnt when a match is confirmed"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    staff_id: int = Field(foreign_key="staff.id", index=True)
+    alias: str = Field(unique=True)  # normalized form
+    created_at: datetime = Field(default_factory=datetime.now)
+
+class Factory(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str
+    rate_per_kg: float = 22.0
+    transport_deduction: float = 3.0
+    location: Optional[str] = None
+    contact: Optional[str] = None
+    active: bool = True
+    version: int = 1
+
+class TeaPlucking(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    worker_id: int = Field(foreign_key="staff.id", index=True)
+    factory_id: Optional[int] = Field(default=None, foreign_key="factory.id", index=True)
+    quantity: float
+    # Yearly partition key on Postgres (migration 0002), so always set on insert
+    date: Optional[datetime] = Field(default=None, index=True)
+    comment: Optional[str] = None
+    # Payment breakdown, filled in by the teaplucking router
+    worker_rate: Optional[float] = None
+    factory_rate: Optional[float] = None
+    transport_deduction: Optional[float] = None
+    worker_payment: Optional[float] = None
+    factory_gross: Optional[float] = None
+    factory_net_to_farm: Optional[float] = None
+    farm_profit: Optional[float] = None
+    version: int = 1
+
+class WorkerAdvance(SQLModel, table=True):
+    """Track money advances given to workers"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    worker_id: int = Field(foreign_key="staff.id", index=True)
+    amount: float
+    date: Optional[datetime] = None
+    month: int
+    year: int
+    deducted: bool = False
+    notes: Optional[str] = None
+    version: int = 1
+
+class PayrollRun(SQLModel, table=True):
+    """One payroll calculation of a month, kept by app/services/payroll_runs.py"""
+    __table_args__ = (Index("ix_payrollrun_period", "year", "month"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    month: int
+    year: int
+    status: str = "running"  # running, completed, failed
+    workers_processed: int = 0
+    error: Optional[str] = None
+    started_at: datetime = Field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+
+class MonthlyPayroll(SQLModel, table=True):
+    # One payroll per worker and month, however many runs calculate it
+    __table_args__ = (UniqueConstraint("worker_id", "month", "year"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    worker_id: int = Field(foreign_key="staff.id", index=True)
+    run_id: Optional[int] = Field(default=None, foreign_key="payrollrun.id", index=True)
+    month: int
+    year: int
+    total_kg: float = 0.0
+    gross_earnings: float = 0.0
+    total_advances: float = 0.0  # Advances recovered from this month's pay
+    brought_forward: float = 0.0  # Owed from earlier months when the run started
+    carried_forward: float = 0.0  # Left owing after this month, recovered later
+    net_pay: float = 0.0
+    paid: bool = False
+    payment_date: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    version: int = 1
+
+class WorkerBalance(SQLModel, table=True):
+    """Running outstanding-advance balance per worker, kept by app/services/worker_balance.py"""
+    worker_id: int = Field(foreign_key="staff.id", primary_key=True)
+    outstanding: float = 0.0  # advances not yet recovered by payroll
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+class WorkerBalanceEntry(SQLModel, table=True):
+    """Append-only journal of changes to a WorkerBalance"""
+    __table_args__ = (Index("ix_workerbalanceentry_source", "source", "source_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    worker_id: int = Field(foreign_key="staff.id", index=True)
+    source: str  # workeradvance, monthlypayroll, backfill
+    source_id: Optional[int] = None
+    change: float  # positive = more owed
+    balance_after: float
+    created_at: datetime = Field(default_factory=datetime.now)
+
+UNSETTLED_BONUS_DEDUCTION = text("NOT paid AND payment_method = 'bonus_deduction'")
+
+class FertilizerPurchase(SQLModel, table=True):
+    """Track fertilizer purchases from factories"""
+    # Only purchases still waiting for a bonus are indexed, for settlement
+    __table_args__ = (
+        Index(
+            "ix_fertilizerpurchase_unsettled",
+            "factory_id",
+            "date",
+            postgresql_where=UNSETTLED_BONUS_DEDUCTION,
+            sqlite_where=UNSETTLED_BONUS_DEDUCTION,
+        ),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    factory_id: int = Field(foreign_key="factory.id", index=True)
+    bags: int
+    cost_per_bag: float = 2500.0
+    total_cost: float = 0.0
+    date: Optional[datetime] = None
+    payment_method: str = "tea_delivery"  # tea_delivery, bonus_deduction
+    paid: bool = False
+    payment_date: Optional[datetime] = None
+    notes: Optional[str] = None
+    # The bonus it was deducted from, once settled (app/services/bonus_settlement.py)
+    bonus_payment_id: Optional[int] = Field(default=None, foreign_key="bonuspayment.id", index=True)
+    version: int = 1
+
+class BonusPayment(SQLModel, table=True):
+    """Track biannual bonus payments"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    factory_id: int = Field(foreign_key="factory.id", index=True)
+    period: str  # e.g. "2024-H1"
+    amount: float
+    date_received: Optional[datetime] = None
+    fertilizer_deductions: float = 0.0
+    net_bonus: float = 0.0
+    notes: Optional[str] = None
+    version: int = 1
+
+class FactoryReconciliation(SQLModel, table=True):
+    """A factory's monthly statement checked against our tea records"""
+    __table_args__ = (UniqueConstraint("factory_id", "month", "year"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    factory_id: int = Field(foreign_key="factory.id", index=True)
+    month: int
+    year: int
+    statement_file: Optional[str] = None
+    amount_basis: str = "net"  # statement amounts compared with factory_net_to_farm or factory_gross
+    statement_kg: float = 0.0
+    recorded_kg: float = 0.0
+    statement_amount: Optional[float] = None
+    recorded_amount: float = 0.0
+    days_matched: int = 0
+    days_with_discrepancies: int = 0
+    status: str = "matched"  # matched, discrepancies
+    created_at: datetime = Field(default_factory=datetime.now)
+
+class ReconciliationLine(SQLModel, table=True):
+    """One delivery day of a FactoryReconciliation"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    reconciliation_id: int = Field(foreign_key="factoryreconciliation.id", index=True)
+    day: datetime
+    statement_kg: Optional[float] = None
+    recorded_kg: Optional[float] = None
+    kg_difference: float = 0.0  # statement - recorded
+    statement_amount: Optional[float] = None
+    recorded_amount: Optional[float] = None
+    amount_difference: Optional[float] = None
+    status: str = "ok"  # ok, kg_mismatch, amount_mismatch, missing_in_records, missing_in_statement
+
+# ==================== LIVESTOCK (SQLModel) ====================
+
+class Cow(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tag_no: str
+    breed: Optional[str] = None
+    lactation_no: int = 1
+    age: Optional[int] = None
+    status: str = "Lactating"
+    version: int = 1
+
+class MilkRecord(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    cow_id: int = Field(foreign_key="cow.id", index=True)
+    date_recorded: datetime = Field(default_factory=datetime.now, index=True)
+    quantity: float
+    notes: Optional[str] = None
+    version: int = 1
+
+class Flock(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    breed: str
+    date_added: Optional[datetime] = None
+    current_count: int = 0
+    mortality: int = 0
+    housing_unit: Optional[str] = None
+    version: int = 1
+
+class EggProduction(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    flock_id: int = Field(foreign_key="flock.id", index=True)
+    date_collected: datetime = Field(default_factory=datetime.now, index=True)
+    quantity: int
+    broken: int = 0
+    comments: Optional[str] = None
+    version: int = 1
+
+class Dog(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str
+    breed: Optional[str] = None
+    gender: str = "male"
+    dob: Optional[datetime] = None
+    status: str = "active"
+    litter_id: Optional[int] = Field(default=None, foreign_key="litter.id", index=True)  # the litter it was born in
+    version: int = 1
+
+class Litter(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    mother_id: int = Field(foreign_key="dog.id")
+    father_id: Optional[int] = Field(default=None, foreign_key="dog.id")
+    date_of_birth: Optional[datetime] = None
+    puppies_count: int = 0
+    version: int = 1
+
+# ==================== AVOCADO & FINANCE (SQLModel) ====================
+
+class AvocadoHarvest(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    variety: str = "hass"  # hass, fuerte
+    quantity_kg: float
+    grade: str = "A"
+    date: Optional[datetime] = None
+    notes: Optional[str] = None
+    version: int = 1
+
+class AvocadoSale(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    quantity_kg: float
+    price_per_kg: float
+    buyer_name: Optional[str] = None
+    date: Optional[datetime] = None
+    payment_status: str = "pending"
+    notes: Optional[str] = None
+    version: int = 1
+
+class Transaction(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    date: Optional[datetime] = None
+    category: str  # Income, Expense
+    description: Optional[str] = None
+    amount: float
+    unit: Optional[str] = None  # enterprise: tea, dairy, avocado, ...
+    version: int = 1
+
+class AvocadoStock(SQLModel, table=True):
+    """Running stock balance per avocado variety and grade"""
+    __table_args__ = (UniqueConstraint("variety", "grade"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    variety: str = Field(index=True)  # hass, fuerte
+    grade: str = "A"
+    harvested_kg: float = 0.0
+    sold_kg: float = 0.0
+    unsold_kg: float = 0.0
+    revenue: float = 0.0
+    harvest_records: int = 0
+    sales_records: int = 0
+
+class AvocadoStockMovement(SQLModel, table=True):
+    """Append-only journal of changes applied to an AvocadoStock balance"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    stock_id: int = Field(foreign_key="avocadostock.id", index=True)
+    source: str  # harvest, sale
+    source_id: int = Field(index=True)
+    harvested_kg: float = 0.0
+    sold_kg: float = 0.0
+    revenue: float = 0.0
+    balance_kg: float = 0.0  # unsold_kg after this movement
+    created_at: datetime = Field(default_factory=datetime.now)
+
+# ==================== LEDGER (SQLModel) ====================
+
+class LedgerAccount(SQLModel, table=True):
+    """An account of the farm's double-entry ledger with its running balance"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    code: str = Field(unique=True)  # tea_sales, cash, wages_payable, ...
+    name: str
+    kind: str  # asset, liability, income, expense
+    balance: float = 0.0  # debits minus credits
+
+class LedgerEntry(SQLModel, table=True):
+    """Append-only journal line; the lines booked for one source record always balance"""
+    __table_args__ = (Index("ix_ledgerentry_source", "source", "source_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    account_id: int = Field(foreign_key="ledgeraccount.id", index=True)
+    date: datetime = Field(index=True)
+    enterprise: str = "general"  # tea, avocado, dairy, ...
+    source: str  # teaplucking, avocadosale, bonuspayment, ...
+    source_id: int
+    debit: float = 0.0
+    credit: float = 0.0
+    balance_after: float = 0.0  # account balance after this line
+    memo: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.now)
+
+class ProfitLossMonth(SQLModel, table=True):
+    """Monthly P&L rollup per enterprise and income/expense account, kept by the ledger"""
+    __table_args__ = (UniqueConstraint("year", "month", "enterprise", "account_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    year: int
+    month: int
+    enterprise: str = Field(index=True)
+    account_id: int = Field(foreign_key="ledgeraccount.id")
+    income: float = 0.0
+    expense: float = 0.0
+
+# ==================== ARCHIVE (SQLModel) ====================
+
+class ArchivedPeriod(SQLModel, table=True):
+    """A closed year of a hot table that now lives in Parquet cold storage"""
+    __table_args__ = (UniqueConstraint("table_name", "year"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    table_name: str = Field(index=True)  # teaplucking, workeradvance, monthlypayroll
+    year: int
+    row_count: int = 0
+    path: str  # directory holding year=YYYY/month=MM/*.parquet
+    archived_at: datetime = Field(default_factory=datetime.now)
+
+# ==================== IDEMPOTENCY (SQLModel) ====================
+
+class IdempotencyKey(SQLModel, table=True):
+    """A POST answered under an Idempotency-Key, replayed when the client retries it"""
+    key: str = Field(primary_key=True)  # sha256 of method, path and the client's key
+    fingerprint: str  # sha256 of the request body
+    status_code: Optional[int] = None  # None while the first attempt is still running
+    content_type: Optional[str] = None
+    body: Optional[bytes] = None
+    expires_at: datetime = Field(index=True)
+
+# ==================== ETAG TABLE VERSIONS (SQLModel) ====================
+
+class TableVersion(SQLModel, table=True):
+    """Change counter of a table, bumped by every transaction that writes it (app/core/etag.py)"""
+    table_name: str = Field(primary_key=True)
+    version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+
+# Registers the ETag table-version hooks on every Session, so whatever writes
+# these models through one (the app, the archive CLI, seeding scripts) moves
+# the counters. Imported last: app.core.etag needs the models above.
+import app.core.etag  # noqa: E402,F401
@@ -1,28 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 from app.database import get_session
-from app.models import WorkerAdvance, Staff
+from app.core.etag import conditional
+from app.core.versioning import commit_returning, compare_and_swap, expected_version, if_match
+from app.models import WorkerAdvance, WorkerBalance, WorkerBalanceEntry, Staff
+from app.schemas import AdvanceBulkUpdate, AdvanceFilter, AdvanceRead, BulkEditResult, WorkerBalanceRead
+from app.services import archive, bulk_edit, ledger, worker_balance
 from datetime import datetime
+from typing import List, Optional
 from sqlalchemy import and_, func
 
 router = APIRouter()
 
-@router.get("/")
+def _advances_with_worker(session: Session, *conditions):
+    """Advances joined with their worker's name in one query"""
+    return session.exec(
+        select(
+            *WorkerAdvance.__table__.columns,
+            func.coalesce(Staff.name, "Unknown").label("worker_name")
+        )
+        .select_from(WorkerAdvance)
+        .outerjoin(Staff, Staff.id == WorkerAdvance.worker_id)
+        .where(*conditions)
+    ).all()
+
+@router.get("/", response_model=List[AdvanceRead], dependencies=[Depends(conditional("workeradvance", "staff"))])
 def list_advances(session: Session = Depends(get_session)):
     """List all worker advances"""
-    advances = session.exec(select(WorkerAdvance)).all()
-    
-    detailed_advances = []
-    for advance in advances:
-        worker = session.get(Staff, advance.worker_id)
-        detailed_advances.append({
-            **advance.dict(),
-            "worker_name": worker.name if worker else "Unknown"
-        })
-    
-    return detailed_advances
+    return _advances_with_worker(session)
 
-@router.post("/")
+@router.post("/", response_model=WorkerAdvance)
 def add_advance(advance: WorkerAdvance, session: Session = Depends(get_session)):
     """Record a new advance given to worker"""
     # Verify worker exists
@@ -33,100 +40,193 @@ def add_advance(advance: WorkerAdvance, session: Session = Depends(get_session))
     # Set date if not provided
     if not advance.date:
         advance.date = datetime.now()
+    archive.ensure_writable(session, "workeradvance", advance.year)
     
     session.add(advance)
+    session.flush()
+    ledger.book(session, advance)
+    worker_balance.move_advance(session, advance.id, None, worker_balance.owed(advance))
     session.commit()
     session.refresh(advance)
     return advance
 
-@router.get("/worker/{worker_id}")
+@router.get("/worker/{worker_id}", response_model=List[WorkerAdvance])
 def get_worker_advances(worker_id: int, session: Session = Depends(get_session)):
-    """Get all advances for a specific worker"""
+    """Get all advances for a specific worker, archived years included"""
     advances = session.exec(
         select(WorkerAdvance).where(WorkerAdvance.worker_id == worker_id)
     ).all()
-    return advances
+    return archive.read_archived(session, WorkerAdvance, worker_id=worker_id) + list(advances)
 
-@router.get("/month/{month}/{year}")
+@router.get("/month/{month}/{year}", response_model=List[AdvanceRead])
 def get_month_advances(month: int, year: int, session: Session = Depends(get_session)):
     """Get all advances for a specific month"""
     if month < 1 or month > 12:
         raise HTTPException(400, "Invalid month. Must be between 1 and 12")
     
-    advances = session.exec(
-        select(WorkerAdvance).where(
-            and_(
-                WorkerAdvance.month == month,
-                WorkerAdvance.year == year
-            )
-        )
-    ).all()
-    
-    detailed_advances = []
-    for advance in advances:
-        worker = session.get(Staff, advance.worker_id)
-        detailed_advances.append({
-            **advance.dict(),
-            "worker_name": worker.name if worker else "Unknown"
-        })
+    if archive.is_archived(session, "workeradvance", year):
+        names = dict(session.exec(select(Staff.id, Staff.name)).all())
+        return [
+            AdvanceRead(**advance.model_dump(), worker_name=names.get(advance.worker_id, "Unknown"))
+            for advance in archive.read_archived(session, WorkerAdvance, year, month)
+        ]
     
-    return detailed_advances
+    return _advances_with_worker(
+        session,
+        and_(
+            WorkerAdvance.month == month,
+            WorkerAdvance.year == year
+        )
+    )
 
-@router.get("/pending")
+@router.get("/pending", response_model=List[AdvanceRead])
 def get_pending_advances(session: Session = Depends(get_session)):
     """Get all advances that haven't been deducted yet"""
-    advances = session.exec(
-        select(WorkerAdvance).where(WorkerAdvance.deducted == False)
+    return _advances_with_worker(session, WorkerAdvance.deducted == False)
+
+def _balances_with_worker(session: Session, *conditions):
+    """Outstanding balances joined with their worker's name in one query"""
+    return session.exec(
+        select(
+            *WorkerBalance.__table__.columns,
+            func.coalesce(Staff.name, "Unknown").label("worker_name")
+        )
+        .select_from(WorkerBalance)
+        .outerjoin(Staff, Staff.id == WorkerBalance.worker_id)
+        .where(*conditions)
+        .order_by(WorkerBalance.worker_id)
     ).all()
+
+@router.get("/balances", response_model=List[WorkerBalanceRead], dependencies=[Depends(conditional("workerbalance", "staff"))])
+def list_balances(session: Session = Depends(get_session)):
+    """Outstanding advance balance of every worker who owes something"""
+    return _balances_with_worker(session, WorkerBalance.outstanding != 0)
+
+@router.get("/balances/{worker_id}", response_model=WorkerBalanceRead)
+def get_balance(worker_id: int, session: Session = Depends(get_session)):
+    """A worker's outstanding advance balance, carried forward amounts included"""
+    worker = session.get(Staff, worker_id)
+    if not worker:
+        raise HTTPException(404, "Worker not found")
+    balance = session.get(WorkerBalance, worker_id)
+    return WorkerBalanceRead(
+        worker_id=worker_id,
+        worker_name=worker.name,
+        outstanding=balance.outstanding if balance else 0.0,
+        updated_at=balance.updated_at if balance else None
+    )
+
+@router.get("/balances/{worker_id}/entries", response_model=List[WorkerBalanceEntry])
+def get_balance_entries(worker_id: int, limit: int = 100, session: Session = Depends(get_session)):
+    """Latest changes to a worker's balance, newest first"""
+    return session.exec(
+        select(WorkerBalanceEntry)
+        .where(WorkerBalanceEntry.worker_id == worker_id)
+        .order_by(WorkerBalanceEntry.id.desc())
+        .limit(limit)
+    ).all()
+
+@router.post("/balances/rebuild")
+def rebuild_balances(session: Session = Depends(get_session)):
+    """Recompute every balance from advances and payroll carry-forwards"""
+    corrected = worker_balance.rebuild(session)
+    session.commit()
+    return {"ok": True, "workers_corrected": corrected}
+
+@router.post("/bulk-update", response_model=BulkEditResult)
+def bulk_update_advances(edit: AdvanceBulkUpdate, dry_run: bool = False, session: Session = Depends(get_session)):
+    """Change every advance a filter matches in one UPDATE; a dry run only counts the matches"""
+    conditions = bulk_edit.where(WorkerAdvance, edit.where, WorkerAdvance.date)
+    values = bulk_edit.changes(WorkerAdvance, edit.set)
+    if "worker_id" in values and not session.get(Staff, values["worker_id"]):
+        raise HTTPException(404, "Worker not found")
+    if "month" in values and not 1 <= values["month"] <= 12:
+        raise HTTPException(400, "Invalid month. Must be between 1 and 12")
+    if "year" in values:
+        archive.ensure_writable(session, "workeradvance", values["year"])
+    if dry_run:
+        return bulk_edit.dry_run(session, WorkerAdvance, conditions)
+    
+    owed = {}
+    if values.keys() & {"worker_id", "amount", "deducted"}:
+        # Balances move from what each advance owed before; lock those rows
+        # and update exactly them
+        owed = {
+            advance.id: worker_balance.owed(advance)
+            for advance in session.exec(
+                select(WorkerAdvance.id, WorkerAdvance.worker_id, WorkerAdvance.amount, WorkerAdvance.deducted)
+                .where(*conditions)
+                .with_for_update()
+            ).all()
+        }
+        conditions = [WorkerAdvance.id.in_(list(owed))]
     
-    detailed_advances = []
-    for advance in advances:
-        worker = session.get(Staff, advance.worker_id)
-        detailed_advances.append({
-            **advance.dict(),
-            "worker_name": worker.name if worker else "Unknown"
-        })
+    rows = bulk_edit.update_where(session, WorkerAdvance, conditions, values)
+    ledger.book_many(session, WorkerAdvance, rows)
+    if owed:
+        worker_balance.move_advances(session, [(row.id, owed[row.id], worker_balance.owed(row)) for row in rows])
+    session.commit()
+    return bulk_edit.result(rows)
+
+@router.post("/bulk-delete", response_model=BulkEditResult)
+def bulk_delete_advances(where: AdvanceFilter, dry_run: bool = False, session: Session = Depends(get_session)):
+    """Delete every advance a filter matches in one DELETE; a dry run only counts the matches"""
+    conditions = bulk_edit.where(WorkerAdvance, where, WorkerAdvance.date)
+    if dry_run:
+        return bulk_edit.dry_run(session, WorkerAdvance, conditions)
     
-    return detailed_advances
+    rows = bulk_edit.delete_where(session, WorkerAdvance, conditions)
+    ledger.unbook_many(session, WorkerAdvance, (row.id for row in rows))
+    worker_balance.move_advances(session, [(row.id, worker_balance.owed(row), None) for row in rows])
+    session.commit()
+    return bulk_edit.result(rows)
 
-@router.put("/{advance_id}")
+@router.put("/{advance_id}", response_model=WorkerAdvance)
 def update_advance(
     advance_id: int,
     updated_advance: WorkerAdvance,
+    expected: Optional[int] = Depends(if_match),
     session: Session = Depends(get_session)
 ):
-    """Update an advance record"""
+    """Update an advance record, refused with 409 if it changed since the version the client sent"""
     advance = session.get(WorkerAdvance, advance_id)
     if not advance:
         raise HTTPException(404, "Advance not found")
+    archive.ensure_writable(session, "workeradvance", updated_advance.year)
+    owed = worker_balance.owed(advance)
     
-    advance.worker_id = updated_advance.worker_id
-    advance.amount = updated_advance.amount
-    advance.date = updated_advance.date
-    advance.month = updated_advance.month
-    advance.year = updated_advance.year
-    advance.deducted = updated_advance.deducted
-    advance.notes = updated_advance.notes
-    
-    session.add(advance)
-    session.commit()
-    session.refresh(advance)
-    return advance
+    advance = compare_and_swap(session, WorkerAdvance, advance_id, {
+        "worker_id": updated_advance.worker_id,
+        "amount": updated_advance.amount,
+        "date": updated_advance.date,
+        "month": updated_advance.month,
+        "year": updated_advance.year,
+        "deducted": updated_advance.deducted,
+        "notes": updated_advance.notes,
+    }, expected_version(updated_advance, expected, advance.version), "Advance not found")
+    ledger.book(session, advance)
+    worker_balance.move_advance(session, advance.id, owed, worker_balance.owed(advance))
+    return commit_returning(session, advance)
 
-@router.put("/{advance_id}/mark-deducted")
-def mark_advance_deducted(advance_id: int, session: Session = Depends(get_session)):
+@router.put("/{advance_id}/mark-deducted", response_model=WorkerAdvance)
+def mark_advance_deducted(
+    advance_id: int,
+    expected: Optional[int] = Depends(if_match),
+    session: Session = Depends(get_session)
+):
     """Mark an advance as deducted from payroll"""
     advance = session.get(WorkerAdvance, advance_id)
     if not advance:
         raise HTTPException(404, "Advance not found")
+    owed = worker_balance.owed(advance)
     
-    advance.deducted = True
-    
-    session.add(advance)
-    session.commit()
-    session.refresh(advance)
-    
-    return advance
+    # Repaid outside payroll, so it no longer counts towards the balance
+    advance = compare_and_swap(
+        session, WorkerAdvance, advance_id, {"deducted": True},
+        advance.version if expected is None else expected, "Advance not found"
+    )
+    worker_balance.move_advance(session, advance.id, owed, worker_balance.owed(advance))
+    return commit_returning(session, advance)
 
 @router.delete("/{advance_id}")
 def delete_advance(advance_id: int, session: Session = Depends(get_session)):
@@ -135,25 +235,30 @@ def delete_advance(advance_id: int, session: Session = Depends(get_session)):
     if not advance:
         raise HTTPException(404, "Advance not found")
     
+    ledger.unbook(session, WorkerAdvance, advance.id)
+    worker_balance.move_advance(session, advance.id, worker_balance.owed(advance), None)
     session.delete(advance)
     session.commit()
     return {"ok": True}
 
-@router.get("/summary/{month}/{year}")
+@router.get("/summary/{month}/{year}", dependencies=[Depends(conditional("workeradvance"))])
 def get_advances_summary(month: int, year: int, session: Session = Depends(get_session)):
     """Get summary of advances for a specific month"""
     
     if month < 1 or month > 12:
         raise HTTPException(400, "Invalid month. Must be between 1 and 12")
     
-    advances = session.exec(
-        select(WorkerAdvance).where(
-            and_(
-                WorkerAdvance.month == month,
-                WorkerAdvance.year == year
+    if archive.is_archived(session, "workeradvance", year):
+        advances = archive.read_archived(session, WorkerAdvance, year, month)
+    else:
+        advances = session.exec(
+            select(WorkerAdvance).where(
+                and_(
+                    WorkerAdvance.month == month,
+                    WorkerAdvance.year == year
+                )
             )
-        )
-    ).all()
+        ).all()
     
     total_amount = sum(a.amount for a in advances)
     pending_amount = sum(a.amount for a in advances if not a.deducted)
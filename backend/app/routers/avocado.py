@@ -1,31 +1,152 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
-from app.database import get_session
-from app.models import AvocadoHarvest, AvocadoSale
+from app.database import dialect_insert, get_session
+from app.models import AvocadoHarvest, AvocadoSale, AvocadoStock, AvocadoStockMovement
+from app.schemas import AvocadoSaleRead
+from app.services import ledger
+from app.core.config import settings
+from app.core.versioning import commit_returning, compare_and_swap, expected_version, if_match
 from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import update
 
 router = APIRouter()
 
+# ==================== STOCK LEDGER ====================
+
+def _get_stock(session: Session, variety: str, grade: str) -> AvocadoStock:
+    """Get (or open) the ledger balance for a variety/grade"""
+    stock = session.exec(
+        select(AvocadoStock).where(
+            AvocadoStock.variety == variety,
+            AvocadoStock.grade == grade
+        )
+    ).first()
+    if not stock:
+        # ON CONFLICT DO NOTHING: two first movements of a new variety/grade
+        # both open it, and both then read the one row
+        session.execute(
+            dialect_insert(session.get_bind())(AvocadoStock.__table__)
+            .values(variety=variety, grade=grade)
+            .on_conflict_do_nothing(index_elements=["variety", "grade"])
+        )
+        stock = session.exec(
+            select(AvocadoStock).where(
+                AvocadoStock.variety == variety,
+                AvocadoStock.grade == grade
+            )
+        ).one()
+    return stock
+
+def _post_movement(
+    session: Session,
+    stock: AvocadoStock,
+    source: str,
+    source_id: int,
+    harvested_kg: float = 0.0,
+    sold_kg: float = 0.0,
+    revenue: float = 0.0,
+    records: int = 0
+):
+    """
+    Apply a movement to a stock balance in a single guarded UPDATE.
+    Rejects (400) any movement that would leave unsold stock negative.
+    """
+    variety, grade = stock.variety, stock.grade
+    delta = harvested_kg - sold_kg
+    counters = {
+        AvocadoStock.harvest_records: AvocadoStock.harvest_records + (records if source == "harvest" else 0),
+        AvocadoStock.sales_records: AvocadoStock.sales_records + (records if source == "sale" else 0),
+    }
+    balance = session.execute(
+        update(AvocadoStock)
+        .where(
+            AvocadoStock.id == stock.id,
+            AvocadoStock.unsold_kg + delta >= -1e-9
+        )
+        .values({
+            AvocadoStock.harvested_kg: AvocadoStock.harvested_kg + harvested_kg,
+            AvocadoStock.sold_kg: AvocadoStock.sold_kg + sold_kg,
+            AvocadoStock.unsold_kg: AvocadoStock.unsold_kg + delta,
+            AvocadoStock.revenue: AvocadoStock.revenue + revenue,
+            **counters
+        })
+        .returning(AvocadoStock.unsold_kg)
+    ).scalar()
+    
+    if balance is None:
+        session.rollback()
+        available = session.get(AvocadoStock, stock.id)
+        raise HTTPException(
+            400,
+            f"Insufficient {variety} grade {grade} stock: "
+            f"{available.unsold_kg if available else 0:.1f} kg available"
+        )
+    
+    session.add(AvocadoStockMovement(
+        stock_id=stock.id,
+        source=source,
+        source_id=source_id,
+        harvested_kg=harvested_kg,
+        sold_kg=sold_kg,
+        revenue=revenue,
+        balance_kg=balance
+    ))
+
+def _movement_totals(session: Session, source: str, source_id: int):
+    """Net (harvested, sold, revenue) per stock booked so far for a harvest or sale"""
+    movements = session.exec(
+        select(AvocadoStockMovement).where(
+            AvocadoStockMovement.source == source,
+            AvocadoStockMovement.source_id == source_id
+        )
+    ).all()
+    
+    totals = {}
+    for movement in movements:
+        harvested, sold, revenue = totals.get(movement.stock_id, (0.0, 0.0, 0.0))
+        totals[movement.stock_id] = (
+            harvested + movement.harvested_kg,
+            sold + movement.sold_kg,
+            revenue + movement.revenue
+        )
+    return totals
+
+def _reverse_movements(session: Session, source: str, source_id: int, totals: dict):
+    """Post the opposite of previously booked totals (see _movement_totals)"""
+    for stock_id, (harvested, sold, revenue) in totals.items():
+        if abs(harvested) < 1e-9 and abs(sold) < 1e-9 and abs(revenue) < 1e-9:
+            continue
+        _post_movement(
+            session, session.get(AvocadoStock, stock_id), source, source_id,
+            harvested_kg=-harvested, sold_kg=-sold, revenue=-revenue, records=-1
+        )
+
 # ==================== AVOCADO HARVEST ENDPOINTS ====================
 
-@router.get("/harvest/")
+@router.get("/harvest/", response_model=List[AvocadoHarvest])
 def list_harvests(session: Session = Depends(get_session)):
     """List all avocado harvest records"""
     harvests = session.exec(select(AvocadoHarvest)).all()
     return harvests
 
-@router.post("/harvest/")
+@router.post("/harvest/", response_model=AvocadoHarvest)
 def add_harvest(harvest: AvocadoHarvest, session: Session = Depends(get_session)):
     """Add a new avocado harvest record"""
     if not harvest.date:
         harvest.date = datetime.now()
     
     session.add(harvest)
+    session.flush()
+    _post_movement(
+        session, _get_stock(session, harvest.variety, harvest.grade), "harvest", harvest.id,
+        harvested_kg=harvest.quantity_kg, records=1
+    )
     session.commit()
     session.refresh(harvest)
     return harvest
 
-@router.get("/harvest/{harvest_id}")
+@router.get("/harvest/{harvest_id}", response_model=AvocadoHarvest)
 def get_harvest(harvest_id: int, session: Session = Depends(get_session)):
     """Get a specific harvest record"""
     harvest = session.get(AvocadoHarvest, harvest_id)
@@ -33,23 +154,31 @@ def get_harvest(harvest_id: int, session: Session = Depends(get_session)):
         raise HTTPException(404, "Harvest record not found")
     return harvest
 
-@router.put("/harvest/{harvest_id}")
-def update_harvest(harvest_id: int, updated_harvest: AvocadoHarvest, session: Session = Depends(get_session)):
-    """Update a harvest record"""
-    harvest = session.get(AvocadoHarvest, harvest_id)
-    if not harvest:
-        raise HTTPException(404, "Harvest record not found")
-    
-    harvest.variety = updated_harvest.variety
-    harvest.quantity_kg = updated_harvest.quantity_kg
-    harvest.grade = updated_harvest.grade
-    harvest.date = updated_harvest.date
-    harvest.notes = updated_harvest.notes
+@router.put("/harvest/{harvest_id}", response_model=AvocadoHarvest)
+def update_harvest(
+    harvest_id: int,
+    updated_harvest: AvocadoHarvest,
+    expected: Optional[int] = Depends(if_match),
+    session: Session = Depends(get_session)
+):
+    """Update a harvest record, refused with 409 if it changed since the version the client sent"""
+    harvest = compare_and_swap(session, AvocadoHarvest, harvest_id, {
+        "variety": updated_harvest.variety,
+        "quantity_kg": updated_harvest.quantity_kg,
+        "grade": updated_harvest.grade,
+        "date": updated_harvest.date,
+        "notes": updated_harvest.notes,
+    }, expected_version(updated_harvest, expected), "Harvest record not found")
     
-    session.add(harvest)
-    session.commit()
-    session.refresh(harvest)
-    return harvest
+    # Book the new quantity before reversing the old one so a same-bucket
+    # edit is only rejected if the net change would oversell
+    booked = _movement_totals(session, "harvest", harvest.id)
+    _post_movement(
+        session, _get_stock(session, updated_harvest.variety, updated_harvest.grade), "harvest", harvest.id,
+        harvested_kg=updated_harvest.quantity_kg, records=1
+    )
+    _reverse_movements(session, "harvest", harvest.id, booked)
+    return commit_returning(session, harvest)
 
 @router.delete("/harvest/{harvest_id}")
 def delete_harvest(harvest_id: int, session: Session = Depends(get_session)):
@@ -58,40 +187,47 @@ def delete_harvest(harvest_id: int, session: Session = Depends(get_session)):
     if not harvest:
         raise HTTPException(404, "Harvest record not found")
     
+    _reverse_movements(session, "harvest", harvest.id, _movement_totals(session, "harvest", harvest.id))
     session.delete(harvest)
     session.commit()
     return {"ok": True}
 
 # ==================== AVOCADO SALES ENDPOINTS ====================
 
-@router.get("/sales/")
+@router.get("/sales/", response_model=List[AvocadoSaleRead])
 def list_sales(session: Session = Depends(get_session)):
     """List all avocado sales"""
-    sales = session.exec(select(AvocadoSale)).all()
-    
-    detailed_sales = []
-    for sale in sales:
-        # Calculate total amount
-        total_amount = sale.quantity_kg * sale.price_per_kg
-        detailed_sales.append({
-            **sale.dict(),
-            "total_amount": total_amount
-        })
-    
-    return detailed_sales
+    # Total amount is computed in SQL rather than per row in Python
+    return session.exec(
+        select(
+            *AvocadoSale.__table__.columns,
+            (AvocadoSale.quantity_kg * AvocadoSale.price_per_kg).label("total_amount")
+        )
+    ).all()
 
-@router.post("/sales/")
-def add_sale(sale: AvocadoSale, session: Session = Depends(get_session)):
-    """Add a new avocado sale"""
+@router.post("/sales/", response_model=AvocadoSale)
+def add_sale(
+    sale: AvocadoSale,
+    variety: str = "hass",
+    grade: str = "A",
+    session: Session = Depends(get_session)
+):
+    """Add a new avocado sale, drawn from the given variety/grade stock"""
     if not sale.date:
         sale.date = datetime.now()
     
     session.add(sale)
+    session.flush()
+    _post_movement(
+        session, _get_stock(session, variety, grade), "sale", sale.id,
+        sold_kg=sale.quantity_kg, revenue=sale.quantity_kg * sale.price_per_kg, records=1
+    )
+    ledger.book(session, sale)
     session.commit()
     session.refresh(sale)
     return sale
 
-@router.get("/sales/{sale_id}")
+@router.get("/sales/{sale_id}", response_model=AvocadoSale)
 def get_sale(sale_id: int, session: Session = Depends(get_session)):
     """Get a specific sale"""
     sale = session.get(AvocadoSale, sale_id)
@@ -106,36 +242,86 @@ def delete_sale(sale_id: int, session: Session = Depends(get_session)):
     if not sale:
         raise HTTPException(404, "Sale not found")
     
+    _reverse_movements(session, "sale", sale.id, _movement_totals(session, "sale", sale.id))
+    ledger.unbook(session, AvocadoSale, sale.id)
     session.delete(sale)
     session.commit()
     return {"ok": True}
 
 #==================== STATISTICS ENDPOINTS ====================
 
+@router.get("/stock/", response_model=List[AvocadoStock])
+def list_stock(session: Session = Depends(get_session)):
+    """Current stock ledger balances per variety and grade"""
+    return session.exec(
+        select(AvocadoStock).order_by(AvocadoStock.variety, AvocadoStock.grade)
+    ).all()
+
+@router.post("/stock/backfill")
+def backfill_stock(session: Session = Depends(get_session)):
+    """
+    Book harvests and sales recorded before the ledger existed.
+    Legacy sales carry no variety/grade, so they are drawn from hass grade A.
+    """
+    booked = select(AvocadoStockMovement.source_id)
+    
+    harvests = session.exec(
+        select(AvocadoHarvest).where(
+            AvocadoHarvest.id.not_in(booked.where(AvocadoStockMovement.source == "harvest"))
+        )
+    ).all()
+    for harvest in harvests:
+        _post_movement(
+            session, _get_stock(session, harvest.variety, harvest.grade), "harvest", harvest.id,
+            harvested_kg=harvest.quantity_kg, records=1
+        )
+    
+    sales = session.exec(
+        select(AvocadoSale).where(
+            AvocadoSale.id.not_in(booked.where(AvocadoStockMovement.source == "sale"))
+        )
+    ).all()
+    for sale in sales:
+        _post_movement(
+            session, _get_stock(session, "hass", "A"), "sale", sale.id,
+            sold_kg=sale.quantity_kg, revenue=sale.quantity_kg * sale.price_per_kg, records=1
+        )
+    
+    session.commit()
+    return {"ok": True, "harvests_booked": len(harvests), "sales_booked": len(sales)}
+
 @router.get("/stats/")
 def get_avocado_stats(session: Session = Depends(get_session)):
-    """Get avocado farm statistics"""
-    harvests = session.exec(select(AvocadoHarvest)).all()
-    sales = session.exec(select(AvocadoSale)).all()
+    """Get avocado farm statistics from the stock ledger balances"""
+    # One row per variety/grade, so this stays small regardless of history
+    stocks = session.exec(select(AvocadoStock)).all()
     
-    total_harvested = sum(h.quantity_kg for h in harvests)
-    total_sold = sum(s.quantity_kg for s in sales)
-    total_revenue = sum(s.quantity_kg * s.price_per_kg for s in sales)
-    
-    hass_harvested = sum(h.quantity_kg for h in harvests if h.variety == 'hass')
-    fuerte_harvested = sum(h.quantity_kg for h in harvests if h.variety == 'fuerte')
+    totals = {
+        "harvested_kg": 0.0,
+        "sold_kg": 0.0,
+        "unsold_kg": 0.0,
+        "revenue": 0.0,
+        "harvest_records": 0,
+        "sales_records": 0
+    }
+    varieties = {}
+    for stock in stocks:
+        for key in totals:
+            totals[key] += getattr(stock, key)
+        varieties[stock.variety] = varieties.get(stock.variety, 0.0) + stock.harvested_kg
     
-    avg_price = total_revenue / total_sold if total_sold > 0 else 0
+    avg_price = totals["revenue"] / totals["sold_kg"] if totals["sold_kg"] > 0 else 0
     
     return {
-        "total_trees": 40,  # As mentioned: over 40 grafted trees
-        "total_harvested_kg": total_harvested,
-        "total_sold_kg": total_sold,
-        "unsold_kg": total_harvested - total_sold,
-        "total_revenue": total_revenue,
+        "total_trees": settings.AVOCADO_TREE_COUNT,
+        "total_harvested_kg": totals["harvested_kg"],
+        "total_sold_kg": totals["sold_kg"],
+        "unsold_kg": totals["unsold_kg"],
+        "total_revenue": totals["revenue"],
         "average_price_per_kg": avg_price,
-        "hass_harvested_kg": hass_harvested,
-        "fuerte_harvested_kg": fuerte_harvested,
-        "total_harvest_records": len(harvests),
-        "total_sales_records": len(sales)
+        "hass_harvested_kg": varieties.get("hass", 0.0),
+        "fuerte_harvested_kg": varieties.get("fuerte", 0.0),
+        "total_harvest_records": totals["harvest_records"],
+        "total_sales_records": totals["sales_records"],
+        "stock": stocks
     }
@@ -1,28 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 from app.database import get_session
+from app.core.etag import conditional
+from app.core.versioning import commit_returning, compare_and_swap, expected_version, if_match
 from app.models import BonusPayment, Factory
+from app.schemas import BonusRead, SettlementResult
+from app.services import bonus_settlement, ledger
 from datetime import datetime
-from sqlalchemy import and_
+from typing import List, Optional
+from sqlalchemy import and_, func
 
 router = APIRouter()
 
-@router.get("/")
+def _bonuses_with_factory(session: Session, *conditions):
+    """Bonus payments joined with their factory's name in one query"""
+    return session.exec(
+        select(
+            *BonusPayment.__table__.columns,
+            func.coalesce(Factory.name, "Unknown").label("factory_name")
+        )
+        .select_from(BonusPayment)
+        .outerjoin(Factory, Factory.id == BonusPayment.factory_id)
+        .where(*conditions)
+    ).all()
+
+@router.get("/", response_model=List[BonusRead], dependencies=[Depends(conditional("bonuspayment", "factory"))])
 def list_bonus_payments(session: Session = Depends(get_session)):
     """List all bonus payments"""
-    bonuses = session.exec(select(BonusPayment)).all()
-    
-    detailed_bonuses = []
-    for bonus in bonuses:
-        factory = session.get(Factory, bonus.factory_id)
-        detailed_bonuses.append({
-            **bonus.dict(),
-            "factory_name": factory.name if factory else "Unknown"
-        })
-    
-    return detailed_bonuses
+    return _bonuses_with_factory(session)
 
-@router.post("/")
+@router.post("/", response_model=BonusPayment)
 def add_bonus_payment(bonus: BonusPayment, session: Session = Depends(get_session)):
     """Record a new bonus payment from a factory"""
     # Verify factory exists
@@ -38,11 +45,13 @@ def add_bonus_payment(bonus: BonusPayment, session: Session = Depends(get_sessio
         bonus.date_received = datetime.now()
     
     session.add(bonus)
+    session.flush()
+    ledger.book(session, bonus)
     session.commit()
     session.refresh(bonus)
     return bonus
 
-@router.get("/factory/{factory_id}")
+@router.get("/factory/{factory_id}", response_model=List[BonusPayment])
 def get_factory_bonuses(factory_id: int, session: Session = Depends(get_session)):
     """Get all bonus payments from a specific factory"""
     bonuses = session.exec(
@@ -50,74 +59,57 @@ def get_factory_bonuses(factory_id: int, session: Session = Depends(get_session)
     ).all()
     return bonuses
 
-@router.get("/period/{period}")
+@router.get("/period/{period}", response_model=List[BonusRead])
 def get_bonuses_by_period(period: str, session: Session = Depends(get_session)):
     """Get all bonuses for a specific period (e.g., '2024-H1', '2024-H2')"""
-    bonuses = session.exec(
-        select(BonusPayment).where(BonusPayment.period == period)
-    ).all()
-    
-    detailed_bonuses = []
-    for bonus in bonuses:
-        factory = session.get(Factory, bonus.factory_id)
-        detailed_bonuses.append({
-            **bonus.dict(),
-            "factory_name": factory.name if factory else "Unknown"
-        })
-    
-    return detailed_bonuses
+    return _bonuses_with_factory(session, BonusPayment.period == period)
 
-@router.get("/year/{year}")
+@router.get("/year/{year}", response_model=List[BonusRead])
 def get_bonuses_by_year(year: int, session: Session = Depends(get_session)):
     """Get all bonuses for a specific year"""
     # Get bonuses for both halves of the year
     h1_period = f"{year}-H1"
     h2_period = f"{year}-H2"
     
-    bonuses = session.exec(
-        select(BonusPayment).where(
-            (BonusPayment.period == h1_period) | (BonusPayment.period == h2_period)
-        )
-    ).all()
-    
-    detailed_bonuses = []
-    for bonus in bonuses:
-        factory = session.get(Factory, bonus.factory_id)
-        detailed_bonuses.append({
-            **bonus.dict(),
-            "factory_name": factory.name if factory else "Unknown"
-        })
-    
-    return detailed_bonuses
+    return _bonuses_with_factory(
+        session,
+        (BonusPayment.period == h1_period) | (BonusPayment.period == h2_period)
+    )
+
+@router.post("/settle/{factory_id}/{period}", response_model=SettlementResult)
+def settle_factory_bonus(factory_id: int, period: str, dry_run: bool = False, session: Session = Depends(get_session)):
+    """Deduct a factory's unpaid bonus-deduction fertilizer from its bonus for the period"""
+    return bonus_settlement.settle_factory(session, factory_id, period, dry_run)
+
+@router.post("/settle/{period}", response_model=List[SettlementResult])
+def settle_period_bonuses(period: str, dry_run: bool = False, session: Session = Depends(get_session)):
+    """Settle every factory's fertilizer against its bonus for the period, in one transaction"""
+    return bonus_settlement.settle_period(session, period, dry_run)
 
-@router.put("/{bonus_id}")
+@router.put("/{bonus_id}", response_model=BonusPayment)
 def update_bonus_payment(
     bonus_id: int,
     updated_bonus: BonusPayment,
+    expected: Optional[int] = Depends(if_match),
     session: Session = Depends(get_session)
 ):
-    """Update a bonus payment"""
-    bonus = session.get(BonusPayment, bonus_id)
-    if not bonus:
-        raise HTTPException(404, "Bonus payment not found")
-    
+    """Update a bonus payment, refused with 409 if it changed since the version the client sent"""
     # Verify factory exists
     factory = session.get(Factory, updated_bonus.factory_id)
     if not factory:
         raise HTTPException(404, "Factory not found")
     
-    bonus.factory_id = updated_bonus.factory_id
-    bonus.period = updated_bonus.period
-    bonus.amount = updated_bonus.amount
-    bonus.date_received = updated_bonus.date_received
-    bonus.fertilizer_deductions = updated_bonus.fertilizer_deductions
-    bonus.net_bonus = updated_bonus.amount - updated_bonus.fertilizer_deductions
-    bonus.notes = updated_bonus.notes
-    
-    session.add(bonus)
-    session.commit()
-    session.refresh(bonus)
-    return bonus
+    bonus = compare_and_swap(session, BonusPayment, bonus_id, {
+        "factory_id": updated_bonus.factory_id,
+        "period": updated_bonus.period,
+        "amount": updated_bonus.amount,
+        "date_received": updated_bonus.date_received,
+        "fertilizer_deductions": updated_bonus.fertilizer_deductions,
+        "net_bonus": updated_bonus.amount - updated_bonus.fertilizer_deductions,
+        "notes": updated_bonus.notes,
+    }, expected_version(updated_bonus, expected), "Bonus payment not found")
+    ledger.book(session, bonus)
+    return commit_returning(session, bonus)
 
 @router.delete("/{bonus_id}")
 def delete_bonus_payment(bonus_id: int, session: Session = Depends(get_session)):
@@ -126,11 +118,14 @@ def delete_bonus_payment(bonus_id: int, session: Session = Depends(get_session))
     if not bonus:
         raise HTTPException(404, "Bonus payment not found")
     
+    # Fertilizer deducted from this bonus is owed again
+    bonus_settlement.unsettle(session, bonus)
+    ledger.unbook(session, BonusPayment, bonus.id)
     session.delete(bonus)
     session.commit()
     return {"ok": True}
 
-@router.get("/summary")
+@router.get("/summary", dependencies=[Depends(conditional("bonuspayment", "factory"))])
 def get_bonus_summary(session: Session = Depends(get_session)):
     """Get summary statistics for all bonus payments"""
     
@@ -155,7 +150,7 @@ def get_bonus_summary(session: Session = Depends(get_session)):
         "total_net_bonus": total_net_bonus
     }
 
-@router.get("/summary/factory/{factory_id}")
+@router.get("/summary/factory/{factory_id}", dependencies=[Depends(conditional("bonuspayment", "factory"))])
 def get_factory_bonus_summary(factory_id: int, session: Session = Depends(get_session)):
     """Get bonus payment summary for a specific factory"""
     
@@ -191,7 +186,7 @@ def get_factory_bonus_summary(factory_id: int, session: Session = Depends(get_se
         "total_net_bonus": total_net_bonus
     }
 
-@router.get("/summary/period/{period}")
+@router.get("/summary/period/{period}", dependencies=[Depends(conditional("bonuspayment", "factory"))])
 def get_period_bonus_summary(period: str, session: Session = Depends(get_session)):
     """Get bonus summary for a specific period"""
     
@@ -1,46 +1,51 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 from app.database import get_session
+from app.core.versioning import commit_returning, compare_and_swap, expected_version, if_match
 from app.models import Cow, MilkRecord
+from app.analytics.dairy import apply_milk_change, compute_cow_analytics, daily_totals_cache, invalidate_daily_totals
+from app.schemas import BulkEditResult, MilkBulkUpdate, MilkRecordFilter
+from app.services import bulk_edit
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional
 
 router = APIRouter()
 
 # --- Cows ---
-@router.get("/cows")
+@router.get("/cows", response_model=List[Cow])
 def list_cows(session: Session = Depends(get_session)):
     return session.exec(select(Cow)).all()
 
-@router.post("/cows")
+@router.post("/cows", response_model=Cow)
 def add_cow(cow: Cow, session: Session = Depends(get_session)):
     session.add(cow)
     session.commit()
     session.refresh(cow)
     return cow
 
-@router.get("/cows/{cow_id}")
+@router.get("/cows/{cow_id}", response_model=Cow)
 def get_cow(cow_id: int, session: Session = Depends(get_session)):
     cow = session.get(Cow, cow_id)
     if not cow:
         raise HTTPException(404, "Cow not found")
     return cow
 
-@router.put("/cows/{cow_id}")
-def update_cow(cow_id: int, updated_cow: Cow, session: Session = Depends(get_session)):
-    """Update a cow"""
-    cow = session.get(Cow, cow_id)
-    if not cow:
-        raise HTTPException(404, "Cow not found")
-    
-    cow.tag_no = updated_cow.tag_no
-    cow.breed = updated_cow.breed
-    cow.lactation_no = updated_cow.lactation_no
-    cow.age = updated_cow.age
-    cow.status = updated_cow.status
-    
-    session.add(cow)
-    session.commit()
-    session.refresh(cow)
-    return cow
+@router.put("/cows/{cow_id}", response_model=Cow)
+def update_cow(
+    cow_id: int,
+    updated_cow: Cow,
+    expected: Optional[int] = Depends(if_match),
+    session: Session = Depends(get_session)
+):
+    """Update a cow, refused with 409 if it changed since the version the client sent"""
+    cow = compare_and_swap(session, Cow, cow_id, {
+        "tag_no": updated_cow.tag_no,
+        "breed": updated_cow.breed,
+        "lactation_no": updated_cow.lactation_no,
+        "age": updated_cow.age,
+        "status": updated_cow.status,
+    }, expected_version(updated_cow, expected), "Cow not found")
+    return commit_returning(session, cow)
 
 @router.delete("/cows/{cow_id}")
 def delete_cow(cow_id: int, session: Session = Depends(get_session)):
@@ -52,18 +57,61 @@ def delete_cow(cow_id: int, session: Session = Depends(get_session)):
     return {"ok": True}
 
 # --- Milk Records ---
-@router.get("/milk")
-def list_milk_records(session: Session = Depends(get_session)):
-    return session.exec(select(MilkRecord)).all()
+@router.get("/milk", response_model=List[MilkRecord])
+def list_milk_records(
+    cow_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    session: Session = Depends(get_session)
+):
+    """List milk records, optionally for one cow and/or a date range"""
+    statement = select(MilkRecord)
+    if cow_id is not None:
+        statement = statement.where(MilkRecord.cow_id == cow_id)
+    if start_date:
+        statement = statement.where(MilkRecord.date_recorded >= datetime.combine(start_date, time.min))
+    if end_date:
+        statement = statement.where(MilkRecord.date_recorded < datetime.combine(end_date + timedelta(days=1), time.min))
+    return session.exec(statement).all()
 
-@router.post("/milk")
+@router.post("/milk", response_model=MilkRecord)
 def add_milk_record(record: MilkRecord, session: Session = Depends(get_session)):
     session.add(record)
     session.commit()
     session.refresh(record)
+    apply_milk_change(record.cow_id, record.date_recorded, record.quantity)
     return record
 
-@router.get("/milk/{milk_id}")
+@router.post("/milk/bulk-update", response_model=BulkEditResult)
+def bulk_update_milk_records(edit: MilkBulkUpdate, dry_run: bool = False, session: Session = Depends(get_session)):
+    """Change every milk record a filter matches in one UPDATE; a dry run only counts the matches"""
+    conditions = bulk_edit.where(MilkRecord, edit.where, MilkRecord.date_recorded)
+    values = bulk_edit.changes(MilkRecord, edit.set)
+    if dry_run:
+        return bulk_edit.dry_run(session, MilkRecord, conditions)
+    
+    rows = bulk_edit.update_where(session, MilkRecord, conditions, values)
+    session.commit()
+    if "cow_id" in values:
+        # The cows the records moved from are never read
+        daily_totals_cache.clear()
+    else:
+        invalidate_daily_totals(*(row.cow_id for row in rows))
+    return bulk_edit.result(rows)
+
+@router.post("/milk/bulk-delete", response_model=BulkEditResult)
+def bulk_delete_milk_records(where: MilkRecordFilter, dry_run: bool = False, session: Session = Depends(get_session)):
+    """Delete every milk record a filter matches in one DELETE; a dry run only counts the matches"""
+    conditions = bulk_edit.where(MilkRecord, where, MilkRecord.date_recorded)
+    if dry_run:
+        return bulk_edit.dry_run(session, MilkRecord, conditions)
+    
+    rows = bulk_edit.delete_where(session, MilkRecord, conditions)
+    session.commit()
+    invalidate_daily_totals(*(row.cow_id for row in rows))
+    return bulk_edit.result(rows)
+
+@router.get("/milk/{milk_id}", response_model=MilkRecord)
 def get_milk_record(milk_id: int, session: Session = Depends(get_session)):
     """Get a specific milk record"""
     record = session.get(MilkRecord, milk_id)
@@ -71,21 +119,37 @@ def get_milk_record(milk_id: int, session: Session = Depends(get_session)):
         raise HTTPException(404, "Milk record not found")
     return record
 
-@router.put("/milk/{milk_id}")
-def update_milk_record(milk_id: int, updated_record: MilkRecord, session: Session = Depends(get_session)):
-    """Update a milk record"""
+@router.put("/milk/{milk_id}", response_model=MilkRecord)
+def update_milk_record(
+    milk_id: int,
+    updated_record: MilkRecord,
+    expected: Optional[int] = Depends(if_match),
+    session: Session = Depends(get_session)
+):
+    """Update a milk record, refused with 409 if it changed since the version the client sent"""
     record = session.get(MilkRecord, milk_id)
     if not record:
         raise HTTPException(404, "Milk record not found")
     
-    record.cow_id = updated_record.cow_id
-    record.date_recorded = updated_record.date_recorded
-    record.quantity = updated_record.quantity
-    record.notes = updated_record.notes
+    # The cow analytics move the old quantity off the old day
+    previous = (record.cow_id, record.date_recorded, record.quantity)
     
-    session.add(record)
-    session.commit()
-    session.refresh(record)
+    values = {
+        "cow_id": updated_record.cow_id,
+        "quantity": updated_record.quantity,
+        "notes": updated_record.notes,
+    }
+    # A body without a date keeps the stored one, rather than moving the record
+    # to now (the model default) or nulling the partition key
+    if "date_recorded" in updated_record.model_fields_set and updated_record.date_recorded:
+        values["date_recorded"] = updated_record.date_recorded
+    record = compare_and_swap(
+        session, MilkRecord, milk_id, values,
+        expected_version(updated_record, expected, record.version), "Milk record not found"
+    )
+    commit_returning(session, record)
+    apply_milk_change(previous[0], previous[1], -previous[2])
+    apply_milk_change(record.cow_id, record.date_recorded, record.quantity)
     return record
 
 @router.delete("/milk/{milk_id}")
@@ -97,4 +161,62 @@ def delete_milk_record(milk_id: int, session: Session = Depends(get_session)):
     
     session.delete(record)
     session.commit()
+    apply_milk_change(record.cow_id, record.date_recorded, -record.quantity)
     return {"ok": True}
+
+# --- Analytics ---
+def _analytics_range(start_date: Optional[date], end_date: Optional[date]):
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=90)
+    if end_date < start_date:
+        raise HTTPException(400, "end_date must be on or after start_date")
+    return start_date, end_date
+
+@router.get("/analytics/cows/{cow_id}")
+def get_cow_analytics(
+    cow_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    session: Session = Depends(get_session)
+):
+    """Daily yield, 7/30-day rolling averages, drop alerts and lactation curve for a cow"""
+    cow = session.get(Cow, cow_id)
+    if not cow:
+        raise HTTPException(404, "Cow not found")
+    
+    start_date, end_date = _analytics_range(start_date, end_date)
+    return {
+        "tag_no": cow.tag_no,
+        **compute_cow_analytics(session, cow_id, start_date, end_date)
+    }
+
+@router.get("/analytics/herd")
+def get_herd_analytics(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    session: Session = Depends(get_session)
+):
+    """Per-cow yield summary and alerts for the whole herd"""
+    start_date, end_date = _analytics_range(start_date, end_date)
+    
+    herd = []
+    for cow in session.exec(select(Cow)).all():
+        analytics = compute_cow_analytics(session, cow.id, start_date, end_date)
+        herd.append({
+            "cow_id": cow.id,
+            "tag_no": cow.tag_no,
+            "total_quantity": analytics["total_quantity"],
+            "days_recorded": analytics["days_recorded"],
+            "latest_avg_7d": analytics["latest_avg_7d"],
+            "latest_avg_30d": analytics["latest_avg_30d"],
+            "alerts": analytics["alerts"],
+            "lactation_curve": analytics["lactation_curve"]
+        })
+    
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "total_quantity": round(sum(c["total_quantity"] for c in herd), 2),
+        "cows_with_alerts": sum(1 for c in herd if c["alerts"]),
+        "cows": herd
+    }
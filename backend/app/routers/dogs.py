@@ -1,45 +1,94 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import update
 from sqlmodel import Session, select
+from app.analytics import pedigree
+from app.core.versioning import commit_returning, compare_and_swap, expected_version, if_match
 from app.database import get_session
 from app.models import Dog, Litter
+from app.schemas import PairingScore, PedigreeNode
+from typing import List, Optional
 
 router = APIRouter()
 
+def _check_parentage(session: Session, dog_ids: List[int], litter_id: Optional[int], litter: Optional[Litter] = None):
+    """Reject parents that would make one of the dogs its own ancestor"""
+    if litter_id is None:
+        return
+    litter = litter or session.get(Litter, litter_id)
+    if not litter:
+        raise HTTPException(404, "Litter not found")
+    if pedigree.get_graph(session).would_loop(dog_ids, (litter.father_id, litter.mother_id)):
+        raise HTTPException(400, "A dog cannot be its own ancestor")
+
 # --- Dogs ---
-@router.get("/dogs")
+@router.get("/dogs", response_model=List[Dog])
 def list_dogs(session: Session = Depends(get_session)):
     return session.exec(select(Dog)).all()
 
-@router.post("/dogs")
+@router.post("/dogs", response_model=Dog)
 def add_dog(dog: Dog, session: Session = Depends(get_session)):
+    if dog.litter_id is not None and not session.get(Litter, dog.litter_id):
+        raise HTTPException(404, "Litter not found")
     session.add(dog)
     session.commit()
     session.refresh(dog)
+    pedigree.invalidate()
     return dog
 
-@router.get("/dogs/{dog_id}")
+@router.get("/dogs/{dog_id}/pedigree", response_model=PedigreeNode)
+def get_pedigree(
+    dog_id: int,
+    generations: int = Query(4, ge=1, le=10),
+    session: Session = Depends(get_session)
+):
+    """The dog's ancestry tree, with each dog's inbreeding coefficient"""
+    tree = pedigree.get_graph(session).tree(dog_id, generations)
+    if tree is None:
+        raise HTTPException(404, "Dog not found")
+    return tree
+
+@router.get("/dogs/{dog_id}/pairings", response_model=List[PairingScore])
+def get_pairings(
+    dog_id: int,
+    sire_ids: Optional[List[int]] = Query(None),
+    session: Session = Depends(get_session)
+):
+    """Inbreeding coefficient of the puppies of this dam with each candidate sire (default: every active male)"""
+    graph = pedigree.get_graph(session)
+    if dog_id not in graph.dogs:
+        raise HTTPException(404, "Dog not found")
+    unknown = [sire_id for sire_id in sire_ids or [] if sire_id not in graph.dogs]
+    if unknown:
+        raise HTTPException(404, f"Dogs not found: {', '.join(map(str, unknown))}")
+    return graph.pairings(dog_id, sire_ids)
+
+@router.get("/dogs/{dog_id}", response_model=Dog)
 def get_dog(dog_id: int, session: Session = Depends(get_session)):
     dog = session.get(Dog, dog_id)
     if not dog:
         raise HTTPException(404, "Dog not found")
     return dog
 
-@router.put("/dogs/{dog_id}")
-def update_dog(dog_id: int, updated_dog: Dog, session: Session = Depends(get_session)):
-    """Update a dog"""
-    dog = session.get(Dog, dog_id)
-    if not dog:
-        raise HTTPException(404, "Dog not found")
-    
-    dog.name = updated_dog.name
-    dog.breed = updated_dog.breed
-    dog.gender = updated_dog.gender
-    dog.dob = updated_dog.dob
-    dog.status = updated_dog.status
-    
-    session.add(dog)
-    session.commit()
-    session.refresh(dog)
+@router.put("/dogs/{dog_id}", response_model=Dog)
+def update_dog(
+    dog_id: int,
+    updated_dog: Dog,
+    expected: Optional[int] = Depends(if_match),
+    session: Session = Depends(get_session)
+):
+    """Update a dog, refused with 409 if it changed since the version the client sent"""
+    # Re-checked even when the litter is unchanged, rather than reading the dog first
+    _check_parentage(session, [dog_id], updated_dog.litter_id)
+    dog = compare_and_swap(session, Dog, dog_id, {
+        "name": updated_dog.name,
+        "breed": updated_dog.breed,
+        "gender": updated_dog.gender,
+        "dob": updated_dog.dob,
+        "status": updated_dog.status,
+        "litter_id": updated_dog.litter_id,
+    }, expected_version(updated_dog, expected), "Dog not found")
+    commit_returning(session, dog)
+    pedigree.invalidate()
     return dog
 
 @router.delete("/dogs/{dog_id}")
@@ -49,21 +98,23 @@ def delete_dog(dog_id: int, session: Session = Depends(get_session)):
         raise HTTPException(404, "Dog not found")
     session.delete(dog)
     session.commit()
+    pedigree.invalidate()
     return {"ok": True}
 
 # --- Litters ---
-@router.get("/litters")
+@router.get("/litters", response_model=List[Litter])
 def list_litters(session: Session = Depends(get_session)):
     return session.exec(select(Litter)).all()
 
-@router.post("/litters")
+@router.post("/litters", response_model=Litter)
 def add_litter(litter: Litter, session: Session = Depends(get_session)):
     session.add(litter)
     session.commit()
     session.refresh(litter)
+    pedigree.invalidate()
     return litter
 
-@router.get("/litters/{litter_id}")
+@router.get("/litters/{litter_id}", response_model=Litter)
 def get_litter(litter_id: int, session: Session = Depends(get_session)):
     """Get a specific litter"""
     litter = session.get(Litter, litter_id)
@@ -71,21 +122,24 @@ def get_litter(litter_id: int, session: Session = Depends(get_session)):
         raise HTTPException(404, "Litter not found")
     return litter
 
-@router.put("/litters/{litter_id}")
-def update_litter(litter_id: int, updated_litter: Litter, session: Session = Depends(get_session)):
-    """Update a litter"""
-    litter = session.get(Litter, litter_id)
-    if not litter:
-        raise HTTPException(404, "Litter not found")
-    
-    litter.mother_id = updated_litter.mother_id
-    litter.father_id = updated_litter.father_id
-    litter.date_of_birth = updated_litter.date_of_birth
-    litter.puppies_count = updated_litter.puppies_count
-    
-    session.add(litter)
-    session.commit()
-    session.refresh(litter)
+@router.put("/litters/{litter_id}", response_model=Litter)
+def update_litter(
+    litter_id: int,
+    updated_litter: Litter,
+    expected: Optional[int] = Depends(if_match),
+    session: Session = Depends(get_session)
+):
+    """Update a litter, refused with 409 if it changed since the version the client sent"""
+    puppies = session.exec(select(Dog.id).where(Dog.litter_id == litter_id)).all()
+    _check_parentage(session, puppies, litter_id, updated_litter)
+    litter = compare_and_swap(session, Litter, litter_id, {
+        "mother_id": updated_litter.mother_id,
+        "father_id": updated_litter.father_id,
+        "date_of_birth": updated_litter.date_of_birth,
+        "puppies_count": updated_litter.puppies_count,
+    }, expected_version(updated_litter, expected), "Litter not found")
+    commit_returning(session, litter)
+    pedigree.invalidate()
     return litter
 
 @router.delete("/litters/{litter_id}")
@@ -95,6 +149,9 @@ def delete_litter(litter_id: int, session: Session = Depends(get_session)):
     if not litter:
         raise HTTPException(404, "Litter not found")
     
+    # Its puppies stay, with their parents unknown
+    session.exec(update(Dog).where(Dog.litter_id == litter_id).values(litter_id=None, version=Dog.version + 1))
     session.delete(litter)
     session.commit()
+    pedigree.invalidate()
     return {"ok": True}
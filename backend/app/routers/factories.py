@@ -1,17 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 from sqlmodel import Session, select
 from app.database import get_session
-from app.models import Factory
-from typing import List
+from app.core.etag import conditional
+from app.core.versioning import commit_returning, compare_and_swap, expected_version, if_match
+from app.models import Factory, FactoryReconciliation, ReconciliationLine
+from app.schemas import ReconciliationReport
+from app.services import reconciliation
+from typing import List, Optional
 
 router = APIRouter()
 
-@router.get("/")
+@router.get("/", response_model=List[Factory], dependencies=[Depends(conditional("factory"))])
 def list_factories(session: Session = Depends(get_session)):
     """List all tea factories"""
     return session.exec(select(Factory)).all()
 
-@router.post("/")
+@router.post("/", response_model=Factory)
 def add_factory(factory: Factory, session: Session = Depends(get_session)):
     """Add a new tea factory"""
     session.add(factory)
@@ -19,7 +23,45 @@ def add_factory(factory: Factory, session: Session = Depends(get_session)):
     session.refresh(factory)
     return factory
 
-@router.get("/{factory_id}")
+def _reconciliation_report(session: Session, result: FactoryReconciliation) -> ReconciliationReport:
+    lines = session.exec(
+        select(ReconciliationLine)
+        .where(ReconciliationLine.reconciliation_id == result.id)
+        .order_by(ReconciliationLine.day)
+    ).all()
+    return ReconciliationReport(reconciliation=result, lines=lines)
+
+@router.post("/{factory_id}/reconcile/{month}/{year}", response_model=ReconciliationReport)
+def reconcile_statement(
+    factory_id: int,
+    month: int,
+    year: int,
+    file: UploadFile = File(...),
+    amount_basis: str = "net",
+    session: Session = Depends(get_session)
+):
+    """Check a factory's monthly statement (CSV/XLSX) against our tea records"""
+    result = reconciliation.reconcile(session, factory_id, month, year, file, amount_basis)
+    return _reconciliation_report(session, result)
+
+@router.get("/{factory_id}/reconciliations", response_model=List[FactoryReconciliation])
+def list_reconciliations(factory_id: int, session: Session = Depends(get_session)):
+    """Past statement reconciliations for a factory, newest month first"""
+    return session.exec(
+        select(FactoryReconciliation)
+        .where(FactoryReconciliation.factory_id == factory_id)
+        .order_by(FactoryReconciliation.year.desc(), FactoryReconciliation.month.desc())
+    ).all()
+
+@router.get("/reconciliations/{reconciliation_id}", response_model=ReconciliationReport)
+def get_reconciliation(reconciliation_id: int, session: Session = Depends(get_session)):
+    """A stored reconciliation with its per-day lines"""
+    result = session.get(FactoryReconciliation, reconciliation_id)
+    if not result:
+        raise HTTPException(404, "Reconciliation not found")
+    return _reconciliation_report(session, result)
+
+@router.get("/{factory_id}", response_model=Factory)
 def get_factory(factory_id: int, session: Session = Depends(get_session)):
     """Get a specific factory"""
     factory = session.get(Factory, factory_id)
@@ -27,24 +69,23 @@ def get_factory(factory_id: int, session: Session = Depends(get_session)):
         raise HTTPException(404, "Factory not found")
     return factory
 
-@router.put("/{factory_id}")
-def update_factory(factory_id: int, updated_factory: Factory, session: Session = Depends(get_session)):
-    """Update a factory"""
-    factory = session.get(Factory, factory_id)
-    if not factory:
-        raise HTTPException(404, "Factory not found")
-    
-    factory.name = updated_factory.name
-    factory.rate_per_kg = updated_factory.rate_per_kg
-    factory.transport_deduction = updated_factory.transport_deduction
-    factory.location = updated_factory.location
-    factory.contact = updated_factory.contact
-    factory.active = updated_factory.active
-    
-    session.add(factory)
-    session.commit()
-    session.refresh(factory)
-    return factory
+@router.put("/{factory_id}", response_model=Factory)
+def update_factory(
+    factory_id: int,
+    updated_factory: Factory,
+    expected: Optional[int] = Depends(if_match),
+    session: Session = Depends(get_session)
+):
+    """Update a factory, refused with 409 if it changed since the version the client sent"""
+    factory = compare_and_swap(session, Factory, factory_id, {
+        "name": updated_factory.name,
+        "rate_per_kg": updated_factory.rate_per_kg,
+        "transport_deduction": updated_factory.transport_deduction,
+        "location": updated_factory.location,
+        "contact": updated_factory.contact,
+        "active": updated_factory.active,
+    }, expected_version(updated_factory, expected), "Factory not found")
+    return commit_returning(session, factory)
 
 @router.delete("/{factory_id}")
 def delete_factory(factory_id: int, session: Session = Depends(get_session)):
@@ -1,28 +1,39 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 from app.database import get_session
+from app.core.etag import conditional
+from app.core.versioning import commit_returning, compare_and_swap, expected_version, if_match
 from app.models import FertilizerPurchase, Factory
+from app.schemas import FertilizerPurchaseRead
+from app.services import bonus_settlement, ledger
 from datetime import datetime
-from sqlalchemy import and_
+from typing import List, Optional
+from sqlalchemy import and_, func
 
 router = APIRouter()
 
-@router.get("/")
+def _purchases_with_factory(session: Session, *conditions):
+    """Fertilizer purchases joined with their factory's name in one query"""
+    return session.exec(
+        select(
+            *FertilizerPurchase.__table__.columns,
+            func.coalesce(Factory.name, "Unknown").label("factory_name")
+        )
+        .select_from(FertilizerPurchase)
+        .outerjoin(Factory, Factory.id == FertilizerPurchase.factory_id)
+        .where(*conditions)
+    ).all()
+
+@router.get(
+    "/",
+    response_model=List[FertilizerPurchaseRead],
+    dependencies=[Depends(conditional("fertilizerpurchase", "factory"))]
+)
 def list_fertilizer_purchases(session: Session = Depends(get_session)):
     """List all fertilizer purchases from factories"""
-    purchases = session.exec(select(FertilizerPurchase)).all()
-    
-    detailed_purchases = []
-    for purchase in purchases:
-        factory = session.get(Factory, purchase.factory_id)
-        detailed_purchases.append({
-            **purchase.dict(),
-            "factory_name": factory.name if factory else "Unknown"
-        })
-    
-    return detailed_purchases
+    return _purchases_with_factory(session)
 
-@router.post("/")
+@router.post("/", response_model=FertilizerPurchase)
 def add_fertilizer_purchase(purchase: FertilizerPurchase, session: Session = Depends(get_session)):
     """Record a new fertilizer purchase from a factory"""
     # Verify factory exists
@@ -46,11 +57,13 @@ def add_fertilizer_purchase(purchase: FertilizerPurchase, session: Session = Dep
         raise HTTPException(400, "Invalid payment method. Must be 'tea_delivery' or 'bonus_deduction'")
     
     session.add(purchase)
+    session.flush()
+    ledger.book(session, purchase)
     session.commit()
     session.refresh(purchase)
     return purchase
 
-@router.get("/factory/{factory_id}")
+@router.get("/factory/{factory_id}", response_model=List[FertilizerPurchase])
 def get_factory_fertilizer_purchases(factory_id: int, session: Session = Depends(get_session)):
     """Get all fertilizer purchases from a specific factory"""
     purchases = session.exec(
@@ -58,50 +71,27 @@ def get_factory_fertilizer_purchases(factory_id: int, session: Session = Depends
     ).all()
     return purchases
 
-@router.get("/unpaid")
+@router.get("/unpaid", response_model=List[FertilizerPurchaseRead])
 def get_unpaid_purchases(session: Session = Depends(get_session)):
     """Get all unpaid fertilizer purchases"""
-    purchases = session.exec(
-        select(FertilizerPurchase).where(FertilizerPurchase.paid == False)
-    ).all()
-    
-    detailed_purchases = []
-    for purchase in purchases:
-        factory = session.get(Factory, purchase.factory_id)
-        detailed_purchases.append({
-            **purchase.dict(),
-            "factory_name": factory.name if factory else "Unknown"
-        })
-    
-    return detailed_purchases
+    return _purchases_with_factory(session, FertilizerPurchase.paid == False)
 
-@router.get("/payment-method/{method}")
+@router.get("/payment-method/{method}", response_model=List[FertilizerPurchaseRead])
 def get_purchases_by_payment_method(method: str, session: Session = Depends(get_session)):
     """Get all purchases by payment method"""
     if method not in ["tea_delivery", "bonus_deduction"]:
         raise HTTPException(400, "Invalid payment method")
     
-    purchases = session.exec(
-        select(FertilizerPurchase).where(FertilizerPurchase.payment_method == method)
-    ).all()
-    
-    detailed_purchases = []
-    for purchase in purchases:
-        factory = session.get(Factory, purchase.factory_id)
-        detailed_purchases.append({
-            **purchase.dict(),
-            "factory_name": factory.name if factory else "Unknown"
-        })
-    
-    return detailed_purchases
+    return _purchases_with_factory(session, FertilizerPurchase.payment_method == method)
 
-@router.put("/{purchase_id}")
+@router.put("/{purchase_id}", response_model=FertilizerPurchase)
 def update_fertilizer_purchase(
     purchase_id: int,
     updated_purchase: FertilizerPurchase,
+    expected: Optional[int] = Depends(if_match),
     session: Session = Depends(get_session)
 ):
-    """Update a fertilizer purchase"""
+    """Update a fertilizer purchase, refused with 409 if it changed since the version the client sent"""
     purchase = session.get(FertilizerPurchase, purchase_id)
     if not purchase:
         raise HTTPException(404, "Fertilizer purchase not found")
@@ -115,36 +105,52 @@ def update_fertilizer_purchase(
     if updated_purchase.payment_method not in ["tea_delivery", "bonus_deduction"]:
         raise HTTPException(400, "Invalid payment method")
     
-    purchase.factory_id = updated_purchase.factory_id
-    purchase.bags = updated_purchase.bags
-    purchase.cost_per_bag = updated_purchase.cost_per_bag
-    purchase.total_cost = updated_purchase.bags * updated_purchase.cost_per_bag
-    purchase.date = updated_purchase.date
-    purchase.payment_method = updated_purchase.payment_method
-    purchase.paid = updated_purchase.paid
-    purchase.payment_date = updated_purchase.payment_date
-    purchase.notes = updated_purchase.notes
-    
-    session.add(purchase)
-    session.commit()
-    session.refresh(purchase)
-    return purchase
+    values = {
+        "factory_id": updated_purchase.factory_id,
+        "bags": updated_purchase.bags,
+        "cost_per_bag": updated_purchase.cost_per_bag,
+        "total_cost": updated_purchase.bags * updated_purchase.cost_per_bag,
+        "date": updated_purchase.date,
+        "payment_method": updated_purchase.payment_method,
+        "paid": updated_purchase.paid,
+        "payment_date": updated_purchase.payment_date,
+        "notes": updated_purchase.notes,
+    }
+    # A settled purchase whose cost, factory or payment changes no longer
+    # matches what its bonus deducted
+    settled = (purchase.bonus_payment_id, purchase.total_cost)
+    released = settled[0] is not None and (
+        values["total_cost"] != purchase.total_cost
+        or updated_purchase.factory_id != purchase.factory_id
+        or updated_purchase.payment_method != "bonus_deduction"
+        or not updated_purchase.paid
+    )
+    if released:
+        # Back to unpaid, as when its bonus is deleted (bonus_settlement.unsettle)
+        values.update(bonus_payment_id=None, paid=False, payment_date=None)
+    
+    purchase = compare_and_swap(
+        session, FertilizerPurchase, purchase_id, values,
+        expected_version(updated_purchase, expected, purchase.version), "Fertilizer purchase not found"
+    )
+    if released:
+        bonus_settlement.refund(session, *settled)
+    ledger.book(session, purchase)
+    return commit_returning(session, purchase)
 
-@router.put("/{purchase_id}/mark-paid")
-def mark_purchase_paid(purchase_id: int, session: Session = Depends(get_session)):
+@router.put("/{purchase_id}/mark-paid", response_model=FertilizerPurchase)
+def mark_purchase_paid(
+    purchase_id: int,
+    expected: Optional[int] = Depends(if_match),
+    session: Session = Depends(get_session)
+):
     """Mark a fertilizer purchase as paid"""
-    purchase = session.get(FertilizerPurchase, purchase_id)
-    if not purchase:
-        raise HTTPException(404, "Fertilizer purchase not found")
-    
-    purchase.paid = True
-    purchase.payment_date = datetime.now()
-    
-    session.add(purchase)
-    session.commit()
-    session.refresh(purchase)
-    
-    return purchase
+    purchase = compare_and_swap(
+        session, FertilizerPurchase, purchase_id, {"paid": True, "payment_date": datetime.now()},
+        expected, "Fertilizer purchase not found"
+    )
+    ledger.book(session, purchase)
+    return commit_returning(session, purchase)
 
 @router.delete("/{purchase_id}")
 def delete_fertilizer_purchase(purchase_id: int, session: Session = Depends(get_session)):
@@ -153,11 +159,13 @@ def delete_fertilizer_purchase(purchase_id: int, session: Session = Depends(get_
     if not purchase:
         raise HTTPException(404, "Fertilizer purchase not found")
     
+    bonus_settlement.release(session, purchase)
+    ledger.unbook(session, FertilizerPurchase, purchase.id)
     session.delete(purchase)
     session.commit()
     return {"ok": True}
 
-@router.get("/summary")
+@router.get("/summary", dependencies=[Depends(conditional("fertilizerpurchase", "factory"))])
 def get_fertilizer_summary(session: Session = Depends(get_session)):
     """Get summary statistics for all fertilizer purchases"""
     
@@ -197,7 +205,7 @@ def get_fertilizer_summary(session: Session = Depends(get_session)):
         "paid_count": sum(1 for p in purchases if p.paid)
     }
 
-@router.get("/summary/factory/{factory_id}")
+@router.get("/summary/factory/{factory_id}", dependencies=[Depends(conditional("fertilizerpurchase", "factory"))])
 def get_factory_fertilizer_summary(factory_id: int, session: Session = Depends(get_session)):
     """Get fertilizer purchase summary for a specific factory"""
     
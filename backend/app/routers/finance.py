@@ -1,51 +1,127 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import Session, select
 from app.database import get_session
-from app.models import Transaction
+from app.core.etag import conditional
+from app.core.versioning import commit_returning, compare_and_swap, expected_version, if_match
+from app.models import LedgerAccount, LedgerEntry, Transaction
+from app.schemas import MonthlyProfitLoss, ProfitAndLoss
+from app.services import ledger
+from datetime import date, datetime
+from typing import List, Optional
 
 router = APIRouter()
 
-@router.get("/")
+PERIOD = r"^\d{4}-(0[1-9]|1[0-2])$"  # YYYY-MM
+
+@router.get("/", response_model=List[Transaction])
 def list_transactions(session: Session = Depends(get_session)):
     return session.exec(select(Transaction)).all()
 
-@router.post("/")
+@router.post("/", response_model=Transaction)
 def add_transaction(transaction: Transaction, session: Session = Depends(get_session)):
     session.add(transaction)
+    session.flush()
+    ledger.book(session, transaction)
     session.commit()
     session.refresh(transaction)
     return transaction
 
-@router.get("/{transaction_id}")
+# --- Ledger ---
+@router.get("/ledger/accounts", response_model=List[LedgerAccount])
+def list_ledger_accounts(session: Session = Depends(get_session)):
+    """Ledger accounts with their running balances (debits minus credits)"""
+    return session.exec(select(LedgerAccount).order_by(LedgerAccount.kind, LedgerAccount.code)).all()
+
+@router.get("/ledger/entries", response_model=List[LedgerEntry])
+def list_ledger_entries(
+    account: Optional[str] = None,
+    source: Optional[str] = None,
+    source_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    session: Session = Depends(get_session)
+):
+    """Journal lines, newest first, filtered by account code, source record or date"""
+    statement = select(LedgerEntry)
+    if account:
+        statement = statement.join(LedgerAccount, LedgerAccount.id == LedgerEntry.account_id).where(LedgerAccount.code == account)
+    if source:
+        statement = statement.where(LedgerEntry.source == source)
+    if source_id is not None:
+        statement = statement.where(LedgerEntry.source_id == source_id)
+    if start_date:
+        statement = statement.where(LedgerEntry.date >= datetime.combine(start_date, datetime.min.time()))
+    if end_date:
+        statement = statement.where(LedgerEntry.date <= datetime.combine(end_date, datetime.max.time()))
+    return session.exec(statement.order_by(LedgerEntry.date.desc(), LedgerEntry.id.desc()).limit(limit)).all()
+
+@router.post("/ledger/backfill")
+def backfill_ledger(session: Session = Depends(get_session)):
+    """Book records written before the ledger existed (archived years keep what they had)"""
+    lines_written = ledger.backfill(session)
+    session.commit()
+    return {"ok": True, "lines_written": lines_written}
+
+@router.get(
+    "/pnl",
+    response_model=ProfitAndLoss,
+    dependencies=[Depends(conditional("profitlossmonth", "ledgeraccount"))]
+)
+def get_profit_and_loss(
+    start: Optional[str] = Query(None, pattern=PERIOD),
+    end: Optional[str] = Query(None, pattern=PERIOD),
+    enterprise: Optional[str] = None,
+    session: Session = Depends(get_session)
+):
+    """Profit and loss per account for the months start..end (YYYY-MM, default this year to date)"""
+    today = date.today()
+    start_period = tuple(map(int, start.split("-"))) if start else (today.year, 1)
+    end_period = tuple(map(int, end.split("-"))) if end else (today.year, today.month)
+    if end_period < start_period:
+        raise HTTPException(400, "end must be on or after start")
+    return ledger.profit_and_loss(session, start_period, end_period, enterprise)
+
+@router.get(
+    "/pnl/monthly/{year}",
+    response_model=List[MonthlyProfitLoss],
+    dependencies=[Depends(conditional("profitlossmonth"))]
+)
+def get_monthly_profit_and_loss(year: int, enterprise: Optional[str] = None, session: Session = Depends(get_session)):
+    """Income, expenses and net profit for each month of the year"""
+    return ledger.monthly_profit_and_loss(session, year, enterprise)
+
+@router.get("/{transaction_id}", response_model=Transaction)
 def get_transaction(transaction_id: int, session: Session = Depends(get_session)):
     txn = session.get(Transaction, transaction_id)
     if not txn:
         raise HTTPException(404, "Transaction not found")
     return txn
 
-@router.put("/{transaction_id}")
-def update_transaction(transaction_id: int, updated_transaction: Transaction, session: Session = Depends(get_session)):
-    """Update a transaction"""
-    txn = session.get(Transaction, transaction_id)
-    if not txn:
-        raise HTTPException(404, "Transaction not found")
-    
-    txn.date = updated_transaction.date
-    txn.category = updated_transaction.category
-    txn.description = updated_transaction.description
-    txn.amount = updated_transaction.amount
-    txn.unit = updated_transaction.unit
-    
-    session.add(txn)
-    session.commit()
-    session.refresh(txn)
-    return txn
+@router.put("/{transaction_id}", response_model=Transaction)
+def update_transaction(
+    transaction_id: int,
+    updated_transaction: Transaction,
+    expected: Optional[int] = Depends(if_match),
+    session: Session = Depends(get_session)
+):
+    """Update a transaction, refused with 409 if it changed since the version the client sent"""
+    txn = compare_and_swap(session, Transaction, transaction_id, {
+        "date": updated_transaction.date,
+        "category": updated_transaction.category,
+        "description": updated_transaction.description,
+        "amount": updated_transaction.amount,
+        "unit": updated_transaction.unit,
+    }, expected_version(updated_transaction, expected), "Transaction not found")
+    ledger.book(session, txn)
+    return commit_returning(session, txn)
 
 @router.delete("/{transaction_id}")
 def delete_transaction(transaction_id: int, session: Session = Depends(get_session)):
     txn = session.get(Transaction, transaction_id)
     if not txn:
         raise HTTPException(404, "Transaction not found")
+    ledger.unbook(session, Transaction, txn.id)
     session.delete(txn)
     session.commit()
     return {"ok": True}
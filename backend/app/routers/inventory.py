@@ -1,45 +1,77 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 from app.database import get_session
-from app.models import InventoryItem
+from app.models import InventoryItem, StockMovement, StockMovementReason
+from app import schemas
+from app.schemas import InventoryCreate
+from app.services import inventory as stock
+from typing import List
 
 router = APIRouter()
 
-@router.get("/")
+@router.get("/", response_model=List[schemas.Inventory])
 def list_items(session: Session = Depends(get_session)):
     return session.exec(select(InventoryItem)).all()
 
-@router.post("/")
-def add_item(item: InventoryItem, session: Session = Depends(get_session)):
+@router.post("/", response_model=schemas.Inventory)
+def add_item(item_in: InventoryCreate, session: Session = Depends(get_session)):
+    quantity = item_in.quantity or 0.0
+    item = InventoryItem(**item_in.dict(exclude={"quantity"}), quantity=0.0)
     session.add(item)
+    session.flush()
+    if quantity:
+        stock.record_movement(session, item, quantity, StockMovementReason.INITIAL)
     session.commit()
     session.refresh(item)
     return item
 
-@router.get("/{item_id}")
+@router.get("/low-stock", response_model=List[schemas.Inventory])
+def list_low_stock_items(session: Session = Depends(get_session)):
+    """Items at or below their low-stock threshold"""
+    return stock.low_stock_items(session)
+
+@router.get("/{item_id}", response_model=schemas.Inventory)
 def get_item(item_id: int, session: Session = Depends(get_session)):
     item = session.get(InventoryItem, item_id)
     if not item:
         raise HTTPException(404, "Item not found")
     return item
 
-@router.put("/{item_id}")
-def update_item(item_id: int, updated_item: InventoryItem, session: Session = Depends(get_session)):
-    """Update an inventory item"""
+@router.put("/{item_id}", response_model=schemas.Inventory)
+def update_item(item_id: int, updated_item: InventoryCreate, session: Session = Depends(get_session)):
+    """Update an inventory item (quantity changes are journalled as adjustments)"""
     item = session.get(InventoryItem, item_id)
     if not item:
         raise HTTPException(404, "Item not found")
     
     item.name = updated_item.name
-    item.quantity = updated_item.quantity
     item.unit = updated_item.unit
     item.category = updated_item.category
+    stock.set_quantity(session, item, updated_item.quantity, "Manual stock count")
     
     session.add(item)
     session.commit()
     session.refresh(item)
     return item
 
+@router.get("/{item_id}/movements", response_model=List[schemas.StockMovement])
+def list_item_movements(item_id: int, limit: int = 100, session: Session = Depends(get_session)):
+    """Stock movement history for an item, newest first"""
+    return session.exec(
+        select(StockMovement)
+        .where(StockMovement.item_id == item_id)
+        .order_by(StockMovement.created_at.desc(), StockMovement.id.desc())
+        .limit(limit)
+    ).all()
+
+@router.get("/{item_id}/forecast", response_model=schemas.InventoryForecast)
+def get_item_forecast(item_id: int, days: int = 30, session: Session = Depends(get_session)):
+    """Average daily usage and projected days until low stock / empty"""
+    item = session.get(InventoryItem, item_id)
+    if not item:
+        raise HTTPException(404, "Item not found")
+    return stock.consumption_forecast(session, item, days)
+
 @router.delete("/{item_id}")
 def delete_item(item_id: int, session: Session = Depends(get_session)):
     item = session.get(InventoryItem, item_id)
@@ -1,170 +1,149 @@
+import os
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 from sqlmodel import Session, select
 from app.database import get_session
-from app.models import MonthlyPayroll, TeaPlucking, Staff, WorkerAdvance, Factory
-from typing import List
+from app.core.etag import conditional
+from app.core.versioning import commit_returning, compare_and_swap, if_match
+from app.models import MonthlyPayroll, PayrollRun, Staff, Factory
+from app.schemas import PayrollRead
+from app.services import archive, excel_export, ledger, payroll_runs
+from typing import List, Optional
 from datetime import datetime
 from sqlalchemy import func, and_
 
 router = APIRouter()
 
-@router.get("/")
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+@router.get("/", response_model=List[MonthlyPayroll])
 def list_payrolls(session: Session = Depends(get_session)):
     """List all payroll records"""
     return session.exec(select(MonthlyPayroll)).all()
 
-@router.get("/calculate/{month}/{year}")
-def calculate_monthly_payroll(month: int, year: int, session: Session = Depends(get_session)):
-    """Calculate payroll for all workers for a specific month"""
-    
-    if month < 1 or month > 12:
-        raise HTTPException(400, "Invalid month. Must be between 1 and 12")
-    
-    # Get all tea plucking workers
-    workers = session.exec(
-        select(Staff).where(Staff.pay_type == "per_kilo")
-    ).all()
-    
-    payroll_records = []
-    
-    for worker in workers:
-        # Check if payroll already exists
-        existing = session.exec(
-            select(MonthlyPayroll).where(
-                and_(
-                    MonthlyPayroll.worker_id == worker.id,
-                    MonthlyPayroll.month == month,
-                    MonthlyPayroll.year == year
-                )
-            )
-        ).first()
-        
-        if existing:
-            continue  # Skip if already calculated
-        
-        # Get all tea plucking records for this worker in this month
-        tea_records = session.exec(
-            select(TeaPlucking).where(
-                and_(
-                    TeaPlucking.worker_id == worker.id,
-                    func.extract('month', TeaPlucking.date) == month,
-                    func.extract('year', TeaPlucking.date) == year
-                )
-            )
-        ).all()
-        
-        # Calculate totals
-        total_kg = sum(record.quantity for record in tea_records)
-        gross_earnings = sum(record.worker_payment or 0 for record in tea_records)
-        
-        # Get advances for this worker this month (that haven't been deducted yet)
-        advances = session.exec(
-            select(WorkerAdvance).where(
-                and_(
-                    WorkerAdvance.worker_id == worker.id,
-                    WorkerAdvance.month == month,
-                    WorkerAdvance.year == year,
-                    WorkerAdvance.deducted == False
-                )
-            )
-        ).all()
-        
-        total_advances = sum(a.amount for a in advances)
-        
-        # Calculate net pay
-        net_pay = gross_earnings - total_advances
-        
-        # Create payroll record
-        payroll = MonthlyPayroll(
-            worker_id=worker.id,
-            month=month,
-            year=year,
-            total_kg=total_kg,
-            gross_earnings=gross_earnings,
-            total_advances=total_advances,
-            net_pay=net_pay,
-            paid=False,
-            created_at=datetime.now()
-        )
-        
-        # Mark advances as deducted
-        for advance in advances:
-            advance.deducted = True
-            session.add(advance)
-        
-        session.add(payroll)
-        payroll_records.append(payroll)
-    
-    session.commit()
-    
+def _run_response(session: Session, run: PayrollRun, coalesced: bool) -> dict:
     return {
         "ok": True,
-        "month": month,
-        "year": year,
-        "workers_processed": len(payroll_records),
-        "payrolls": payroll_records
+        "run_id": run.id,
+        "status": run.status,
+        "coalesced": coalesced,
+        "month": run.month,
+        "year": run.year,
+        "workers_processed": run.workers_processed,
+        "payrolls": payroll_runs.run_payrolls(session, run)
     }
 
-@router.get("/worker/{worker_id}")
+@router.post("/calculate/{month}/{year}")
+def calculate_monthly_payroll(month: int, year: int, session: Session = Depends(get_session)):
+    """
+    Calculate payroll for all workers for a specific month. Concurrent
+    requests for the same month share one run.
+    """
+    run, coalesced = payroll_runs.run_payroll(session, month, year)
+    return _run_response(session, run, coalesced)
+
+@router.get("/runs", response_model=List[PayrollRun])
+def list_payroll_runs(month: Optional[int] = None, year: Optional[int] = None, session: Session = Depends(get_session)):
+    """Payroll runs, newest first"""
+    conditions = []
+    if month is not None:
+        conditions.append(PayrollRun.month == month)
+    if year is not None:
+        conditions.append(PayrollRun.year == year)
+    return session.exec(select(PayrollRun).where(*conditions).order_by(PayrollRun.id.desc())).all()
+
+@router.get("/runs/{run_id}")
+def get_payroll_run(run_id: int, session: Session = Depends(get_session)):
+    """A payroll run and the payrolls it calculated"""
+    run = session.get(PayrollRun, run_id)
+    if not run:
+        raise HTTPException(404, "Payroll run not found")
+    return _run_response(session, run, False)
+
+@router.get("/worker/{worker_id}", response_model=List[MonthlyPayroll])
 def get_worker_payrolls(worker_id: int, session: Session = Depends(get_session)):
-    """Get all payroll records for a specific worker"""
+    """Get all payroll records for a specific worker, archived years included"""
     payrolls = session.exec(
         select(MonthlyPayroll).where(MonthlyPayroll.worker_id == worker_id)
     ).all()
-    return payrolls
+    return archive.read_archived(session, MonthlyPayroll, worker_id=worker_id) + list(payrolls)
 
-@router.get("/month/{month}/{year}")
+@router.get("/month/{month}/{year}", response_model=List[PayrollRead])
 def get_month_payrolls(month: int, year: int, session: Session = Depends(get_session)):
     """Get all payroll records for a specific month"""
-    payrolls = session.exec(
-        select(MonthlyPayroll).where(
+    if archive.is_archived(session, "monthlypayroll", year):
+        workers = {worker.id: worker for worker in session.exec(select(Staff)).all()}
+        return [
+            PayrollRead(
+                **payroll.model_dump(),
+                worker_name=workers[payroll.worker_id].name if payroll.worker_id in workers else "Unknown",
+                worker_role=workers[payroll.worker_id].role if payroll.worker_id in workers else "Unknown"
+            )
+            for payroll in archive.read_archived(session, MonthlyPayroll, year, month)
+        ]
+    
+    # Worker details come from the same joined query
+    return session.exec(
+        select(
+            *MonthlyPayroll.__table__.columns,
+            func.coalesce(Staff.name, "Unknown").label("worker_name"),
+            func.coalesce(Staff.role, "Unknown").label("worker_role")
+        )
+        .select_from(MonthlyPayroll)
+        .outerjoin(Staff, Staff.id == MonthlyPayroll.worker_id)
+        .where(
             and_(
                 MonthlyPayroll.month == month,
                 MonthlyPayroll.year == year
             )
         )
     ).all()
+
+@router.get("/export/{month}/{year}", response_class=FileResponse)
+def export_month_workbook(month: int, year: int, session: Session = Depends(get_session)):
+    """Download the month as the daily-grid workbook that /import/excel reads"""
+    if month < 1 or month > 12:
+        raise HTTPException(400, "Invalid month. Must be between 1 and 12")
     
-    # Get worker details
-    detailed_payrolls = []
-    for payroll in payrolls:
-        worker = session.get(Staff, payroll.worker_id)
-        detailed_payrolls.append({
-            **payroll.dict(),
-            "worker_name": worker.name if worker else "Unknown",
-            "worker_role": worker.role if worker else "Unknown"
-        })
-    
-    return detailed_payrolls
+    # Written row by row to a temporary file, then streamed from disk
+    path = excel_export.export_month_workbook(session, month, year)
+    return FileResponse(
+        path,
+        media_type=XLSX_MEDIA_TYPE,
+        filename=f"payroll_{year}_{month:02d}.xlsx",
+        background=BackgroundTask(os.remove, path)
+    )
 
-@router.put("/{payroll_id}/mark-paid")
-def mark_payroll_paid(payroll_id: int, session: Session = Depends(get_session)):
+@router.put("/{payroll_id}/mark-paid", response_model=MonthlyPayroll)
+def mark_payroll_paid(
+    payroll_id: int,
+    expected: Optional[int] = Depends(if_match),
+    session: Session = Depends(get_session)
+):
     """Mark a payroll as paid"""
-    payroll = session.get(MonthlyPayroll, payroll_id)
-    if not payroll:
-        raise HTTPException(404, "Payroll record not found")
-    
-    payroll.paid = True
-    payroll.payment_date = datetime.now()
-    
-    session.add(payroll)
-    session.commit()
-    session.refresh(payroll)
-    
-    return payroll
+    payroll = compare_and_swap(
+        session, MonthlyPayroll, payroll_id, {"paid": True, "payment_date": datetime.now()},
+        expected, "Payroll record not found"
+    )
+    ledger.book(session, payroll)
+    return commit_returning(session, payroll)
 
-@router.get("/summary/{month}/{year}")
+@router.get("/summary/{month}/{year}", dependencies=[Depends(conditional("monthlypayroll"))])
 def get_payroll_summary(month: int, year: int, session: Session = Depends(get_session)):
     """Get summary statistics for monthly payroll"""
     
-    payrolls = session.exec(
-        select(MonthlyPayroll).where(
-            and_(
-                MonthlyPayroll.month == month,
-                MonthlyPayroll.year == year
+    if archive.is_archived(session, "monthlypayroll", year):
+        payrolls = archive.read_archived(session, MonthlyPayroll, year, month)
+    else:
+        payrolls = session.exec(
+            select(MonthlyPayroll).where(
+                and_(
+                    MonthlyPayroll.month == month,
+                    MonthlyPayroll.year == year
+                )
             )
-        )
-    ).all()
+        ).all()
     
     if not payrolls:
         return {
@@ -1,45 +1,52 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 from app.database import get_session
+from app.core.versioning import commit_returning, compare_and_swap, expected_version, if_match
 from app.models import Flock, EggProduction
+from app.analytics.poultry import compute_flock_analytics, flock_analytics_cache, invalidate_flock_analytics
+from app.schemas import BulkEditResult, EggBulkUpdate, EggRecordFilter
+from app.services import bulk_edit
+from datetime import date, timedelta
+from typing import List, Optional
 
 router = APIRouter()
 
 # --- Flocks ---
-@router.get("/flocks")
+@router.get("/flocks", response_model=List[Flock])
 def list_flocks(session: Session = Depends(get_session)):
     return session.exec(select(Flock)).all()
 
-@router.post("/flocks")
+@router.post("/flocks", response_model=Flock)
 def add_flock(flock: Flock, session: Session = Depends(get_session)):
     session.add(flock)
     session.commit()
     session.refresh(flock)
     return flock
 
-@router.get("/flocks/{flock_id}")
+@router.get("/flocks/{flock_id}", response_model=Flock)
 def get_flock(flock_id: int, session: Session = Depends(get_session)):
     flock = session.get(Flock, flock_id)
     if not flock:
         raise HTTPException(404, "Flock not found")
     return flock
 
-@router.put("/flocks/{flock_id}")
-def update_flock(flock_id: int, updated_flock: Flock, session: Session = Depends(get_session)):
-    """Update a flock"""
-    flock = session.get(Flock, flock_id)
-    if not flock:
-        raise HTTPException(404, "Flock not found")
-    
-    flock.breed = updated_flock.breed
-    flock.date_added = updated_flock.date_added
-    flock.current_count = updated_flock.current_count
-    flock.mortality = updated_flock.mortality
-    flock.housing_unit = updated_flock.housing_unit
-    
-    session.add(flock)
-    session.commit()
-    session.refresh(flock)
+@router.put("/flocks/{flock_id}", response_model=Flock)
+def update_flock(
+    flock_id: int,
+    updated_flock: Flock,
+    expected: Optional[int] = Depends(if_match),
+    session: Session = Depends(get_session)
+):
+    """Update a flock, refused with 409 if it changed since the version the client sent"""
+    flock = compare_and_swap(session, Flock, flock_id, {
+        "breed": updated_flock.breed,
+        "date_added": updated_flock.date_added,
+        "current_count": updated_flock.current_count,
+        "mortality": updated_flock.mortality,
+        "housing_unit": updated_flock.housing_unit,
+    }, expected_version(updated_flock, expected), "Flock not found")
+    commit_returning(session, flock)
+    invalidate_flock_analytics(flock.id)
     return flock
 
 @router.delete("/flocks/{flock_id}")
@@ -49,21 +56,52 @@ def delete_flock(flock_id: int, session: Session = Depends(get_session)):
         raise HTTPException(404, "Flock not found")
     session.delete(flock)
     session.commit()
+    invalidate_flock_analytics(flock_id)
     return {"ok": True}
 
 # --- Egg Production ---
-@router.get("/eggs")
+@router.get("/eggs", response_model=List[EggProduction])
 def list_egg_records(session: Session = Depends(get_session)):
     return session.exec(select(EggProduction)).all()
 
-@router.post("/eggs")
+@router.post("/eggs", response_model=EggProduction)
 def add_egg_record(record: EggProduction, session: Session = Depends(get_session)):
     session.add(record)
     session.commit()
     session.refresh(record)
+    invalidate_flock_analytics(record.flock_id)
     return record
 
-@router.get("/eggs/{egg_id}")
+@router.post("/eggs/bulk-update", response_model=BulkEditResult)
+def bulk_update_egg_records(edit: EggBulkUpdate, dry_run: bool = False, session: Session = Depends(get_session)):
+    """Change every egg production record a filter matches in one UPDATE; a dry run only counts the matches"""
+    conditions = bulk_edit.where(EggProduction, edit.where, EggProduction.date_collected)
+    values = bulk_edit.changes(EggProduction, edit.set)
+    if dry_run:
+        return bulk_edit.dry_run(session, EggProduction, conditions)
+    
+    rows = bulk_edit.update_where(session, EggProduction, conditions, values)
+    session.commit()
+    if "flock_id" in values:
+        # The flocks the records moved from are never read
+        flock_analytics_cache.clear()
+    else:
+        invalidate_flock_analytics(*(row.flock_id for row in rows))
+    return bulk_edit.result(rows)
+
+@router.post("/eggs/bulk-delete", response_model=BulkEditResult)
+def bulk_delete_egg_records(where: EggRecordFilter, dry_run: bool = False, session: Session = Depends(get_session)):
+    """Delete every egg production record a filter matches in one DELETE; a dry run only counts the matches"""
+    conditions = bulk_edit.where(EggProduction, where, EggProduction.date_collected)
+    if dry_run:
+        return bulk_edit.dry_run(session, EggProduction, conditions)
+    
+    rows = bulk_edit.delete_where(session, EggProduction, conditions)
+    session.commit()
+    invalidate_flock_analytics(*(row.flock_id for row in rows))
+    return bulk_edit.result(rows)
+
+@router.get("/eggs/{egg_id}", response_model=EggProduction)
 def get_egg_record(egg_id: int, session: Session = Depends(get_session)):
     """Get a specific egg production record"""
     record = session.get(EggProduction, egg_id)
@@ -71,22 +109,28 @@ def get_egg_record(egg_id: int, session: Session = Depends(get_session)):
         raise HTTPException(404, "Egg production record not found")
     return record
 
-@router.put("/eggs/{egg_id}")
-def update_egg_record(egg_id: int, updated_record: EggProduction, session: Session = Depends(get_session)):
-    """Update an egg production record"""
+@router.put("/eggs/{egg_id}", response_model=EggProduction)
+def update_egg_record(
+    egg_id: int,
+    updated_record: EggProduction,
+    expected: Optional[int] = Depends(if_match),
+    session: Session = Depends(get_session)
+):
+    """Update an egg production record, refused with 409 if it changed since the version the client sent"""
     record = session.get(EggProduction, egg_id)
     if not record:
         raise HTTPException(404, "Egg production record not found")
     
-    record.flock_id = updated_record.flock_id
-    record.date_collected = updated_record.date_collected
-    record.quantity = updated_record.quantity
-    record.broken = updated_record.broken
-    record.comments = updated_record.comments
-    
-    session.add(record)
-    session.commit()
-    session.refresh(record)
+    previous_flock_id = record.flock_id
+    record = compare_and_swap(session, EggProduction, egg_id, {
+        "flock_id": updated_record.flock_id,
+        "date_collected": updated_record.date_collected,
+        "quantity": updated_record.quantity,
+        "broken": updated_record.broken,
+        "comments": updated_record.comments,
+    }, expected_version(updated_record, expected, record.version), "Egg production record not found")
+    commit_returning(session, record)
+    invalidate_flock_analytics(previous_flock_id, record.flock_id)
     return record
 
 @router.delete("/eggs/{egg_id}")
@@ -98,4 +142,63 @@ def delete_egg_record(egg_id: int, session: Session = Depends(get_session)):
     
     session.delete(record)
     session.commit()
+    invalidate_flock_analytics(record.flock_id)
     return {"ok": True}
+
+# --- Analytics ---
+def _analytics_range(start_date: Optional[date], end_date: Optional[date]):
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=60)
+    if end_date < start_date:
+        raise HTTPException(400, "end_date must be on or after start_date")
+    return start_date, end_date
+
+@router.get("/analytics/flocks/{flock_id}")
+def get_flock_analytics(
+    flock_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    session: Session = Depends(get_session)
+):
+    """Daily hen-day lay rate, rolling trends and anomaly flags for a flock"""
+    flock = session.get(Flock, flock_id)
+    if not flock:
+        raise HTTPException(404, "Flock not found")
+    
+    start_date, end_date = _analytics_range(start_date, end_date)
+    return {
+        "breed": flock.breed,
+        "housing_unit": flock.housing_unit,
+        "current_count": flock.current_count,
+        **compute_flock_analytics(session, flock_id, start_date, end_date)
+    }
+
+@router.get("/analytics/flocks")
+def get_flocks_analytics(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    session: Session = Depends(get_session)
+):
+    """Lay-rate summary for every flock"""
+    start_date, end_date = _analytics_range(start_date, end_date)
+    
+    flocks = []
+    for flock in session.exec(select(Flock)).all():
+        analytics = compute_flock_analytics(session, flock.id, start_date, end_date)
+        flocks.append({
+            "flock_id": flock.id,
+            "breed": flock.breed,
+            "housing_unit": flock.housing_unit,
+            "current_count": flock.current_count,
+            "total_eggs": analytics["total_eggs"],
+            "average_lay_rate": analytics["average_lay_rate"],
+            "latest_avg_7d": analytics["latest_avg_7d"],
+            "trend_per_week": analytics["trend_per_week"],
+            "anomaly_days": analytics["anomaly_days"]
+        })
+    
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "flocks": flocks
+    }
@@ -0,0 +1,34 @@
+import importlib
+from fastapi import FastAPI
+from app.core.config import settings
+
+# Every router the API serves: (module, URL prefix, OpenAPI tag).
+# Modules are imported here, at mount time, so adding a router is one line.
+ROUTERS = [
+    ("app.api.auth", f"{settings.API_V1_STR}/auth", "auth"),
+    ("app.api.crops", f"{settings.API_V1_STR}/crops", "crops"),
+    ("app.api.tasks", f"{settings.API_V1_STR}/tasks", "tasks"),
+    ("app.api.inventory", f"{settings.API_V1_STR}/inventory", "inventory"),
+    ("app.routers.staff", "/staff", "Staff"),
+    ("app.routers.factories", "/factories", "Tea Factories"),
+    ("app.routers.teaplucking", "/teaplucking", "Tea Plucking"),
+    ("app.routers.advances", "/advances", "Worker Advances"),
+    ("app.routers.payroll", "/payroll", "Payroll"),
+    ("app.routers.bonus", "/bonus", "Bonus Payments"),
+    ("app.routers.fertilizer", "/fertilizer", "Fertilizer"),
+    ("app.routers.avocado", "/avocado", "Avocado"),
+    ("app.routers.dairy", "/dairy", "Dairy"),
+    ("app.routers.poultry", "/poultry", "Poultry"),
+    ("app.routers.dogs", "/dogs", "Dogs"),
+    ("app.routers.finance", "/finance", "Finance"),
+    ("app.routers.inventory", "/inventory", "Inventory"),
+    ("app.routers.import_data", "/import", "Data Import"),
+    ("app.routers.reports", "/reports", "Reports"),
+]
+
+
+def include_routers(app: FastAPI) -> None:
+    """Mount every registered router on the app"""
+    for module_path, prefix, tag in ROUTERS:
+        module = importlib.import_module(module_path)
+        app.include_router(module.router, prefix=prefix, tags=[tag])
@@ -0,0 +1,188 @@
+from fastapi import APIRouter, Query
+from app.analytics.snapshot import snapshots
+from app.schemas import (
+    AvocadoYearReport,
+    DairyYearReport,
+    FinanceYearReport,
+    SnapshotInfo,
+    TeaMonthComparison,
+    TeaYearReport,
+)
+from typing import List, Optional
+
+router = APIRouter()
+
+# Every report runs on the DuckDB snapshot (app/analytics/snapshot.py), never
+# on the transactional database.
+
+
+def _year_over_year(yearly_sql: str, metrics: List[str], start_year: Optional[int], end_year: Optional[int], params=None):
+    """
+    Add <metric>_change_pct columns to a per-year aggregate. The year range is
+    applied after the window, so the first year shown still compares against
+    the year before it.
+    """
+    changes = ", ".join(
+        f"CASE WHEN lag(year) OVER w = year - 1 "
+        f"THEN round(100.0 * ({metric} - lag({metric}) OVER w) / nullif(lag({metric}) OVER w, 0), 2) "
+        f"END AS {metric}_change_pct"
+        for metric in metrics
+    )
+    bounds = []
+    params = dict(params or {})
+    if start_year is not None:
+        bounds.append("year >= $start_year")
+        params["start_year"] = start_year
+    if end_year is not None:
+        bounds.append("year <= $end_year")
+        params["end_year"] = end_year
+    where = f"WHERE {' AND '.join(bounds)}" if bounds else ""
+
+    return snapshots.current().query(
+        f"SELECT * FROM (SELECT *, {changes} FROM ({yearly_sql}) yearly WINDOW w AS (ORDER BY year)) {where} ORDER BY year",
+        params,
+    )
+
+@router.get("/tea/yearly", response_model=List[TeaYearReport])
+def tea_yearly(start_year: Optional[int] = None, end_year: Optional[int] = None, factory_id: Optional[int] = None):
+    """Tea deliveries and earnings per year, including archived years"""
+    factory_filter = "AND factory_id = $factory_id" if factory_id is not None else ""
+    return _year_over_year(
+        f"""
+        SELECT year(date) AS year,
+               count(*) AS records,
+               count(DISTINCT worker_id) AS workers,
+               sum(quantity) AS total_kg,
+               coalesce(sum(worker_payment), 0) AS worker_payment,
+               coalesce(sum(factory_gross), 0) AS factory_gross,
+               coalesce(sum(factory_net_to_farm), 0) AS factory_net,
+               coalesce(sum(farm_profit), 0) AS farm_profit
+        FROM teaplucking
+        WHERE date IS NOT NULL {factory_filter}
+        GROUP BY 1
+        """,
+        ["total_kg", "farm_profit"],
+        start_year,
+        end_year,
+        {"factory_id": factory_id} if factory_id is not None else None,
+    )
+
+@router.get("/tea/monthly", response_model=List[TeaMonthComparison])
+def tea_monthly(year: int = Query(..., description="Compared month by month with the year before")):
+    """Kilos per month of ``year`` next to the same month a year earlier"""
+    return snapshots.current().query(
+        """
+        SELECT month,
+               total_kg,
+               previous_year_kg,
+               round(100.0 * (total_kg - previous_year_kg) / nullif(previous_year_kg, 0), 2) AS change_pct
+        FROM (
+            SELECT month(date) AS month,
+                   coalesce(sum(quantity) FILTER (WHERE year(date) = $year), 0) AS total_kg,
+                   coalesce(sum(quantity) FILTER (WHERE year(date) = $year - 1), 0) AS previous_year_kg
+            FROM teaplucking
+            WHERE year(date) IN ($year, $year - 1)
+            GROUP BY 1
+        ) months
+        ORDER BY month
+        """,
+        {"year": year},
+    )
+
+@router.get("/dairy/yearly", response_model=List[DairyYearReport])
+def dairy_yearly(start_year: Optional[int] = None, end_year: Optional[int] = None):
+    """Milk volume per year and litres per cow per recorded day"""
+    return _year_over_year(
+        """
+        SELECT year(date_recorded) AS year,
+               count(*) AS records,
+               count(DISTINCT cow_id) AS cows,
+               sum(quantity) AS litres,
+               sum(quantity) / count(DISTINCT (cow_id, CAST(date_recorded AS DATE))) AS litres_per_cow_day
+        FROM milkrecord
+        GROUP BY 1
+        """,
+        ["litres"],
+        start_year,
+        end_year,
+    )
+
+@router.get("/avocado/yearly", response_model=List[AvocadoYearReport])
+def avocado_yearly(start_year: Optional[int] = None, end_year: Optional[int] = None):
+    """Avocado harvest against sales per year"""
+    return _year_over_year(
+        """
+        SELECT coalesce(harvests.year, sales.year) AS year,
+               coalesce(harvested_kg, 0) AS harvested_kg,
+               coalesce(sold_kg, 0) AS sold_kg,
+               coalesce(revenue, 0) AS revenue,
+               round(revenue / nullif(sold_kg, 0), 2) AS average_price_per_kg
+        FROM (
+            SELECT year(date) AS year, sum(quantity_kg) AS harvested_kg
+            FROM avocadoharvest WHERE date IS NOT NULL GROUP BY 1
+        ) harvests
+        FULL OUTER JOIN (
+            SELECT year(date) AS year, sum(quantity_kg) AS sold_kg, sum(quantity_kg * price_per_kg) AS revenue
+            FROM avocadosale WHERE date IS NOT NULL GROUP BY 1
+        ) sales ON sales.year = harvests.year
+        """,
+        ["harvested_kg", "revenue"],
+        start_year,
+        end_year,
+    )
+
+@router.get("/finance/yearly", response_model=List[FinanceYearReport])
+def finance_yearly(start_year: Optional[int] = None, end_year: Optional[int] = None, unit: Optional[str] = None):
+    """
+    Income, expenses and payroll cost per year, optionally for one enterprise.
+    Payroll is the tea pluckers' pay, so it counts only farm-wide and for the
+    tea unit.
+    """
+    unit_filter = "AND lower(unit) = lower($unit)" if unit else ""
+    payroll_filter = "" if not unit or unit.lower() == "tea" else "WHERE false"
+    return _year_over_year(
+        f"""
+        SELECT coalesce(money.year, payroll.year) AS year,
+               coalesce(income, 0) AS income,
+               coalesce(expense, 0) AS expense,
+               coalesce(income, 0) - coalesce(expense, 0) AS net,
+               coalesce(payroll_cost, 0) AS payroll_cost
+        FROM (
+            SELECT year(date) AS year,
+                   sum(amount) FILTER (WHERE lower(category) = 'income') AS income,
+                   sum(amount) FILTER (WHERE lower(category) = 'expense') AS expense
+            FROM "transaction"
+            WHERE date IS NOT NULL {unit_filter}
+            GROUP BY 1
+        ) money
+        FULL OUTER JOIN (
+            SELECT year, sum(gross_earnings) AS payroll_cost
+            FROM monthlypayroll
+            {payroll_filter}
+            GROUP BY 1
+        ) payroll ON payroll.year = money.year
+        """,
+        ["income", "net"],
+        start_year,
+        end_year,
+        {"unit": unit} if unit else None,
+    )
+
+def _snapshot_info(snapshot, refreshing: bool) -> SnapshotInfo:
+    return SnapshotInfo(
+        built_at=snapshot.built_at,
+        age_seconds=snapshot.age_seconds,
+        build_seconds=snapshot.build_seconds,
+        refreshing=refreshing,
+        row_counts=snapshot.row_counts,
+    )
+
+@router.get("/snapshot", response_model=SnapshotInfo)
+def snapshot_info():
+    """When the report data was taken and how many rows it holds"""
+    return _snapshot_info(snapshots.current(), snapshots.refreshing)
+
+@router.post("/snapshot/refresh", response_model=SnapshotInfo)
+def refresh_snapshot():
+    """Rebuild the report data now instead of waiting for it to go stale"""
+    return _snapshot_info(snapshots.refresh(), False)
@@ -1,16 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 from app.database import get_session
-from app.models import Staff
+from app.core.etag import conditional
+from app.core.versioning import commit_returning, compare_and_swap, expected_version, if_match
+from app.models import Staff, StaffAlias, WorkerBalance, WorkerBalanceEntry
+from app.schemas import AliasConfirm, NameResolution, NameResolveRequest
+from app.services import name_resolution
+from typing import List, Optional
+from sqlalchemy import delete
 
 router = APIRouter()
 
-@router.get("/")
+@router.get("/", response_model=List[Staff], dependencies=[Depends(conditional("staff"))])
 def list_staff(session: Session = Depends(get_session)):
     """List all staff members"""
     return session.exec(select(Staff)).all()
 
-@router.post("/")
+@router.post("/", response_model=Staff)
 def add_staff(staff: Staff, session: Session = Depends(get_session)):
     """Add a new staff member"""
     session.add(staff)
@@ -18,7 +24,35 @@ def add_staff(staff: Staff, session: Session = Depends(get_session)):
     session.refresh(staff)
     return staff
 
-@router.get("/{staff_id}")
+@router.post("/resolve", response_model=List[NameResolution])
+def resolve_names(request: NameResolveRequest, session: Session = Depends(get_session)):
+    """Match a batch of names (e.g. a sheet's worker column) to staff, with confidence scores"""
+    return [
+        NameResolution(**match._asdict())
+        for match in name_resolution.resolve_names(session, request.names)
+    ]
+
+@router.get("/aliases", response_model=List[StaffAlias])
+def list_aliases(session: Session = Depends(get_session)):
+    """List learnt name aliases"""
+    return session.exec(select(StaffAlias)).all()
+
+@router.post("/aliases", response_model=Optional[StaffAlias])
+def confirm_alias(confirmation: AliasConfirm, session: Session = Depends(get_session)):
+    """Confirm that a name means a staff member, so future imports match it exactly"""
+    return name_resolution.confirm_alias(session, confirmation.name, confirmation.staff_id)
+
+@router.delete("/aliases/{alias_id}")
+def delete_alias(alias_id: int, session: Session = Depends(get_session)):
+    """Forget a name alias"""
+    alias = session.get(StaffAlias, alias_id)
+    if not alias:
+        raise HTTPException(404, "Alias not found")
+    session.delete(alias)
+    session.commit()
+    return {"ok": True}
+
+@router.get("/{staff_id}", response_model=Staff)
 def get_staff(staff_id: int, session: Session = Depends(get_session)):
     """Get a specific staff member"""
     staff = session.get(Staff, staff_id)
@@ -26,22 +60,23 @@ def get_staff(staff_id: int, session: Session = Depends(get_session)):
         raise HTTPException(404, "Staff member not found")
     return staff
 
-@router.put("/{staff_id}")
-def update_staff(staff_id: int, updated_staff: Staff, session: Session = Depends(get_session)):
-    """Update a staff member"""
-    staff = session.get(Staff, staff_id)
-    if not staff:
-        raise HTTPException(404, "Staff member not found")
-    
-    staff.name = updated_staff.name
-    staff.role = updated_staff.role
-    staff.pay_type = updated_staff.pay_type
-    staff.pay_rate = updated_staff.pay_rate
-    
-    session.add(staff)
-    session.commit()
-    session.refresh(staff)
-    return staff
+@router.put("/{staff_id}", response_model=Staff)
+def update_staff(
+    staff_id: int,
+    updated_staff: Staff,
+    expected: Optional[int] = Depends(if_match),
+    session: Session = Depends(get_session)
+):
+    """Update a staff member, refused with 409 if they changed since the version the client sent"""
+    staff = compare_and_swap(session, Staff, staff_id, {
+        "name": updated_staff.name,
+        # A statement update skips the ORM hook that keeps this in step
+        "normalized_name": name_resolution.normalize_name(updated_staff.name),
+        "role": updated_staff.role,
+        "pay_type": updated_staff.pay_type,
+        "pay_rate": updated_staff.pay_rate,
+    }, expected_version(updated_staff, expected), "Staff member not found")
+    return commit_returning(session, staff)
 
 @router.delete("/{staff_id}")
 def delete_staff(staff_id: int, session: Session = Depends(get_session)):
@@ -50,6 +85,9 @@ def delete_staff(staff_id: int, session: Session = Depends(get_session)):
     if not staff:
         raise HTTPException(404, "Staff member not found")
     
+    session.exec(delete(StaffAlias).where(StaffAlias.staff_id == staff_id))
+    session.exec(delete(WorkerBalanceEntry).where(WorkerBalanceEntry.worker_id == staff_id))
+    session.exec(delete(WorkerBalance).where(WorkerBalance.worker_id == staff_id))
     session.delete(staff)
     session.commit()
     return {"ok": True}
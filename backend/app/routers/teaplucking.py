@@ -1,31 +1,75 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 from app.database import get_session
+from app.core.config import settings
+from app.core.etag import conditional
+from app.core.versioning import commit_returning, compare_and_swap, expected_version, if_match
 from app.models import TeaPlucking, Staff, Factory
-from datetime import datetime
+from app.analytics.tea import compute_worker_stats, current_week, invalidate_worker_stats, worker_stats_cache
+from app.services import archive, bulk_edit, ledger, tea_feed
+from app.services.excel_import import TRANSPORT_DEDUCTION, WORKER_RATE
+from app.schemas import BulkEditResult, TeaBulkUpdate, TeaRecordFilter, TeaRecordRead
+from datetime import date, datetime
+from typing import List, Optional
 from sqlalchemy import func, and_
 
 router = APIRouter()
 
-@router.get("/")
+PAYMENT_COLUMNS = (
+    "worker_rate", "factory_rate", "transport_deduction",
+    "worker_payment", "factory_gross", "factory_net_to_farm", "farm_profit",
+)
+
+def _repriced(values: dict, factory: Optional[Factory] = None) -> dict:
+    """
+    Payment columns for an UPDATE setting ``values``. A new factory brings
+    its rate (no factory clears the payments); a new quantity is priced at
+    each record's own rates. SET expressions read the row before the update.
+    """
+    if "factory_id" in values:
+        if factory is None:
+            return dict.fromkeys(PAYMENT_COLUMNS)
+        rates = {"worker_rate": WORKER_RATE, "factory_rate": factory.rate_per_kg, "transport_deduction": TRANSPORT_DEDUCTION}
+    elif "quantity" in values:
+        rates = {}
+    else:
+        return {}
+    worker_rate = rates.get("worker_rate", TeaPlucking.worker_rate)
+    factory_rate = rates.get("factory_rate", TeaPlucking.factory_rate)
+    transport = rates.get("transport_deduction", TeaPlucking.transport_deduction)
+    quantity = values.get("quantity", TeaPlucking.quantity)
+    
+    worker_payment = quantity * worker_rate
+    factory_gross = quantity * factory_rate
+    factory_net_to_farm = factory_gross - quantity * transport
+    return {
+        **rates,
+        "worker_payment": worker_payment,
+        "factory_gross": factory_gross,
+        "factory_net_to_farm": factory_net_to_farm,
+        "farm_profit": factory_net_to_farm - worker_payment,
+    }
+
+@router.get(
+    "/",
+    response_model=List[TeaRecordRead],
+    dependencies=[Depends(conditional("teaplucking", "staff", "factory"))]
+)
 def list_tea_records(session: Session = Depends(get_session)):
     """List all tea plucking records with factory and worker details"""
-    records = session.exec(select(TeaPlucking)).all()
-    
-    detailed_records = []
-    for record in records:
-        worker = session.get(Staff, record.worker_id)
-        factory = session.get(Factory, record.factory_id) if record.factory_id else None
-        
-        detailed_records.append({
-            **record.dict(),
-            "worker_name": worker.name if worker else "Unknown",
-            "factory_name": factory.name if factory else "Not assigned"
-        })
-    
-    return detailed_records
+    # One joined query; rows are serialized straight into TeaRecordRead
+    return session.exec(
+        select(
+            *TeaPlucking.__table__.columns,
+            func.coalesce(Staff.name, "Unknown").label("worker_name"),
+            func.coalesce(Factory.name, "Not assigned").label("factory_name")
+        )
+        .select_from(TeaPlucking)
+        .outerjoin(Staff, Staff.id == TeaPlucking.worker_id)
+        .outerjoin(Factory, Factory.id == TeaPlucking.factory_id)
+    ).all()
 
-@router.post("/")
+@router.post("/", response_model=TeaPlucking)
 def add_tea_record(record: TeaPlucking, session: Session = Depends(get_session)):
     """Add a new tea plucking record with automatic payment calculation"""
     # Verify worker exists
@@ -54,16 +98,86 @@ def add_tea_record(record: TeaPlucking, session: Session = Depends(get_session))
         record.factory_net_to_farm = record.factory_gross - (record.quantity * 3.0)
         record.farm_profit = record.factory_net_to_farm - record.worker_payment
     
-    # Set current date if not provided
+    # Set current date if not provided (table models skip validation, so a
+    # JSON date arrives as a string)
     if not record.date:
         record.date = datetime.now()
+    elif isinstance(record.date, str):
+        record.date = datetime.fromisoformat(record.date)
+    archive.ensure_writable(session, "teaplucking", record.date.year)
     
     session.add(record)
+    session.flush()
+    ledger.book(session, record)
     session.commit()
     session.refresh(record)
+    invalidate_worker_stats(record.date)
+    tea_feed.publish(session, tea_feed.ADDED, [record])
     return record
 
-@router.get("/{record_id}")
+@router.get("/stream")
+def stream_tea_records():
+    """
+    Live weigh-ins as server-sent events: today's totals per factory, then a
+    delta (records and their days' running totals) after every change
+    """
+    return tea_feed.stream()
+
+@router.post("/bulk-update", response_model=BulkEditResult)
+def bulk_update_tea_records(edit: TeaBulkUpdate, dry_run: bool = False, session: Session = Depends(get_session)):
+    """
+    Change every record a filter matches in one UPDATE (e.g. set factory_id 3
+    where day is 2024-03-01 and factory_id is 2), repricing payments when the
+    factory or quantity changes. A dry run only counts the matches.
+    """
+    conditions = bulk_edit.where(TeaPlucking, edit.where, TeaPlucking.date)
+    # The date is the partition key on Postgres
+    values = bulk_edit.changes(TeaPlucking, edit.set, required=("date",))
+    if "quantity" in values and not 0 < values["quantity"] <= settings.TEA_MAX_KG_PER_DAY:
+        raise HTTPException(400, f"quantity must be above 0 and at most {settings.TEA_MAX_KG_PER_DAY:g} kg")
+    if "worker_id" in values and not session.get(Staff, values["worker_id"]):
+        raise HTTPException(404, "Worker not found")
+    factory = None
+    if values.get("factory_id") is not None:
+        factory = session.get(Factory, values["factory_id"])
+        if not factory:
+            raise HTTPException(404, "Factory not found")
+    if "date" in values:
+        archive.ensure_writable(session, "teaplucking", values["date"].year)
+    if dry_run:
+        return bulk_edit.dry_run(session, TeaPlucking, conditions)
+    
+    rows = bulk_edit.update_where(session, TeaPlucking, conditions, {**values, **_repriced(values, factory)})
+    ledger.book_many(session, TeaPlucking, rows)
+    session.commit()
+    if "date" in values:
+        # The records' previous dates are never read
+        worker_stats_cache.clear()
+    else:
+        invalidate_worker_stats(*(row.date for row in rows))
+    if rows:
+        tea_feed.publish_resync()
+    return bulk_edit.result(rows)
+
+@router.post("/bulk-delete", response_model=BulkEditResult)
+def bulk_delete_tea_records(where: TeaRecordFilter, dry_run: bool = False, session: Session = Depends(get_session)):
+    """
+    Delete every record a filter matches in one DELETE (e.g. where comment is
+    "Imported from Excel - Sheet1"). A dry run only counts the matches.
+    """
+    conditions = bulk_edit.where(TeaPlucking, where, TeaPlucking.date)
+    if dry_run:
+        return bulk_edit.dry_run(session, TeaPlucking, conditions)
+    
+    rows = bulk_edit.delete_where(session, TeaPlucking, conditions)
+    ledger.unbook_many(session, TeaPlucking, (row.id for row in rows))
+    session.commit()
+    invalidate_worker_stats(*(row.date for row in rows))
+    if rows:
+        tea_feed.publish_resync()
+    return bulk_edit.result(rows)
+
+@router.get("/{record_id}", response_model=TeaPlucking)
 def get_tea_record(record_id: int, session: Session = Depends(get_session)):
     """Get a specific tea plucking record"""
     record = session.get(TeaPlucking, record_id)
@@ -71,22 +185,36 @@ def get_tea_record(record_id: int, session: Session = Depends(get_session)):
         raise HTTPException(404, "Tea plucking record not found")
     return record
 
-@router.put("/{record_id}")
-def update_tea_record(record_id: int, updated_record: TeaPlucking, session: Session = Depends(get_session)):
-    """Update a tea plucking record"""
-    record = session.get(TeaPlucking, record_id)
-    if not record:
-        raise HTTPException(404, "Tea plucking record not found")
-    
-    # Update fields
-    record.worker_id = updated_record.worker_id
-    record.quantity = updated_record.quantity
-    record.date = updated_record.date
-    record.comment = updated_record.comment
+@router.put("/{record_id}", response_model=TeaPlucking)
+def update_tea_record(
+    record_id: int,
+    updated_record: TeaPlucking,
+    expected: Optional[int] = Depends(if_match),
+    session: Session = Depends(get_session)
+):
+    """Update a tea plucking record, refused with 409 if it changed since the version the client sent"""
+    if isinstance(updated_record.date, str):
+        updated_record.date = datetime.fromisoformat(updated_record.date)
+    if updated_record.date:
+        archive.ensure_writable(session, "teaplucking", updated_record.date.year)
     
-    session.add(record)
-    session.commit()
-    session.refresh(record)
+    values = {
+        "worker_id": updated_record.worker_id,
+        "quantity": updated_record.quantity,
+        "comment": updated_record.comment,
+    }
+    # The date is the partition key and NOT NULL on Postgres: a body without one keeps the stored date
+    if updated_record.date:
+        values["date"] = updated_record.date
+    record = compare_and_swap(
+        session, TeaPlucking, record_id, {**values, **_repriced(values)},
+        expected_version(updated_record, expected), "Tea plucking record not found"
+    )
+    ledger.book(session, record)
+    commit_returning(session, record)
+    # The record's previous date is never read, so any cached period may be stale
+    worker_stats_cache.clear()
+    tea_feed.publish_resync()
     return record
 
 @router.delete("/{record_id}")
@@ -96,13 +224,33 @@ def delete_tea_record(record_id: int, session: Session = Depends(get_session)):
     if not record:
         raise HTTPException(404, "Tea plucking record not found")
     
+    ledger.unbook(session, TeaPlucking, record.id)
     session.delete(record)
     session.commit()
+    invalidate_worker_stats(record.date)
+    tea_feed.publish(session, tea_feed.DELETED, [record])
     return {"ok": True}
 
-@router.get("/worker/{worker_id}")
+@router.get("/worker/{worker_id}", response_model=List[TeaPlucking])
 def get_worker_tea_records(worker_id: int, session: Session = Depends(get_session)):
-    """Get all tea plucking records for a specific worker"""
+    """Get all tea plucking records for a specific worker, archived years included"""
     statement = select(TeaPlucking).where(TeaPlucking.worker_id == worker_id)
     records = session.exec(statement).all()
-    return records
+    return archive.read_archived(session, TeaPlucking, worker_id=worker_id) + list(records)
+
+@router.get("/stats/workers", dependencies=[Depends(conditional("teaplucking", "staff"))])
+def get_worker_stats(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: int = 5,
+    session: Session = Depends(get_session)
+):
+    """Worker leaderboard and kg/day percentiles for a period (defaults to this week)"""
+    week_start, week_end = current_week()
+    start_date = start_date or week_start
+    end_date = end_date or week_end
+    
+    if end_date < start_date:
+        raise HTTPException(400, "end_date must be on or after start_date")
+    
+    return compute_worker_stats(session, start_date, end_date, limit)
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
-from datetime import datetime
-from app.models import UserRole
+from typing import Dict, Optional, List
+from datetime import date, datetime
+from app.models import UserRole, StockMovementReason, FactoryReconciliation, ReconciliationLine
 
 # --- User Schemas ---
 class UserBase(BaseModel):
@@ -68,6 +68,29 @@ class Inventory(InventoryBase):
     class Config:
         from_attributes = True
 
+class StockMovementCreate(BaseModel):
+    change: float
+    reason: StockMovementReason = StockMovementReason.ADJUSTMENT
+    note: Optional[str] = None
+
+class StockMovement(StockMovementCreate):
+    id: int
+    item_id: int
+    balance_after: float
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class InventoryForecast(BaseModel):
+    item_id: int
+    quantity: float
+    low_stock_threshold: float
+    window_days: int
+    daily_usage: float
+    days_until_low_stock: Optional[float] = None
+    days_until_empty: Optional[float] = None
+
 # --- Task Schemas ---
 class TaskBase(BaseModel):
     title: str
@@ -85,3 +108,354 @@ class Task(TaskBase):
 
     class Config:
         from_attributes = True
+
+# --- Farm Operations Read Schemas ---
+# Slim response models for the app/routers listings. They read straight
+# from joined result rows (from_attributes), so no per-row dict copy is made.
+# ``version`` is what a client edits against: it goes back as If-Match on the
+# record's PUT (app/core/versioning.py).
+
+class TeaRecordRead(BaseModel):
+    id: int
+    worker_id: int
+    factory_id: Optional[int] = None
+    quantity: float
+    date: Optional[datetime] = None
+    comment: Optional[str] = None
+    worker_rate: Optional[float] = None
+    factory_rate: Optional[float] = None
+    transport_deduction: Optional[float] = None
+    worker_payment: Optional[float] = None
+    factory_gross: Optional[float] = None
+    factory_net_to_farm: Optional[float] = None
+    farm_profit: Optional[float] = None
+    worker_name: str = "Unknown"
+    factory_name: str = "Not assigned"
+    version: int = 1
+
+    class Config:
+        from_attributes = True
+
+class AdvanceRead(BaseModel):
+    id: int
+    worker_id: int
+    amount: float
+    date: Optional[datetime] = None
+    month: int
+    year: int
+    deducted: bool
+    notes: Optional[str] = None
+    worker_name: str = "Unknown"
+    version: int = 1
+
+    class Config:
+        from_attributes = True
+
+class WorkerBalanceRead(BaseModel):
+    worker_id: int
+    worker_name: str = "Unknown"
+    outstanding: float  # advances not yet recovered by payroll
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class PayrollRead(BaseModel):
+    id: int
+    worker_id: int
+    month: int
+    year: int
+    total_kg: float
+    gross_earnings: float
+    total_advances: float
+    brought_forward: float = 0.0
+    carried_forward: float = 0.0
+    net_pay: float
+    paid: bool
+    payment_date: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    worker_name: str = "Unknown"
+    worker_role: str = "Unknown"
+    version: int = 1
+
+    class Config:
+        from_attributes = True
+
+class BonusRead(BaseModel):
+    id: int
+    factory_id: int
+    period: str
+    amount: float
+    date_received: Optional[datetime] = None
+    fertilizer_deductions: float
+    net_bonus: float
+    notes: Optional[str] = None
+    factory_name: str = "Unknown"
+    version: int = 1
+
+    class Config:
+        from_attributes = True
+
+class FertilizerPurchaseRead(BaseModel):
+    id: int
+    factory_id: int
+    bags: int
+    cost_per_bag: float
+    total_cost: float
+    date: Optional[datetime] = None
+    payment_method: str
+    paid: bool
+    payment_date: Optional[datetime] = None
+    notes: Optional[str] = None
+    factory_name: str = "Unknown"
+    version: int = 1
+
+    class Config:
+        from_attributes = True
+
+class AvocadoSaleRead(BaseModel):
+    id: int
+    quantity_kg: float
+    price_per_kg: float
+    buyer_name: Optional[str] = None
+    date: Optional[datetime] = None
+    payment_status: str
+    notes: Optional[str] = None
+    total_amount: float
+    version: int = 1
+
+    class Config:
+        from_attributes = True
+
+# --- Report Schemas ---
+# Year-over-year reports served from the analytics snapshot. *_change_pct is
+# the change against the previous calendar year (None when it has no data).
+
+class TeaYearReport(BaseModel):
+    year: int
+    records: int
+    workers: int
+    total_kg: float
+    worker_payment: float
+    factory_gross: float
+    factory_net: float
+    farm_profit: float
+    total_kg_change_pct: Optional[float] = None
+    farm_profit_change_pct: Optional[float] = None
+
+class TeaMonthComparison(BaseModel):
+    month: int
+    total_kg: float
+    previous_year_kg: float
+    change_pct: Optional[float] = None
+
+class DairyYearReport(BaseModel):
+    year: int
+    records: int
+    cows: int
+    litres: float
+    litres_per_cow_day: float
+    litres_change_pct: Optional[float] = None
+
+class AvocadoYearReport(BaseModel):
+    year: int
+    harvested_kg: float
+    sold_kg: float
+    revenue: float
+    average_price_per_kg: Optional[float] = None
+    harvested_kg_change_pct: Optional[float] = None
+    revenue_change_pct: Optional[float] = None
+
+class FinanceYearReport(BaseModel):
+    year: int
+    income: float
+    expense: float
+    net: float
+    payroll_cost: float
+    income_change_pct: Optional[float] = None
+    net_change_pct: Optional[float] = None
+
+class SnapshotInfo(BaseModel):
+    built_at: datetime
+    age_seconds: float
+    build_seconds: float
+    refreshing: bool
+    row_counts: Dict[str, int]
+
+# --- Worker Name Resolution Schemas ---
+
+class NameResolveRequest(BaseModel):
+    names: List[str]
+
+class NameCandidate(BaseModel):
+    staff_id: int
+    staff_name: str
+    score: float
+
+class NameResolution(BaseModel):
+    name: str
+    normalized: str
+    status: str  # matched, suggested, new
+    method: Optional[str] = None  # exact, alias, fuzzy
+    staff_id: Optional[int] = None
+    staff_name: Optional[str] = None
+    score: float = 0.0
+    candidates: List[NameCandidate] = []
+
+class AliasConfirm(BaseModel):
+    name: str
+    staff_id: int
+
+# --- Factory Reconciliation Schemas ---
+
+class ReconciliationReport(BaseModel):
+    reconciliation: FactoryReconciliation
+    lines: List[ReconciliationLine]
+
+# --- Dog Pedigree Schemas ---
+
+class PedigreeNode(BaseModel):
+    id: int
+    name: str
+    breed: Optional[str] = None
+    gender: str
+    status: str
+    generation: int  # 0 for the dog itself, 1 for its parents, ...
+    inbreeding_coefficient: float
+    sire: Optional["PedigreeNode"] = None
+    dam: Optional["PedigreeNode"] = None
+
+class PairingScore(BaseModel):
+    sire_id: int
+    sire_name: str
+    breed: Optional[str] = None
+    inbreeding_coefficient: float  # of the puppies
+    common_ancestors: List[int]
+
+# --- Ledger Schemas ---
+
+class ProfitLossLine(BaseModel):
+    account: str
+    name: str
+    kind: str  # income, expense
+    amount: float
+
+class ProfitAndLoss(BaseModel):
+    start: str  # YYYY-MM
+    end: str
+    enterprise: Optional[str] = None
+    income: float
+    expenses: float
+    net_profit: float
+    lines: List[ProfitLossLine]
+
+class MonthlyProfitLoss(BaseModel):
+    year: int
+    month: int
+    income: float
+    expenses: float
+    net_profit: float
+
+# --- Bonus Settlement Schemas ---
+
+class SettlementResult(BaseModel):
+    factory_id: int
+    factory_name: str
+    period: str
+    bonus_id: Optional[int] = None
+    bonus_amount: float
+    purchases_settled: List[int]
+    settled_amount: float
+    purchases_carried_forward: List[int]  # unpaid, left for a later bonus
+    fertilizer_deductions: float
+    net_bonus: float
+    status: str  # settled, nothing_to_settle, no_bonus
+
+# --- Bulk Edit Schemas ---
+# Filters and changes for app/services/bulk_edit.py: only the fields a client
+# sends take part, so a field sent as null is not the same as one left out.
+
+class TeaRecordFilter(BaseModel):
+    ids: Optional[List[int]] = None
+    worker_id: Optional[int] = None
+    factory_id: Optional[int] = None
+    day: Optional[date] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    comment: Optional[str] = None
+
+class TeaRecordChanges(BaseModel):
+    worker_id: Optional[int] = None
+    factory_id: Optional[int] = None
+    quantity: Optional[float] = None
+    date: Optional[datetime] = None
+    comment: Optional[str] = None
+
+class TeaBulkUpdate(BaseModel):
+    where: TeaRecordFilter
+    set: TeaRecordChanges
+
+class AdvanceFilter(BaseModel):
+    ids: Optional[List[int]] = None
+    worker_id: Optional[int] = None
+    month: Optional[int] = None
+    year: Optional[int] = None
+    deducted: Optional[bool] = None
+    day: Optional[date] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    notes: Optional[str] = None
+
+class AdvanceChanges(BaseModel):
+    worker_id: Optional[int] = None
+    amount: Optional[float] = None
+    date: Optional[datetime] = None
+    month: Optional[int] = None
+    year: Optional[int] = None
+    deducted: Optional[bool] = None
+    notes: Optional[str] = None
+
+class AdvanceBulkUpdate(BaseModel):
+    where: AdvanceFilter
+    set: AdvanceChanges
+
+class MilkRecordFilter(BaseModel):
+    ids: Optional[List[int]] = None
+    cow_id: Optional[int] = None
+    day: Optional[date] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    notes: Optional[str] = None
+
+class MilkRecordChanges(BaseModel):
+    cow_id: Optional[int] = None
+    date_recorded: Optional[datetime] = None
+    quantity: Optional[float] = None
+    notes: Optional[str] = None
+
+class MilkBulkUpdate(BaseModel):
+    where: MilkRecordFilter
+    set: MilkRecordChanges
+
+class EggRecordFilter(BaseModel):
+    ids: Optional[List[int]] = None
+    flock_id: Optional[int] = None
+    day: Optional[date] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    comments: Optional[str] = None
+
+class EggRecordChanges(BaseModel):
+    flock_id: Optional[int] = None
+    date_collected: Optional[datetime] = None
+    quantity: Optional[int] = None
+    broken: Optional[int] = None
+    comments: Optional[str] = None
+
+class EggBulkUpdate(BaseModel):
+    where: EggRecordFilter
+    set: EggRecordChanges
+
+class BulkEditResult(BaseModel):
+    matched: int  # records changed or deleted, or that would be on a dry run
+    dry_run: bool
@@ -0,0 +1,261 @@
+"""
+Cold storage for closed payroll years.
+
+Once a past year's payroll is fully paid (and none of its advances are still
+pending) its TeaPlucking, WorkerAdvance and MonthlyPayroll rows are never
+written again. Archiving exports them to zstd-compressed Parquet, one file per
+month, and removes them from the hot tables:
+
+    <ARCHIVE_DIR>/<table>/year=2024/month=03/part-0.parquet
+
+The ArchivedPeriod row committed together with the delete is what marks a
+year as archived; history endpoints read those years back through
+memory-mapped Parquet (read_archived). Run from backend/:
+
+    python -m app.services.archive 2024 [--dry-run]
+"""
+from __future__ import annotations
+import argparse
+import logging
+import shutil
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Type
+from fastapi import HTTPException
+from sqlalchemy import Boolean, DateTime, Float, Integer, and_, delete, func, or_, text
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, SQLModel, select
+from app.core import etag
+from app.core.config import settings
+from app.core.lazy import lazy_import
+from app.core.partitions import is_partitioned, partition_name
+from app.models import ArchivedPeriod, MonthlyPayroll, TeaPlucking, WorkerAdvance
+from app.services import worker_balance
+
+pa = lazy_import("pyarrow")
+pq = lazy_import("pyarrow.parquet")
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_MODELS: Dict[str, Type[SQLModel]] = {
+    "teaplucking": TeaPlucking,
+    "workeradvance": WorkerAdvance,
+    "monthlypayroll": MonthlyPayroll,
+}
+
+
+class PeriodNotClosed(Exception):
+    pass
+
+
+def _year_filter(model, year: int):
+    if model is TeaPlucking:
+        return (TeaPlucking.date >= datetime(year, 1, 1)) & (TeaPlucking.date < datetime(year + 1, 1, 1))
+    return model.year == year
+
+
+def _month_of(model, row) -> int:
+    return row["date"].month if model is TeaPlucking else row["month"]
+
+
+def arrow_schema(model):
+    """Arrow schema matching the columns of a SQLModel table"""
+    types = []
+    for column in model.__table__.columns:
+        if isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        else:
+            arrow_type = pa.string()
+        types.append(pa.field(column.name, arrow_type, nullable=column.nullable))
+    return pa.schema(types)
+
+
+def archived_years(session: Session, table: str) -> Dict[int, str]:
+    """year -> archive directory for every archived year of ``table``"""
+    return {
+        period.year: period.path
+        for period in session.exec(select(ArchivedPeriod).where(ArchivedPeriod.table_name == table)).all()
+    }
+
+
+def is_archived(session: Session, table: str, year: int) -> bool:
+    return session.exec(
+        select(ArchivedPeriod.id).where(ArchivedPeriod.table_name == table, ArchivedPeriod.year == year)
+    ).first() is not None
+
+
+def ensure_writable(session: Session, table: str, year: Optional[int]) -> None:
+    """Reject (409) writes into a year that has been archived"""
+    if year is not None and is_archived(session, table, year):
+        raise HTTPException(409, f"{year} is archived and read-only")
+
+
+def read_archived(
+    session: Session,
+    model,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    **equals,
+) -> List:
+    """
+    Archived rows of ``model`` as (detached) model instances, optionally
+    limited to a year/month and filtered on column equality. Only the month
+    directories asked for are opened, and files are memory-mapped.
+    """
+    paths = archived_years(session, model.__tablename__)
+    if year is not None:
+        paths = {year: paths[year]} if year in paths else {}
+
+    pattern = f"month={month:02d}/*.parquet" if month else "month=*/*.parquet"
+    filters = [(column, "=", value) for column, value in equals.items()] or None
+    records = []
+    for archived_year in sorted(paths):
+        for file in sorted(Path(paths[archived_year]).glob(pattern)):
+            table = pq.read_table(file, memory_map=True, filters=filters)
+            records.extend(model(**row) for row in table.to_pylist())
+    return records
+
+
+def closed_year_problems(session: Session, year: int) -> List[str]:
+    """Reasons ``year`` cannot be archived yet (empty when it is closed)"""
+    problems = []
+    if year >= date.today().year:
+        problems.append(f"{year} is not over yet")
+    payrolls = session.exec(
+        select(func.count(), func.count().filter(MonthlyPayroll.paid == False))
+        .where(MonthlyPayroll.year == year)
+    ).one()
+    if not payrolls[0]:
+        problems.append(f"no payroll has been run for {year}")
+    elif payrolls[1]:
+        problems.append(f"{payrolls[1]} payroll record(s) for {year} are unpaid")
+    pending = session.exec(
+        select(func.count()).where(WorkerAdvance.year == year, WorkerAdvance.deducted == False)
+    ).one()
+    if pending:
+        problems.append(f"{pending} advance(s) for {year} are not deducted yet")
+    # worker_balance.rebuild() reads carried-forward debt from the latest hot payroll
+    later = aliased(MonthlyPayroll)
+    carried = session.exec(
+        select(func.count()).where(
+            MonthlyPayroll.year == year,
+            func.abs(MonthlyPayroll.carried_forward) >= worker_balance.TOLERANCE,
+            ~select(later.id).where(
+                later.worker_id == MonthlyPayroll.worker_id,
+                or_(
+                    later.year > MonthlyPayroll.year,
+                    and_(later.year == MonthlyPayroll.year, later.month > MonthlyPayroll.month),
+                ),
+            ).exists(),
+        )
+    ).one()
+    if carried:
+        problems.append(
+            f"{carried} worker(s) still carry advances forward from their last payroll of {year}; "
+            "run the next payroll first"
+        )
+    return problems
+
+
+def _export(session: Session, model, year: int, root: Path) -> int:
+    """Write a year of ``model`` rows as per-month zstd Parquet under ``root``"""
+    table = model.__tablename__
+    target = root / table / f"year={year}"
+    staging = root / table / f".year={year}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+
+    by_month: Dict[int, list] = {}
+    result = session.execute(
+        select(*model.__table__.columns).where(_year_filter(model, year)).order_by(model.id)
+        .execution_options(yield_per=5000)
+    ).mappings()
+    for row in result:
+        by_month.setdefault(_month_of(model, row), []).append(dict(row))
+
+    schema = arrow_schema(model)
+    written = 0
+    for month, rows in sorted(by_month.items()):
+        directory = staging / f"month={month:02d}"
+        directory.mkdir(parents=True, exist_ok=True)
+        pq.write_table(pa.Table.from_pylist(rows, schema=schema), directory / "part-0.parquet", compression="zstd")
+        # Read the footer back before anything is deleted from the database
+        written += pq.ParquetFile(directory / "part-0.parquet").metadata.num_rows
+
+    # A directory left over from an interrupted run was never recorded in
+    # ArchivedPeriod, so nothing reads it and it can be replaced
+    shutil.rmtree(target, ignore_errors=True)
+    staging.mkdir(parents=True, exist_ok=True)
+    staging.rename(target)
+    return written
+
+
+def _remove_hot_rows(session: Session, model, year: int) -> None:
+    table = model.__tablename__
+    connection = session.connection()
+    if connection.dialect.name == "postgresql" and is_partitioned(connection, table):
+        # The year's partition holds exactly these rows; dropping it is
+        # instant and leaves no dead tuples behind
+        name = partition_name(table, year)
+        if connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+            connection.execute(text(f"DROP TABLE {name}"))
+            etag.touch(session, table)
+            return
+    session.execute(delete(model).where(_year_filter(model, year)))
+
+
+def archive_year(session: Session, year: int, root: Optional[Path] = None, dry_run: bool = False) -> Dict[str, int]:
+    """Export and remove a closed year; returns rows archived per table"""
+    pending = {table: model for table, model in ARCHIVED_MODELS.items() if not is_archived(session, table, year)}
+    if not pending:
+        return {}
+    # Payroll is archived last, so a run interrupted part-way is re-checked
+    # against the same (still hot) payroll rows
+    problems = closed_year_problems(session, year)
+    if problems:
+        raise PeriodNotClosed("; ".join(problems))
+
+    root = Path(root or settings.ARCHIVE_DIR).resolve()
+    archived = {}
+    for table, model in pending.items():
+        if dry_run:
+            archived[table] = session.exec(
+                select(func.count()).select_from(model).where(_year_filter(model, year))
+            ).one()
+            continue
+
+        rows = _export(session, model, year, root)
+        _remove_hot_rows(session, model, year)
+        session.add(ArchivedPeriod(
+            table_name=table,
+            year=year,
+            row_count=rows,
+            path=str(root / table / f"year={year}"),
+        ))
+        session.commit()
+        archived[table] = rows
+        logger.info("Archived %s rows of %s for %s", rows, table, year)
+    return archived
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Archive a closed payroll year to Parquet")
+    parser.add_argument("year", type=int)
+    parser.add_argument("--dry-run", action="store_true", help="only count the rows that would move")
+    args = parser.parse_args()
+
+    from app.database import engine
+
+    with Session(engine) as session:
+        try:
+            result = archive_year(session, args.year, dry_run=args.dry_run)
+        except PeriodNotClosed as exc:
+            raise SystemExit(f"{args.year} cannot be archived: {exc}")
+    for table, rows in result.items():
+        print(f"{table}: {rows} rows {'would be ' if args.dry_run else ''}archived")
@@ -0,0 +1,224 @@
+"""
+Fertilizer-against-bonus settlement.
+
+Fertilizer bought with payment_method "bonus_deduction" is paid for by the
+factory keeping part of the farm's next bonus. Settling a factory's bonus for
+a period (e.g. "2024-H1"):
+
+1. one query (served by the partial ix_fertilizerpurchase_unsettled index)
+   finds the factory's unpaid bonus-deduction purchases dated before the
+   period ends, oldest first;
+2. purchases are deducted in that order while the bonus covers them; any
+   the bonus cannot cover stay unpaid and carry forward to the next period;
+3. the deducted purchases are claimed with one guarded UPDATE (paid, linked
+   to the bonus), so two settlements can never deduct the same purchase;
+4. the settled total is added to the bonus's fertilizer_deductions (any
+   deduction entered by hand is kept), net_bonus is recomputed and the bonus
+   is rebooked in the ledger.
+
+All of it happens in one transaction. settle_period() does the same for
+every factory with a bonus in the period, with a single purchase query and a
+single bonus query for the lot.
+"""
+from __future__ import annotations
+import re
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import or_, update
+from sqlmodel import Session, select
+from app.models import BonusPayment, Factory, FertilizerPurchase
+from app.services import ledger
+
+PERIOD_PATTERN = re.compile(r"^(\d{4})-H([12])$")
+
+SETTLED, NO_BONUS, NOTHING_TO_SETTLE = "settled", "no_bonus", "nothing_to_settle"
+
+
+def period_end(period: str) -> datetime:
+    """First moment after a bonus period ("2024-H1" -> 2024-07-01)"""
+    match = PERIOD_PATTERN.match(period)
+    if not match:
+        raise HTTPException(400, "Invalid period. Use YYYY-H1 or YYYY-H2")
+    year, half = int(match.group(1)), int(match.group(2))
+    return datetime(year, 7, 1) if half == 1 else datetime(year + 1, 1, 1)
+
+
+def unsettled_purchases(session: Session, before: datetime, factory_id: Optional[int] = None) -> List[FertilizerPurchase]:
+    """Unpaid bonus-deduction purchases dated before ``before``, oldest first"""
+    conditions = [
+        FertilizerPurchase.paid == False,  # noqa: E712
+        FertilizerPurchase.payment_method == "bonus_deduction",
+        or_(FertilizerPurchase.date < before, FertilizerPurchase.date.is_(None)),
+    ]
+    if factory_id is not None:
+        conditions.append(FertilizerPurchase.factory_id == factory_id)
+    return session.exec(
+        select(FertilizerPurchase).where(*conditions).order_by(
+            FertilizerPurchase.factory_id, FertilizerPurchase.date, FertilizerPurchase.id
+        )
+    ).all()
+
+
+def _period_bonuses(session: Session, period: str, factory_id: Optional[int] = None) -> Dict[int, BonusPayment]:
+    conditions = [BonusPayment.period == period]
+    if factory_id is not None:
+        conditions.append(BonusPayment.factory_id == factory_id)
+    bonuses: Dict[int, BonusPayment] = {}
+    for bonus in session.exec(select(BonusPayment).where(*conditions).order_by(BonusPayment.id)).all():
+        if bonus.factory_id in bonuses:
+            raise HTTPException(409, f"More than one {period} bonus recorded for factory {bonus.factory_id}")
+        bonuses[bonus.factory_id] = bonus
+    return bonuses
+
+
+def _deduct(session: Session, bonus: BonusPayment, amount: float) -> None:
+    bonus.fertilizer_deductions = (bonus.fertilizer_deductions or 0.0) + amount
+    bonus.net_bonus = bonus.amount - bonus.fertilizer_deductions
+    session.add(bonus)
+    session.flush()
+    ledger.book(session, bonus)
+
+
+def refund(session: Session, bonus_id: int, amount: float) -> None:
+    """Take ``amount`` of released fertilizer back off a bonus's deductions"""
+    bonus = session.get(BonusPayment, bonus_id)
+    if bonus is not None:
+        _deduct(session, bonus, -amount)
+
+
+def release(session: Session, purchase: FertilizerPurchase) -> None:
+    """Take a settled purchase back off its bonus, unpaid again (before it is edited or deleted)"""
+    if purchase.bonus_payment_id is None:
+        return
+    bonus_id, purchase.bonus_payment_id = purchase.bonus_payment_id, None
+    purchase.paid, purchase.payment_date = False, None
+    session.add(purchase)
+    refund(session, bonus_id, purchase.total_cost)
+
+
+def unsettle(session: Session, bonus: BonusPayment) -> int:
+    """Return every purchase settled against a bonus to unpaid (before the bonus is deleted)"""
+    return session.execute(
+        update(FertilizerPurchase)
+        .where(FertilizerPurchase.bonus_payment_id == bonus.id)
+        .values(paid=False, payment_date=None, bonus_payment_id=None, version=FertilizerPurchase.version + 1)
+        .execution_options(synchronize_session="fetch")
+    ).rowcount
+
+
+def _deductible(bonus: BonusPayment, purchases: List[FertilizerPurchase]) -> Tuple[List[FertilizerPurchase], List[FertilizerPurchase]]:
+    """Split purchases, oldest first, into those the bonus still covers and those it cannot"""
+    available = bonus.amount - (bonus.fertilizer_deductions or 0.0)
+    covered, carried = [], []
+    for purchase in purchases:
+        if not carried and purchase.total_cost <= available + 1e-9:
+            covered.append(purchase)
+            available -= purchase.total_cost
+        else:
+            # Keep purchases in date order: once one does not fit, later ones wait too
+            carried.append(purchase)
+    return covered, carried
+
+
+def _settle(
+    session: Session,
+    factory: Factory,
+    period: str,
+    bonus: Optional[BonusPayment],
+    purchases: List[FertilizerPurchase],
+    dry_run: bool,
+) -> dict:
+    result = {
+        "factory_id": factory.id,
+        "factory_name": factory.name,
+        "period": period,
+        "bonus_id": bonus.id if bonus else None,
+        "bonus_amount": bonus.amount if bonus else 0.0,
+        "purchases_settled": [],
+        "settled_amount": 0.0,
+        "purchases_carried_forward": [purchase.id for purchase in purchases],
+        "fertilizer_deductions": bonus.fertilizer_deductions if bonus else 0.0,
+        "net_bonus": bonus.net_bonus if bonus else 0.0,
+        "status": NO_BONUS,
+    }
+    if bonus is None:
+        return result
+
+    covered, carried = _deductible(bonus, purchases)
+    settled_amount = sum(purchase.total_cost for purchase in covered)
+    if not dry_run and covered:
+        claimed = session.execute(
+            update(FertilizerPurchase)
+            .where(
+                FertilizerPurchase.id.in_([purchase.id for purchase in covered]),
+                FertilizerPurchase.paid == False,  # noqa: E712
+            )
+            .values(
+                paid=True,
+                payment_date=bonus.date_received or datetime.now(),
+                bonus_payment_id=bonus.id,
+                version=FertilizerPurchase.version + 1,
+            )
+            .returning(FertilizerPurchase.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        if len(claimed) != len(covered):
+            session.rollback()
+            raise HTTPException(409, f"Purchases for factory {factory.id} changed during settlement; try again")
+
+    if dry_run:
+        deductions = (bonus.fertilizer_deductions or 0.0) + settled_amount
+    else:
+        if covered:
+            _deduct(session, bonus, settled_amount)
+        deductions = bonus.fertilizer_deductions
+    result.update(
+        purchases_settled=[purchase.id for purchase in covered],
+        settled_amount=settled_amount,
+        purchases_carried_forward=[purchase.id for purchase in carried],
+        fertilizer_deductions=deductions,
+        net_bonus=bonus.amount - deductions,
+        status=SETTLED if covered else NOTHING_TO_SETTLE,
+    )
+    return result
+
+
+def settle_factory(session: Session, factory_id: int, period: str, dry_run: bool = False) -> dict:
+    """Deduct a factory's unsettled fertilizer from its bonus for the period"""
+    before = period_end(period)
+    factory = session.get(Factory, factory_id)
+    if not factory:
+        raise HTTPException(404, "Factory not found")
+    bonus = _period_bonuses(session, period, factory_id).get(factory_id)
+    if bonus is None:
+        raise HTTPException(404, f"No {period} bonus recorded for {factory.name}")
+
+    result = _settle(session, factory, period, bonus, unsettled_purchases(session, before, factory_id), dry_run)
+    if not dry_run:
+        session.commit()
+    return result
+
+
+def settle_period(session: Session, period: str, dry_run: bool = False) -> List[dict]:
+    """Settle every factory for the period at once, in one transaction"""
+    before = period_end(period)
+    bonuses = _period_bonuses(session, period)
+    pending: Dict[int, List[FertilizerPurchase]] = defaultdict(list)
+    for purchase in unsettled_purchases(session, before):
+        pending[purchase.factory_id].append(purchase)
+
+    factory_ids = sorted(set(bonuses) | set(pending))
+    factories = {
+        factory.id: factory
+        for factory in session.exec(select(Factory).where(Factory.id.in_(factory_ids))).all()
+    }
+    results = [
+        _settle(session, factories[factory_id], period, bonuses.get(factory_id), pending[factory_id], dry_run)
+        for factory_id in factory_ids
+        if factory_id in factories
+    ]
+    if not dry_run:
+        session.commit()
+    return results
@@ -0,0 +1,87 @@
+"""
+Set-based bulk edits.
+
+A bulk edit names its records with a filter, the fields a client sends:
+
+    {"where": {"day": "2024-03-01", "factory_id": 2}, "set": {"factory_id": 3}}
+    {"comment": "Imported from Excel - Sheet1"}
+
+and runs as one UPDATE (or DELETE) ... RETURNING over every record it
+matches, instead of a read, change and commit per record. The rows that come
+back are what the router books in the ledger and folds into balances and
+caches. A field sent as null matches records where it is null.
+
+A filter must name at least one field, so a bulk edit never reaches a whole
+table by accident, and a dry run only counts what the filter matches.
+"""
+from datetime import datetime, time, timedelta
+from typing import Iterable, List
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import delete, func, update
+from sqlmodel import Session, select
+
+
+def where(model, criteria: BaseModel, day_column) -> list:
+    """SQL conditions for the fields a filter sent (``day``, ``start_date`` and ``end_date`` on ``day_column``)"""
+    conditions = []
+    for name in sorted(criteria.model_fields_set):
+        value = getattr(criteria, name)
+        if name == "ids":
+            conditions.append(model.id.in_(value or []))
+        elif name in ("day", "start_date", "end_date"):
+            if value is None:
+                continue
+            if name != "end_date":
+                conditions.append(day_column >= datetime.combine(value, time.min))
+            if name != "start_date":
+                conditions.append(day_column < datetime.combine(value + timedelta(days=1), time.min))
+        else:
+            column = getattr(model, name)
+            conditions.append(column.is_(None) if value is None else column == value)
+    if not conditions:
+        raise HTTPException(400, "A bulk edit needs at least one filter")
+    return conditions
+
+
+def changes(model, body: BaseModel, required: Iterable[str] = ()) -> dict:
+    """The columns a bulk update sets: only the fields the client sent"""
+    values = body.model_dump(exclude_unset=True)
+    if not values:
+        raise HTTPException(400, "Nothing to change")
+    columns = model.__table__.columns
+    for name, value in values.items():
+        if value is None and (name in required or not columns[name].nullable):
+            raise HTTPException(400, f"{name} cannot be null")
+    return values
+
+
+def dry_run(session: Session, model, conditions: list) -> dict:
+    """How many records a bulk edit would touch"""
+    matched = session.exec(select(func.count()).select_from(model).where(*conditions)).one()
+    return {"matched": matched, "dry_run": True}
+
+
+def result(rows: List) -> dict:
+    return {"matched": len(rows), "dry_run": False}
+
+
+def update_where(session: Session, model, conditions: list, values: dict) -> List:
+    """One UPDATE ... RETURNING for every matched record; their versions move on too"""
+    return session.execute(
+        update(model)
+        .where(*conditions)
+        .values(**values, version=model.version + 1)
+        .returning(*model.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+
+def delete_where(session: Session, model, conditions: list) -> List:
+    """One DELETE ... RETURNING for every matched record"""
+    return session.execute(
+        delete(model)
+        .where(*conditions)
+        .returning(*model.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ).all()
@@ -0,0 +1,168 @@
+"""
+Monthly tea workbook export in the farm's daily-grid paper format.
+
+The layout is the one app.services.excel_import reads, but the workbook is a
+report, not a backup: the importer books every kilo on one factory at
+WORKER_RATE, whatever factory and rates the records had, and importing a
+month already in the database adds its records a second time.
+
+    DATE          1     2   ...  31   |  KGS   GROSS   ADV    NET
+    <worker>     kg    kg   ...  kg   |  totals for the worker
+    ADV          amt   ...              (only for workers with advances)
+    TOTALS       kg    kg   ...  kg
+    <factory>    kg    kg   ...  kg     (deliveries per factory)
+
+Every month gets all 31 day columns, so the totals always sit beyond the
+columns the importer reads. Advances belong to a payroll month, not to the
+month of their date: one dated in another month (or undated) sits on day 1. The grid comes from a single grouped query of
+(worker or factory, day) rows, and openpyxl's write-only workbook flushes
+each row to a temporary file, so memory stays flat whatever the size of
+the month.
+"""
+from __future__ import annotations
+import calendar
+import tempfile
+from collections import defaultdict
+from datetime import datetime
+from itertools import groupby
+from typing import Iterable, Iterator, List, Tuple
+from sqlalchemy import and_, case, func, literal, union_all
+from sqlmodel import Session, select
+from app.core.lazy import lazy_import
+from app.models import Factory, Staff, TeaPlucking, WorkerAdvance
+from app.services import archive
+from app.services.excel_import import DAY_COLUMNS
+
+openpyxl = lazy_import("openpyxl")
+
+WORKERS, FACTORIES = 0, 1
+TOTAL_HEADERS = ["KGS", "GROSS", "ADV", "NET"]
+
+# (section, owner id, owner name, day, kg, gross, advance)
+GridRow = Tuple[int, int, str, int, float, float, float]
+
+
+def _month_range(month: int, year: int):
+    return datetime(year, month, 1), datetime(year + month // 12, month % 12 + 1, 1)
+
+
+def month_grid(session: Session, month: int, year: int) -> Iterator[GridRow]:
+    """Per-day kilos, earnings and advances for each worker, then kilos per factory"""
+    month_start, month_end = _month_range(month, year)
+    in_month = and_(TeaPlucking.date >= month_start, TeaPlucking.date < month_end)
+    tea_day = func.extract("day", TeaPlucking.date)
+    advance_day = case(
+        (and_(WorkerAdvance.date >= month_start, WorkerAdvance.date < month_end), func.extract("day", WorkerAdvance.date)),
+        else_=1,
+    )
+
+    parts = union_all(
+        select(
+            literal(WORKERS).label("section"), TeaPlucking.worker_id.label("owner_id"), tea_day.label("day"),
+            func.sum(TeaPlucking.quantity).label("kg"),
+            func.sum(func.coalesce(TeaPlucking.worker_payment, 0)).label("gross"),
+            literal(0.0).label("advance"),
+        ).where(in_month).group_by(TeaPlucking.worker_id, tea_day),
+        select(
+            literal(WORKERS), WorkerAdvance.worker_id, advance_day,
+            literal(0.0), literal(0.0), func.sum(WorkerAdvance.amount),
+        ).where(WorkerAdvance.month == month, WorkerAdvance.year == year)
+        .group_by(WorkerAdvance.worker_id, advance_day),
+        select(
+            literal(FACTORIES), TeaPlucking.factory_id, tea_day,
+            func.sum(TeaPlucking.quantity), literal(0.0), literal(0.0),
+        ).where(in_month, TeaPlucking.factory_id.is_not(None))
+        .group_by(TeaPlucking.factory_id, tea_day),
+    ).subquery()
+
+    name = func.coalesce(Staff.name, Factory.name, "Unknown")
+    result = session.execute(
+        select(
+            parts.c.section, parts.c.owner_id, name, parts.c.day,
+            func.sum(parts.c.kg), func.sum(parts.c.gross), func.sum(parts.c.advance),
+        )
+        .select_from(parts)
+        .outerjoin(Staff, and_(parts.c.section == WORKERS, Staff.id == parts.c.owner_id))
+        .outerjoin(Factory, and_(parts.c.section == FACTORIES, Factory.id == parts.c.owner_id))
+        .group_by(parts.c.section, parts.c.owner_id, name, parts.c.day)
+        .order_by(parts.c.section, name, parts.c.owner_id, parts.c.day)
+        .execution_options(yield_per=2000)
+    )
+    for section, owner_id, owner_name, day, kg, gross, advance in result:
+        yield section, owner_id, owner_name, int(day), kg or 0.0, gross or 0.0, advance or 0.0
+
+
+def archived_month_grid(session: Session, month: int, year: int) -> List[GridRow]:
+    """month_grid for a year that lives in Parquet cold storage"""
+    workers = {worker.id: worker.name for worker in session.exec(select(Staff)).all()}
+    factories = {factory.id: factory.name for factory in session.exec(select(Factory)).all()}
+    cells = defaultdict(lambda: [0.0, 0.0, 0.0])
+    for record in archive.read_archived(session, TeaPlucking, year, month):
+        cell = cells[WORKERS, record.worker_id, workers.get(record.worker_id, "Unknown"), record.date.day]
+        cell[0] += record.quantity
+        cell[1] += record.worker_payment or 0.0
+        if record.factory_id is not None:
+            cells[FACTORIES, record.factory_id, factories.get(record.factory_id, "Unknown"), record.date.day][0] += record.quantity
+    for advance in archive.read_archived(session, WorkerAdvance, year, month):
+        in_month = advance.date and (advance.date.year, advance.date.month) == (year, month)
+        day = advance.date.day if in_month else 1
+        cells[WORKERS, advance.worker_id, workers.get(advance.worker_id, "Unknown"), day][2] += advance.amount
+    return sorted(
+        (key + tuple(values) for key, values in cells.items()),
+        key=lambda row: (row[0], row[2], row[1], row[3]),
+    )
+
+
+def _grid_rows(cells: Iterable[GridRow]) -> Iterator[list]:
+    """Sheet rows from grid cells, one owner at a time"""
+    day_totals = [0.0] * DAY_COLUMNS
+    factories_started = False
+    for (section, _, owner_name), owner_cells in groupby(cells, key=lambda cell: cell[:3]):
+        kg, advances = [None] * DAY_COLUMNS, [None] * DAY_COLUMNS
+        total_kg = total_gross = total_advance = 0.0
+        for *_, day, day_kg, day_gross, day_advance in owner_cells:
+            if day_kg:
+                kg[day - 1] = (kg[day - 1] or 0.0) + day_kg
+            if day_advance:
+                advances[day - 1] = (advances[day - 1] or 0.0) + day_advance
+            total_kg += day_kg
+            total_gross += day_gross
+            total_advance += day_advance
+
+        if section == FACTORIES:
+            if not factories_started:
+                factories_started = True
+                yield ["TOTALS", *(total or None for total in day_totals)]
+            yield [owner_name, *kg, total_kg]
+            continue
+
+        for day, day_kg in enumerate(kg):
+            day_totals[day] += day_kg or 0.0
+        yield [owner_name, *kg, total_kg, total_gross, total_advance, total_gross - total_advance]
+        if total_advance:
+            yield ["ADV", *advances]
+
+    if not factories_started:
+        yield ["TOTALS", *(total or None for total in day_totals)]
+
+
+def write_month_workbook(session: Session, month: int, year: int, target) -> None:
+    """Write the month's daily-grid workbook to ``target`` (a path or binary file)"""
+    if archive.is_archived(session, "teaplucking", year):
+        cells = archived_month_grid(session, month, year)
+    else:
+        cells = month_grid(session, month, year)
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(f"{calendar.month_abbr[month].upper()} {year}")
+    sheet.append(["DATE", *range(1, DAY_COLUMNS + 1), *TOTAL_HEADERS])
+    for row in _grid_rows(cells):
+        sheet.append(row)
+    workbook.save(target)
+
+
+def export_month_workbook(session: Session, month: int, year: int) -> str:
+    """Write the month's workbook to a temporary file and return its path"""
+    with tempfile.NamedTemporaryFile(prefix=f"payroll_{year}_{month:02d}_", suffix=".xlsx", delete=False) as handle:
+        write_month_workbook(session, month, year, handle)
+    return handle.name
@@ -0,0 +1,273 @@
+"""
+Streaming import of the monthly tea sheets.
+
+The sheet layout is one row per worker (name in column A, kilos for days 1-31
+in the following columns), optionally followed by an ADV row with that
+worker's advances, and factory totals at the bottom. Rows labelled with a
+known factory name are totals, never workers.
+
+Uploads are never read into memory whole: the workbook is parsed from the
+temporary file Starlette spools every UploadFile to, using openpyxl's
+read-only reader, and rows are written in chunks with bulk INSERTs. Only one
+chunk and the worker name -> id map are held at a time, so peak memory stays
+flat however large the workbook is (scripts/bench_import_memory.py).
+"""
+from __future__ import annotations
+import math
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from fastapi import UploadFile
+from sqlalchemy import insert
+from sqlmodel import Session, select
+from app.core.lazy import lazy_import
+from app.models import Factory, Staff, TeaPlucking, WorkerAdvance
+from app.services import import_validation, ledger, name_resolution, worker_balance
+
+openpyxl = lazy_import("openpyxl")
+pd = lazy_import("pandas")
+
+CHUNK_ROWS = 500
+DAY_COLUMNS = 31
+WORKER_RATE = 8.0  # the farm pays pluckers KES 8/kg
+TRANSPORT_DEDUCTION = 3.0
+
+# Row labels that are never workers, in normalized form (name_resolution)
+NON_WORKER_LABELS = {"totals", "total", "date", "kgs", "gross", "net", "dwd", "adv", "sup victor"}
+FACTORY_PREFIXES = ("kaisugu", "finlays", "ktda", "kuresoi", "kipng")
+
+
+def _is_blank(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value)) or not str(value).strip()
+
+
+def label_of(row: tuple) -> str:
+    return "" if not row or _is_blank(row[0]) else str(row[0]).strip()
+
+
+def is_worker_label(label: str, factory_names: Set[str] = frozenset()) -> bool:
+    key = name_resolution.normalize_name(label)
+    return bool(key) and key not in NON_WORKER_LABELS | factory_names and not key.startswith(FACTORY_PREFIXES)
+
+
+def factory_labels(session: Session) -> Set[str]:
+    """Normalized factory names, as they appear on the factory totals rows"""
+    return {name_resolution.normalize_name(name) for name in session.exec(select(Factory.name)).all()}
+
+
+def open_sheet(upload: UploadFile) -> Tuple[str, Iterator[tuple]]:
+    """Name of the first sheet and a lazy iterator over its rows (name + day columns)"""
+    upload.file.seek(0)
+    if upload.filename.lower().endswith(".xlsx"):
+        workbook = openpyxl.load_workbook(upload.file, read_only=True, data_only=True)
+        sheet = workbook.worksheets[0]
+
+        def rows():
+            try:
+                yield from sheet.iter_rows(max_col=DAY_COLUMNS + 1, values_only=True)
+            finally:
+                workbook.close()
+
+        return sheet.title, rows()
+
+    # Legacy .xls has no streaming reader, so pandas loads the sheet whole
+    excel = pd.ExcelFile(upload.file)
+    frame = excel.parse(excel.sheet_names[0], header=None, usecols=range(DAY_COLUMNS + 1))
+    return excel.sheet_names[0], frame.itertuples(index=False, name=None)
+
+
+def chunked(items: Iterable, size: int = CHUNK_ROWS) -> Iterator[list]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class SheetWorkers:
+    """
+    Worker ids for the names on one sheet. Names are resolved through
+    app.services.name_resolution, so a respelling of an existing worker
+    ("Dorcas" for "Dorcas Nekesa") is not created again.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+        self.index = name_resolution.build_index(session)
+        self.ids: Dict[str, int] = {}
+        self.created: List[str] = []
+        self.created_ids: Set[int] = set()
+        self.matches: List[name_resolution.NameMatch] = []  # resolved through an alias or fuzzy match
+        self.review: List[name_resolution.NameMatch] = []  # created, though a close match exists
+
+    def resolve(self, names: Iterable[str]) -> None:
+        """Resolve (or create per-kilo Staff for) every name not seen yet"""
+        waiting: Dict[str, str] = {}  # name -> normalized key of the worker to create
+        pending: Dict[str, Staff] = {}
+        for name in sorted(set(names) - self.ids.keys()):
+            match = self.index.resolve(name)
+            if match.status == name_resolution.MATCHED:
+                self.ids[name] = match.staff_id
+                if match.method != "exact":
+                    self.matches.append(match)
+                continue
+            if match.status == name_resolution.SUGGESTED:
+                self.review.append(match)
+            waiting[name] = match.normalized or name
+            pending.setdefault(waiting[name], Staff(name=name, role="Tea Plucker", pay_type="per_kilo", pay_rate=0))
+
+        if not pending:
+            return
+        self.session.add_all(pending.values())
+        self.session.flush()
+        for worker in pending.values():
+            self.index.add(worker.id, worker.name)
+            self.created.append(worker.name)
+            self.created_ids.add(worker.id)
+            self.session.expunge(worker)
+        for name, key in waiting.items():
+            self.ids[name] = pending[key].id
+
+    def report(self) -> dict:
+        return {
+            "name_matches": [
+                {"name": m.name, "staff_id": m.staff_id, "staff_name": m.staff_name, "score": m.score, "method": m.method}
+                for m in self.matches
+            ],
+            "needs_review": [
+                {"name": m.name, "suggested_staff_id": m.staff_id, "suggested_staff_name": m.staff_name, "score": m.score}
+                for m in self.review
+            ],
+        }
+
+
+def _tea_rows(cells: pd.DataFrame, factory: Optional[Factory], dates: Dict[int, datetime], comment: str) -> List[dict]:
+    """TeaPlucking rows for validated tea cells, payments worked out a column at a time"""
+    if factory is None or cells.empty:
+        return []
+    quantity = cells["value"]
+    worker_payment = quantity * WORKER_RATE
+    factory_gross = quantity * factory.rate_per_kg
+    factory_net_to_farm = factory_gross - quantity * TRANSPORT_DEDUCTION
+    return [
+        {
+            "worker_id": worker_id,
+            "factory_id": factory.id,
+            "quantity": kg,
+            "date": dates[day],
+            "worker_rate": WORKER_RATE,
+            "factory_rate": factory.rate_per_kg,
+            "transport_deduction": TRANSPORT_DEDUCTION,
+            "worker_payment": payment,
+            "factory_gross": gross,
+            "factory_net_to_farm": net,
+            "farm_profit": net - payment,
+            "comment": comment,
+        }
+        for worker_id, day, kg, payment, gross, net in zip(
+            cells["worker_id"].tolist(), cells["day"].tolist(), quantity.tolist(),
+            worker_payment.tolist(), factory_gross.tolist(), factory_net_to_farm.tolist(),
+        )
+    ]
+
+
+def _advance_rows(cells: pd.DataFrame, month: int, year: int, dates: Dict[int, datetime], comment: str) -> List[dict]:
+    """WorkerAdvance rows for validated ADV cells"""
+    return [
+        {
+            "worker_id": worker_id,
+            "amount": amount,
+            "date": dates[day],
+            "month": month,
+            "year": year,
+            "deducted": False,
+            "notes": comment,
+        }
+        for worker_id, day, amount in zip(cells["worker_id"].tolist(), cells["day"].tolist(), cells["value"].tolist())
+    ]
+
+
+def import_tea_sheet(
+    session: Session,
+    rows: Iterable[tuple],
+    month: int,
+    year: int,
+    sheet_name: str,
+    factory: Optional[Factory],
+) -> dict:
+    """
+    Create workers, tea records (when a factory is given) and advances from
+    sheet rows. Day cells are checked by import_validation first; the ones it
+    rejects are left out and listed under "errors".
+    """
+    workers = SheetWorkers(session)
+    validator = import_validation.SheetValidator(month, year, DAY_COLUMNS)
+    tea_count = advance_count = 0
+    current_worker = None
+    factory_names = factory_labels(session)
+    comment = f"Imported from Excel - {sheet_name}"
+    dates = {day: datetime(year, month, day) for day in range(1, validator.days_in_month + 1)}
+
+    for chunk in chunked(rows):
+        labels = [label_of(row) for row in chunk]
+        workers.resolve(label for label in labels if is_worker_label(label, factory_names))
+
+        # What each row holds, and whose it is
+        kinds, names = [], []
+        for label in labels:
+            if is_worker_label(label, factory_names):
+                current_worker = label
+                kinds.append(import_validation.TEA if factory is not None else None)
+                names.append(label)
+            elif label.upper() == "ADV" and current_worker:
+                kinds.append(import_validation.ADVANCE)
+                names.append(current_worker)
+            else:
+                kinds.append(None)
+                names.append(None)
+        cells = validator.check(chunk, kinds, [workers.ids.get(name) for name in names], names)
+
+        tea_rows = _tea_rows(cells[cells["kind"] == import_validation.TEA], factory, dates, comment)
+        advance_rows = _advance_rows(cells[cells["kind"] == import_validation.ADVANCE], month, year, dates, comment)
+
+        # Bulk INSERTs: nothing is kept in the session's identity map. The
+        # inserted rows come back as plain rows and are booked in the ledger
+        # a chunk at a time.
+        if tea_rows:
+            inserted = session.execute(insert(TeaPlucking).returning(*TeaPlucking.__table__.columns), tea_rows)
+            for records in chunked(inserted):
+                ledger.book_many(session, TeaPlucking, records, new=True)
+        if advance_rows:
+            inserted = session.execute(insert(WorkerAdvance).returning(*WorkerAdvance.__table__.columns), advance_rows)
+            for records in chunked(inserted):
+                ledger.book_many(session, WorkerAdvance, records, new=True)
+                worker_balance.book_advances(session, records)
+        tea_count += len(tea_rows)
+        advance_count += len(advance_rows)
+
+    session.commit()
+    return {
+        "workers_created": len(workers.created),
+        "workers_list": workers.created,
+        "advances_imported": advance_count,
+        "tea_records_imported": tea_count,
+        "cells_rejected": validator.cells_rejected,
+        **workers.report(),
+        "errors": validator.report(),
+    }
+
+
+def import_worker_names(session: Session, rows: Iterable[tuple]) -> dict:
+    """Create per-kilo Staff for every worker name on the sheet"""
+    factory_names = factory_labels(session)
+    names = {label for label in map(label_of, rows) if is_worker_label(label, factory_names)}
+    workers = SheetWorkers(session)
+    workers.resolve(names)
+    session.commit()
+    existing = {name for name in names if workers.ids[name] not in workers.created_ids}
+    return {
+        "workers_created": len(workers.created),
+        "workers_existing": len(existing),
+        "created_list": sorted(workers.created),
+        "existing_list": sorted(existing),
+        "total_workers": len(names),
+        **workers.report(),
+    }
@@ -0,0 +1,176 @@
+"""
+Validation of the day cells of an imported tea sheet.
+
+Each chunk of sheet rows (excel_import.CHUNK_ROWS at a time) is checked as
+whole columns rather than cell by cell: the chunk's day columns become one
+object array, the filled cells are picked out with a mask and coerced to
+numbers in one pass, and every rule below is a vector comparison. Cells that
+break a rule are left out of the import and reported; the rest go on to the
+bulk INSERTs.
+
+    not_a_number   text that is not a number ("x", "1,200")
+    negative       a negative kilo or advance amount
+    no_such_day    a value under day 31 of a 30-day month, day 29 of a
+                   28-day February, ...
+    too_heavy      more kilos than TEA_MAX_KG_PER_DAY in a day
+    duplicate      kilos for a worker and day already given on an earlier row
+                   (the same worker twice, or two spellings of one name)
+
+Blank and zero cells are days without a value, as before. Duplicates are
+found with one bitmask of days per worker, so what is kept across chunks
+grows with the number of workers, like the worker name map, and not with
+the number of cells.
+
+report() groups the rejected cells by sheet row:
+
+    [{"row": 14, "worker": "Jane Doe", "kind": "tea",
+      "cells": [{"day": 3, "value": "x", "error": "not_a_number", "message": "..."}]}]
+"""
+from __future__ import annotations
+import calendar
+from typing import Dict, List, Optional, Sequence
+from app.core.config import settings
+from app.core.lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+TEA, ADVANCE = "tea", "advance"
+
+NOT_A_NUMBER, NEGATIVE, NO_SUCH_DAY, TOO_HEAVY, DUPLICATE = (
+    "not_a_number", "negative", "no_such_day", "too_heavy", "duplicate"
+)
+
+CELL_COLUMNS = ["row", "kind", "worker_id", "day", "value"]
+
+
+def _plain(value):
+    """A cell as it can go into JSON: numpy scalars unwrapped, dates and the like as text"""
+    value = value.item() if isinstance(value, np.generic) else value
+    return value if isinstance(value, (int, float, str)) else str(value)
+
+
+class SheetValidator:
+    """Checks a sheet's day cells a chunk at a time and keeps what it rejects"""
+
+    def __init__(self, month: int, year: int, day_columns: int = 31, max_kg_per_day: Optional[float] = None):
+        self.month = month
+        self.year = year
+        self.day_columns = day_columns
+        self.days_in_month = calendar.monthrange(year, month)[1]
+        self.max_kg_per_day = settings.TEA_MAX_KG_PER_DAY if max_kg_per_day is None else max_kg_per_day
+        self.rows_read = 0
+        self.days_seen: Dict[int, int] = {}  # worker id -> bitmask of days with kilos
+        self._rejected: List["pd.DataFrame"] = []
+
+    def check(
+        self,
+        chunk: Sequence[tuple],
+        kinds: Sequence[Optional[str]],
+        worker_ids: Sequence[Optional[int]],
+        names: Sequence[Optional[str]],
+    ) -> "pd.DataFrame":
+        """
+        The valid, non-zero day cells of the rows with a ``kind`` (TEA or
+        ADVANCE), in sheet order, as a frame of row, kind, worker_id, day and
+        value. ``names`` are the workers as the report shows them.
+        """
+        first_row = self.rows_read + 1
+        self.rows_read += len(chunk)
+        kinds = np.asarray(kinds, dtype=object)
+        wanted = np.flatnonzero(pd.notna(kinds))
+        if not len(wanted):
+            return pd.DataFrame(columns=CELL_COLUMNS)
+
+        days = range(1, self.day_columns + 1)
+        grid = pd.DataFrame([chunk[i] for i in wanted]).reindex(columns=days).to_numpy(dtype=object)
+        position, column = np.nonzero(pd.notna(grid))
+        raw = grid[position, column]
+        # Numbers and text alike go through their text, so " 12 " reads as 12
+        text = pd.Series(raw, dtype=object).astype(str).str.strip()
+        filled = text.ne("").to_numpy()
+        position, column, raw, text = position[filled], column[filled], raw[filled], text[filled]
+        value = pd.to_numeric(text, errors="coerce").to_numpy(dtype=float)
+
+        rows = wanted[position]
+        cells = pd.DataFrame({
+            "row": rows + first_row,
+            "kind": kinds[rows],
+            "worker_id": np.asarray(worker_ids, dtype=object)[rows],
+            "day": column + 1,
+            "value": value,
+        })
+        error = np.full(len(cells), None, dtype=object)
+
+        def flag(mask, code):
+            error[mask & pd.isna(error)] = code
+
+        day = cells["day"].to_numpy()
+        tea = cells["kind"].to_numpy() == TEA
+        flag(np.isnan(value), NOT_A_NUMBER)
+        flag(value < 0, NEGATIVE)
+        flag(day > self.days_in_month, NO_SUCH_DAY)
+        flag(tea & (value > self.max_kg_per_day), TOO_HEAVY)
+        flag(tea & self._duplicates(cells, tea & pd.isna(error) & (value > 0)), DUPLICATE)
+
+        rejected = pd.notna(error)
+        if rejected.any():
+            report = cells[rejected].assign(error=error[rejected], raw=raw[rejected])
+            report["worker"] = np.asarray(names, dtype=object)[rows[rejected]]
+            self._rejected.append(report)
+        return cells[~rejected & (value > 0)].reset_index(drop=True)
+
+    def _duplicates(self, cells: "pd.DataFrame", candidates) -> "np.ndarray":
+        """Tea cells whose worker already has kilos for the day, earlier in the chunk or the sheet"""
+        duplicate = np.zeros(len(cells), dtype=bool)
+        if not candidates.any():
+            return duplicate
+        keys = cells.loc[candidates, ["worker_id", "day"]]
+        bits = np.left_shift(1, keys["day"].to_numpy(dtype=np.int64))
+        earlier = keys["worker_id"].map(self.days_seen).fillna(0).to_numpy(dtype=np.int64)
+        found = keys.duplicated().to_numpy() | (np.bitwise_and(earlier, bits) != 0)
+        duplicate[np.flatnonzero(candidates)[found]] = True
+
+        kept = pd.DataFrame({"worker_id": keys["worker_id"].to_numpy()[~found], "bit": bits[~found]})
+        for worker_id, mask in kept.groupby("worker_id")["bit"].agg(np.bitwise_or.reduce).items():
+            self.days_seen[worker_id] = self.days_seen.get(worker_id, 0) | int(mask)
+        return duplicate
+
+    @property
+    def cells_rejected(self) -> int:
+        return sum(len(frame) for frame in self._rejected)
+
+    def _message(self, error: str, day: int, worker: Optional[str]) -> str:
+        if error == NOT_A_NUMBER:
+            return "Not a number"
+        if error == NEGATIVE:
+            return "Amount cannot be negative"
+        if error == NO_SUCH_DAY:
+            return f"{calendar.month_name[self.month]} {self.year} has no day {day}"
+        if error == TOO_HEAVY:
+            return f"More than {self.max_kg_per_day:g} kg in a day"
+        return f"{worker or 'This worker'} already has kilos for day {day} on an earlier row"
+
+    def report(self) -> List[dict]:
+        """Rejected cells grouped by sheet row, in sheet order"""
+        if not self._rejected:
+            return []
+        rejected = pd.concat(self._rejected, ignore_index=True)
+        rows: List[dict] = []
+        for (row, kind), group in rejected.groupby(["row", "kind"], sort=True):
+            worker = group["worker"].iloc[0]
+            rows.append({
+                "row": int(row),
+                "worker": worker,
+                "kind": kind,
+                "cells": [
+                    {
+                        "day": int(day),
+                        "value": _plain(raw),
+                        "error": error,
+                        "message": self._message(error, day, worker),
+                    }
+                    for day, raw, error in zip(group["day"].tolist(), group["raw"].tolist(), group["error"].tolist())
+                ],
+            })
+        return rows
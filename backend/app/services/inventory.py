@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from app.models import InventoryItem, StockMovement, StockMovementReason
+
+
+def record_movement(
+    db: Session,
+    item: InventoryItem,
+    change: float,
+    reason: str = StockMovementReason.ADJUSTMENT,
+    note: Optional[str] = None,
+) -> StockMovement:
+    """
+    Apply a quantity change to an item and journal it.
+    The balance is updated with a single atomic UPDATE ... RETURNING, so
+    concurrent movements never overwrite each other. Caller commits.
+    """
+    balance = db.execute(
+        update(InventoryItem)
+        .where(
+            InventoryItem.id == item.id,
+            InventoryItem.quantity + change >= 0,
+        )
+        .values(quantity=InventoryItem.quantity + change)
+        .returning(InventoryItem.quantity)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if balance is None:
+        raise HTTPException(status_code=400, detail=f"Insufficient stock for {item.name}")
+
+    movement = StockMovement(
+        item_id=item.id,
+        change=change,
+        balance_after=balance,
+        reason=reason,
+        note=note,
+    )
+    db.add(movement)
+    db.expire(item, ["quantity"])
+    return movement
+
+
+def set_quantity(db: Session, item: InventoryItem, quantity: float, note: Optional[str] = None):
+    """Journal an absolute stock count as an adjustment movement"""
+    change = quantity - (item.quantity or 0.0)
+    if abs(change) < 1e-9:
+        return None
+    return record_movement(db, item, change, StockMovementReason.ADJUSTMENT, note)
+
+
+def low_stock_items(db: Session) -> List[InventoryItem]:
+    """Items at or below their threshold (served by ix_inventory_low_stock)"""
+    return (
+        db.query(InventoryItem)
+        .filter(InventoryItem.quantity <= InventoryItem.low_stock_threshold)
+        .order_by(InventoryItem.quantity - InventoryItem.low_stock_threshold)
+        .all()
+    )
+
+
+def consumption_forecast(db: Session, item: InventoryItem, days: int = 30) -> dict:
+    """Average daily usage over the last ``days`` and when stock runs low/out"""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    used = db.query(func.coalesce(func.sum(-StockMovement.change), 0.0)).filter(
+        StockMovement.item_id == item.id,
+        StockMovement.reason == StockMovementReason.USAGE,
+        StockMovement.created_at >= since,
+    ).scalar()
+
+    daily_rate = float(used) / days if days > 0 else 0.0
+    quantity = item.quantity or 0.0
+    threshold = item.low_stock_threshold or 0.0
+
+    days_until_low = days_until_empty = None
+    if daily_rate > 0:
+        days_until_low = max(quantity - threshold, 0.0) / daily_rate
+        days_until_empty = quantity / daily_rate
+
+    return {
+        "item_id": item.id,
+        "quantity": quantity,
+        "low_stock_threshold": threshold,
+        "window_days": days,
+        "daily_usage": round(daily_rate, 3),
+        "days_until_low_stock": round(days_until_low, 1) if days_until_low is not None else None,
+        "days_until_empty": round(days_until_empty, 1) if days_until_empty is not None else None,
+    }
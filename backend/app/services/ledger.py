@@ -0,0 +1,401 @@
+"""
+Farm-wide double-entry ledger.
+
+Every record that moves money is booked as balanced journal lines
+(LedgerEntry) by the router that writes it:
+
+    record               debit                              credit
+    TeaPlucking          factory_receivable (net)           tea_sales (gross)
+                         tea_transport (gross - net)
+                         tea_wages (worker payment)         wages_payable
+    WorkerAdvance        worker_advances                    cash
+    MonthlyPayroll       wages_payable (advances)           worker_advances
+      paid               wages_payable (net pay)            cash
+    BonusPayment         factory_receivable (net bonus)     bonus_income (gross)
+                         fertilizer_payable (deductions)
+    FertilizerPurchase   fertilizer                         fertilizer_payable
+      paid from tea      fertilizer_payable                 factory_receivable
+    AvocadoSale          cash, or customer_receivable       avocado_sales
+                         while unpaid
+    Transaction          cash (income)                      other_income
+                         other_expenses (expense)           cash
+
+Wages are expensed as the tea is plucked (tea_sales - tea_transport -
+tea_wages is the records' farm_profit), so a payroll run only settles what is
+owed and net pay is never counted as a cost a second time. Likewise fertilizer
+is expensed once, when bought, and a bonus is income at its gross amount.
+
+book() brings a record's lines in line with its current state: what is
+already booked for the record is netted against what should be, and only the
+difference is posted, dated like the lines it corrects, so an edit or a
+delete fixes the month it belongs to. A posting moves each account's running
+balance with one atomic UPDATE ... RETURNING (every line keeps balance_after)
+and folds income and expense lines into the ProfitLossMonth rollup, so the
+P&L of any months and enterprise is an indexed read of one row per account
+and month.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Type
+from sqlalchemy import func, insert, update
+from sqlmodel import Session, SQLModel, select
+from app.database import dialect_insert
+from app.models import (
+    AvocadoSale,
+    BonusPayment,
+    FertilizerPurchase,
+    LedgerAccount,
+    LedgerEntry,
+    MonthlyPayroll,
+    ProfitLossMonth,
+    TeaPlucking,
+    Transaction,
+    WorkerAdvance,
+)
+
+ASSET, LIABILITY, INCOME, EXPENSE = "asset", "liability", "income", "expense"
+
+# The chart of accounts: code -> (name, kind). Accounts are opened on first use.
+ACCOUNTS = {
+    "cash": ("Cash and bank", ASSET),
+    "factory_receivable": ("Due from tea factories", ASSET),
+    "customer_receivable": ("Due from customers", ASSET),
+    "worker_advances": ("Advances to workers", ASSET),
+    "wages_payable": ("Wages owed to workers", LIABILITY),
+    "fertilizer_payable": ("Fertilizer owed to factories", LIABILITY),
+    "tea_sales": ("Tea deliveries", INCOME),
+    "bonus_income": ("Factory bonuses", INCOME),
+    "avocado_sales": ("Avocado sales", INCOME),
+    "other_income": ("Other income", INCOME),
+    "tea_wages": ("Tea plucking wages", EXPENSE),
+    "tea_transport": ("Tea transport", EXPENSE),
+    "fertilizer": ("Fertilizer", EXPENSE),
+    "other_expenses": ("Other expenses", EXPENSE),
+}
+
+TOLERANCE = 0.005  # half a cent
+ID_CHUNK = 500
+
+# (date, account code, amount): a positive amount is a debit, negative a credit
+Line = Tuple[Optional[datetime], str, float]
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+# ==================== POSTING RULES ====================
+
+def _tea_lines(record) -> List[Line]:
+    gross, net, wages = record.factory_gross or 0.0, record.factory_net_to_farm or 0.0, record.worker_payment or 0.0
+    date = _as_datetime(record.date)
+    return [
+        (date, "factory_receivable", net),
+        (date, "tea_transport", gross - net),
+        (date, "tea_sales", -gross),
+        (date, "tea_wages", wages),
+        (date, "wages_payable", -wages),
+    ]
+
+
+def _advance_lines(advance) -> List[Line]:
+    date = _as_datetime(advance.date) or datetime(advance.year, advance.month, 1)
+    return [(date, "worker_advances", advance.amount), (date, "cash", -advance.amount)]
+
+
+def _payroll_lines(payroll) -> List[Line]:
+    date = _as_datetime(payroll.created_at) or datetime(payroll.year, payroll.month, 1)
+    lines = [(date, "wages_payable", payroll.total_advances), (date, "worker_advances", -payroll.total_advances)]
+    if payroll.paid:
+        paid_on = _as_datetime(payroll.payment_date) or date
+        lines += [(paid_on, "wages_payable", payroll.net_pay), (paid_on, "cash", -payroll.net_pay)]
+    return lines
+
+
+def _bonus_lines(bonus) -> List[Line]:
+    date = _as_datetime(bonus.date_received)
+    return [
+        (date, "factory_receivable", bonus.amount - bonus.fertilizer_deductions),
+        (date, "fertilizer_payable", bonus.fertilizer_deductions),
+        (date, "bonus_income", -bonus.amount),
+    ]
+
+
+def _fertilizer_lines(purchase) -> List[Line]:
+    date = _as_datetime(purchase.date)
+    lines = [(date, "fertilizer", purchase.total_cost), (date, "fertilizer_payable", -purchase.total_cost)]
+    if purchase.paid and purchase.payment_method == "tea_delivery":
+        # Deducted by the factory from tea payments; bonus deductions are
+        # booked with the bonus itself
+        paid_on = _as_datetime(purchase.payment_date) or date
+        lines += [(paid_on, "fertilizer_payable", purchase.total_cost), (paid_on, "factory_receivable", -purchase.total_cost)]
+    return lines
+
+
+def _avocado_sale_lines(sale) -> List[Line]:
+    date = _as_datetime(sale.date)
+    revenue = sale.quantity_kg * sale.price_per_kg
+    debit = "cash" if sale.payment_status == "paid" else "customer_receivable"
+    return [(date, debit, revenue), (date, "avocado_sales", -revenue)]
+
+
+def _transaction_lines(txn) -> List[Line]:
+    date = _as_datetime(txn.date)
+    category = (txn.category or "").lower()
+    if category == "income":
+        return [(date, "cash", txn.amount), (date, "other_income", -txn.amount)]
+    if category == "expense":
+        return [(date, "other_expenses", txn.amount), (date, "cash", -txn.amount)]
+    return []
+
+
+# model -> (enterprise of a record, its lines)
+RULES: Dict[Type[SQLModel], Tuple[Callable[[object], str], Callable[[object], List[Line]]]] = {
+    TeaPlucking: (lambda record: "tea", _tea_lines),
+    WorkerAdvance: (lambda record: "tea", _advance_lines),
+    MonthlyPayroll: (lambda record: "tea", _payroll_lines),
+    BonusPayment: (lambda record: "tea", _bonus_lines),
+    FertilizerPurchase: (lambda record: "tea", _fertilizer_lines),
+    AvocadoSale: (lambda record: "avocado", _avocado_sale_lines),
+    Transaction: (lambda record: (record.unit or "general").strip().lower() or "general", _transaction_lines),
+}
+
+
+# ==================== POSTING ====================
+
+def accounts(session: Session) -> Dict[str, LedgerAccount]:
+    """Every account by code, opening any from ACCOUNTS not used yet"""
+    opened = {account.code: account for account in session.exec(select(LedgerAccount)).all()}
+    missing = [{"code": code, "name": name, "kind": kind} for code, (name, kind) in ACCOUNTS.items() if code not in opened]
+    if missing:
+        # ON CONFLICT DO NOTHING, so requests opening the chart at the same time
+        # do not trip over each other's accounts
+        session.execute(
+            dialect_insert(session.get_bind())(LedgerAccount.__table__).on_conflict_do_nothing(index_elements=["code"]),
+            missing,
+        )
+        opened = {account.code: account for account in session.exec(select(LedgerAccount)).all()}
+    return opened
+
+
+def _booked(session: Session, source: str, source_ids: List[int]) -> Dict[tuple, float]:
+    """Net amount booked so far per (source id, account id, date, enterprise)"""
+    booked: Dict[tuple, float] = {}
+    for start in range(0, len(source_ids), ID_CHUNK):
+        rows = session.exec(
+            select(
+                LedgerEntry.source_id, LedgerEntry.account_id, LedgerEntry.date, LedgerEntry.enterprise,
+                func.sum(LedgerEntry.debit - LedgerEntry.credit),
+            )
+            .where(LedgerEntry.source == source, LedgerEntry.source_id.in_(source_ids[start:start + ID_CHUNK]))
+            .group_by(LedgerEntry.source_id, LedgerEntry.account_id, LedgerEntry.date, LedgerEntry.enterprise)
+        ).all()
+        for source_id, account_id, date, enterprise, amount in rows:
+            booked[source_id, account_id, date, enterprise] = amount
+    return booked
+
+
+def _post(session: Session, source: str, changes: Dict[tuple, float], chart: Dict[str, LedgerAccount]) -> int:
+    """Write journal lines for (source id, account id, date, enterprise) -> amount changes"""
+    lines = [(key, amount) for key, amount in sorted(changes.items(), key=lambda item: (item[0][2], item[0][0])) if abs(amount) >= TOLERANCE]
+    if not lines:
+        return 0
+    kinds = {account.id: account.kind for account in chart.values()}
+
+    # One atomic balance UPDATE per account for the whole posting
+    totals: Dict[int, float] = defaultdict(float)
+    for (_, account_id, _, _), amount in lines:
+        totals[account_id] += amount
+    balances = {
+        account_id: session.execute(
+            update(LedgerAccount)
+            .where(LedgerAccount.id == account_id)
+            .values(balance=LedgerAccount.balance + total)
+            .returning(LedgerAccount.balance)
+            .execution_options(synchronize_session=False)
+        ).scalar() - total
+        for account_id, total in totals.items()
+    }
+
+    entries = []
+    rollup: Dict[tuple, List[float]] = defaultdict(lambda: [0.0, 0.0])
+    for (source_id, account_id, date, enterprise), amount in lines:
+        balances[account_id] += amount
+        entries.append({
+            "account_id": account_id,
+            "date": date,
+            "enterprise": enterprise,
+            "source": source,
+            "source_id": source_id,
+            "debit": max(amount, 0.0),
+            "credit": max(-amount, 0.0),
+            "balance_after": balances[account_id],
+            "created_at": datetime.now(),
+        })
+        if kinds[account_id] == INCOME:
+            rollup[date.year, date.month, enterprise, account_id][0] -= amount
+        elif kinds[account_id] == EXPENSE:
+            rollup[date.year, date.month, enterprise, account_id][1] += amount
+    # A Core INSERT of the table: journal lines never need ORM bookkeeping
+    session.execute(insert(LedgerEntry.__table__), entries)
+
+    if rollup:
+        # One upsert adding to the month's totals, so concurrent postings of
+        # a new month cannot both INSERT it; keys in order against deadlocks
+        upsert = dialect_insert(session.get_bind())(ProfitLossMonth.__table__)
+        session.execute(
+            upsert.on_conflict_do_update(
+                index_elements=["year", "month", "enterprise", "account_id"],
+                set_={
+                    "income": ProfitLossMonth.income + upsert.excluded.income,
+                    "expense": ProfitLossMonth.expense + upsert.excluded.expense,
+                },
+            ),
+            [
+                {"year": year, "month": month, "enterprise": enterprise, "account_id": account_id,
+                 "income": income, "expense": expense}
+                for (year, month, enterprise, account_id), (income, expense) in sorted(rollup.items())
+            ],
+        )
+    session.flush()
+    return len(entries)
+
+
+def book_many(session: Session, model: Type[SQLModel], records: Iterable, new: bool = False) -> int:
+    """
+    Bring the ledger in line with ``records`` (model instances or rows with
+    the same attributes). ``new`` skips looking up earlier lines for records
+    that cannot have any. Caller commits; returns the lines written.
+    """
+    source = model.__tablename__
+    enterprise_of, lines_of = RULES[model]
+    chart = accounts(session)
+    records = list(records)
+    ids = [record.id for record in records]
+    booked = {} if new else _booked(session, source, ids)
+
+    first_booked: Dict[int, datetime] = {}
+    for source_id, _, date, _ in booked:
+        first_booked[source_id] = min(date, first_booked.get(source_id, date))
+
+    changes: Dict[tuple, float] = defaultdict(float)
+    for record in records:
+        enterprise = enterprise_of(record)
+        lines = lines_of(record)
+        if abs(sum(amount for _, _, amount in lines)) >= TOLERANCE:
+            raise ValueError(f"Unbalanced ledger posting for {source} {record.id}")
+        # An undated record keeps the date it was first booked on
+        fallback = first_booked.get(record.id) or datetime.now()
+        for date, code, amount in lines:
+            changes[record.id, chart[code].id, date or fallback, enterprise] += amount
+    for key, amount in booked.items():
+        changes[key] -= amount
+    return _post(session, source, changes, chart)
+
+
+def book(session: Session, record: SQLModel) -> int:
+    """Book (or rebook after an edit) one record; flush it first so it has an id"""
+    return book_many(session, type(record), [record])
+
+
+def unbook(session: Session, model: Type[SQLModel], source_id: int) -> int:
+    """Reverse everything booked for a record that is being deleted"""
+    return unbook_many(session, model, [source_id])
+
+
+def unbook_many(session: Session, model: Type[SQLModel], source_ids: Iterable[int]) -> int:
+    """Reverse everything booked for records that are being deleted, in one posting"""
+    source = model.__tablename__
+    booked = _booked(session, source, list(source_ids))
+    return _post(session, source, {key: -amount for key, amount in booked.items()}, accounts(session))
+
+
+def backfill(session: Session) -> Dict[str, int]:
+    """
+    Book every record in the hot tables, a page at a time. Booking nets
+    against what is already there, so this only writes lines for records
+    booked before the ledger existed (or gone out of step); archived years
+    keep the lines they had. Returns the lines written per table.
+    """
+    written = {}
+    for model in RULES:
+        written[model.__tablename__] = 0
+        last_id = 0
+        while records := session.exec(select(model).where(model.id > last_id).order_by(model.id).limit(ID_CHUNK)).all():
+            written[model.__tablename__] += book_many(session, model, records)
+            last_id = records[-1].id
+            for record in records:
+                session.expunge(record)
+    return written
+
+
+# ==================== REPORTS ====================
+
+def profit_and_loss(
+    session: Session,
+    start: Tuple[int, int],
+    end: Tuple[int, int],
+    enterprise: Optional[str] = None,
+) -> dict:
+    """P&L per account between two (year, month) periods, inclusive, from the rollup"""
+    period = ProfitLossMonth.year * 100 + ProfitLossMonth.month
+    conditions = [
+        ProfitLossMonth.year >= start[0],
+        ProfitLossMonth.year <= end[0],
+        period >= start[0] * 100 + start[1],
+        period <= end[0] * 100 + end[1],
+    ]
+    if enterprise:
+        conditions.append(ProfitLossMonth.enterprise == enterprise.lower())
+    rows = session.exec(
+        select(
+            LedgerAccount.code, LedgerAccount.name, LedgerAccount.kind,
+            func.sum(ProfitLossMonth.income), func.sum(ProfitLossMonth.expense),
+        )
+        .join(LedgerAccount, LedgerAccount.id == ProfitLossMonth.account_id)
+        .where(*conditions)
+        .group_by(LedgerAccount.code, LedgerAccount.name, LedgerAccount.kind)
+        .order_by(LedgerAccount.kind.desc(), LedgerAccount.code)
+    ).all()
+
+    lines = [
+        {"account": code, "name": name, "kind": kind, "amount": round(income if kind == INCOME else expense, 2)}
+        for code, name, kind, income, expense in rows
+        if abs(income) >= TOLERANCE or abs(expense) >= TOLERANCE
+    ]
+    income = sum(line["amount"] for line in lines if line["kind"] == INCOME)
+    expenses = sum(line["amount"] for line in lines if line["kind"] == EXPENSE)
+    return {
+        "start": f"{start[0]}-{start[1]:02d}",
+        "end": f"{end[0]}-{end[1]:02d}",
+        "enterprise": enterprise.lower() if enterprise else None,
+        "income": round(income, 2),
+        "expenses": round(expenses, 2),
+        "net_profit": round(income - expenses, 2),
+        "lines": lines,
+    }
+
+
+def monthly_profit_and_loss(session: Session, year: int, enterprise: Optional[str] = None) -> List[dict]:
+    """Income, expenses and net profit for each month of a year"""
+    conditions = [ProfitLossMonth.year == year]
+    if enterprise:
+        conditions.append(ProfitLossMonth.enterprise == enterprise.lower())
+    rows = session.exec(
+        select(ProfitLossMonth.month, func.sum(ProfitLossMonth.income), func.sum(ProfitLossMonth.expense))
+        .where(*conditions)
+        .group_by(ProfitLossMonth.month)
+        .order_by(ProfitLossMonth.month)
+    ).all()
+    return [
+        {
+            "year": year,
+            "month": month,
+            "income": round(income, 2),
+            "expenses": round(expense, 2),
+            "net_profit": round(income - expense, 2),
+        }
+        for month, income, expense in rows
+        if abs(income) >= TOLERANCE or abs(expense) >= TOLERANCE
+    ]
@@ -0,0 +1,183 @@
+"""
+Worker name resolution for imports.
+
+Sheets spell the same worker in different ways ("Dorcas", "DORCAS  NEKESA",
+"Dorcas N."). Names are compared in normalized form (normalize_name) against
+every worker and every confirmed alias (StaffAlias):
+
+- exact / alias  the normalized name is a worker's name or a confirmed alias
+- fuzzy          best candidate from an in-memory character-trigram index,
+                 scored on trigram similarity and word overlap (an initial
+                 matches the words it starts)
+
+A fuzzy match scoring AUTO_MATCH_SCORE or more, clearly ahead of the
+runner-up, is accepted. Weaker ones come back as suggestions, as does a name
+with words the other lacks ("mary" / "mary achieng", "kamau" / "john kamau"):
+it may be the worker or another one with a longer name. Confirming
+one (confirm_alias) stores the spelling as an alias so later sheets resolve it
+exactly. The index is built once per batch, from one query per table.
+"""
+from __future__ import annotations
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlmodel import Session, select
+from app.models import Staff, StaffAlias
+
+AUTO_MATCH_SCORE = 0.9
+SUGGEST_SCORE = 0.6
+AMBIGUITY_MARGIN = 0.05  # a fuzzy winner must lead the runner-up by this much
+SUBSET_SCORE = 0.85  # at most, for a name whose words are a subset of the other's
+MAX_CANDIDATES = 3
+
+MATCHED, SUGGESTED, NEW = "matched", "suggested", "new"
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Lower-case ASCII words separated by single spaces"""
+    folded = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", folded.lower()).split())
+
+
+@event.listens_for(Staff, "before_insert")
+@event.listens_for(Staff, "before_update")
+def _sync_normalized_name(mapper, connection, staff):
+    staff.normalized_name = normalize_name(staff.name)
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _words_match(a: str, b: str) -> bool:
+    return a == b or (len(a) == 1 and b.startswith(a)) or (len(b) == 1 and a.startswith(b))
+
+
+def _covered(words: List[str], others: List[str]) -> bool:
+    return all(any(_words_match(word, other) for other in others) for word in words)
+
+
+def similarity(a: str, b: str) -> float:
+    """Score two normalized names between 0 and 1"""
+    grams_a, grams_b = _trigrams(a), _trigrams(b)
+    dice = 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+    shorter, longer = sorted((a.split(), b.split()), key=len)
+    overlap = sum(any(_words_match(word, other) for other in longer) for word in shorter) / len(shorter)
+    if overlap == 1:
+        if len(shorter) == len(longer) and _covered(longer, shorter):
+            # The same words, some of them initials: "dorcas n" / "dorcas nekesa"
+            return round(max(dice, AUTO_MATCH_SCORE), 3)
+        # The other name has words of its own ("mary w" / "mary"), never enough to accept
+        return round(min(max(dice, (dice + 1) / 2), SUBSET_SCORE), 3)
+    return round(max(dice, (dice + overlap) / 2), 3)
+
+
+class NameMatch(NamedTuple):
+    name: str
+    normalized: str
+    status: str  # matched, suggested, new
+    method: Optional[str] = None  # exact, alias, fuzzy
+    staff_id: Optional[int] = None
+    staff_name: Optional[str] = None
+    score: float = 0.0
+    candidates: List[dict] = []  # best few {staff_id, staff_name, score}
+
+
+class NameIndex:
+    """Normalized worker names and aliases with a trigram index over them"""
+
+    def __init__(self):
+        self._ids: Dict[str, Set[int]] = defaultdict(set)  # key -> staff ids
+        self._aliases: Set[str] = set()
+        self._grams: Dict[str, Set[str]] = defaultdict(set)  # trigram -> keys
+        self._names: Dict[int, str] = {}
+
+    def add(self, staff_id: int, name: str, key: Optional[str] = None, alias: bool = False) -> None:
+        key = key or normalize_name(name)
+        if not alias:
+            self._names[staff_id] = name
+        if not key:
+            return
+        self._ids[key].add(staff_id)
+        if alias:
+            self._aliases.add(key)
+        for gram in _trigrams(key):
+            self._grams[gram].add(key)
+
+    def _candidates(self, key: str) -> List[dict]:
+        shared = Counter(other for gram in _trigrams(key) for other in self._grams.get(gram, ()))
+        best: Dict[int, float] = {}
+        for other, _ in shared.most_common(MAX_CANDIDATES * 10):
+            score = similarity(key, other)
+            for staff_id in self._ids[other]:
+                best[staff_id] = max(score, best.get(staff_id, 0.0))
+        ranked = sorted(best.items(), key=lambda item: (-item[1], item[0]))[:MAX_CANDIDATES]
+        return [
+            {"staff_id": staff_id, "staff_name": self._names.get(staff_id, ""), "score": score}
+            for staff_id, score in ranked
+        ]
+
+    def resolve(self, name: str) -> NameMatch:
+        key = normalize_name(name)
+        if not key:
+            return NameMatch(name, key, NEW)
+
+        ids = self._ids.get(key)
+        if ids:
+            # Duplicate workers with the same name resolve to the oldest
+            staff_id = min(ids)
+            method = "alias" if key in self._aliases else "exact"
+            return NameMatch(name, key, MATCHED, method, staff_id, self._names.get(staff_id), 1.0)
+
+        candidates = self._candidates(key)
+        if not candidates or candidates[0]["score"] < SUGGEST_SCORE:
+            return NameMatch(name, key, NEW, candidates=candidates)
+        best = candidates[0]
+        staff_id, staff_name, score = best["staff_id"], best["staff_name"], best["score"]
+        runner_up = candidates[1]["score"] if len(candidates) > 1 else 0.0
+        status = MATCHED if score >= AUTO_MATCH_SCORE and score - runner_up >= AMBIGUITY_MARGIN else SUGGESTED
+        return NameMatch(name, key, status, "fuzzy", staff_id, staff_name, score, candidates)
+
+
+def build_index(session: Session) -> NameIndex:
+    index = NameIndex()
+    for staff_id, name, key in session.exec(select(Staff.id, Staff.name, Staff.normalized_name)).all():
+        index.add(staff_id, name, key)
+    for staff_id, alias in session.exec(select(StaffAlias.staff_id, StaffAlias.alias)).all():
+        index.add(staff_id, alias, alias, alias=True)
+    return index
+
+
+def resolve_names(session: Session, names: Iterable[str]) -> List[NameMatch]:
+    """Resolve a batch of names (duplicates collapsed) against one index"""
+    index = build_index(session)
+    return [index.resolve(name) for name in dict.fromkeys(names)]
+
+
+def confirm_alias(session: Session, name: str, staff_id: int) -> Optional[StaffAlias]:
+    """
+    Record that ``name`` means worker ``staff_id``. Returns the alias, or
+    None when the name already normalizes to the worker's own name.
+    """
+    staff = session.get(Staff, staff_id)
+    if not staff:
+        raise HTTPException(404, "Staff member not found")
+    key = normalize_name(name)
+    if not key:
+        raise HTTPException(400, "Name is empty")
+    if key == normalize_name(staff.name):
+        return None
+
+    alias = session.exec(select(StaffAlias).where(StaffAlias.alias == key)).first()
+    if alias is None:
+        alias = StaffAlias(staff_id=staff_id, alias=key)
+    else:
+        alias.staff_id = staff_id  # a later confirmation overrides an earlier one
+    session.add(alias)
+    session.commit()
+    session.refresh(alias)
+    return alias
@@ -0,0 +1,176 @@
+"""
+Payroll runs.
+
+Calculating a month's payroll used to be "find workers without a payroll,
+insert one each". Two requests doing that at once could both see the same
+workers missing, insert duplicate MonthlyPayroll rows and deduct the same
+advances twice. A run now:
+
+1. takes the period's advisory lock (app/core/locks.py), so only one
+   calculation of a month runs at a time while other months go ahead;
+2. records itself in the PayrollRun registry as running (committed, so it
+   can be watched from GET /payroll/runs);
+3. calculates and inserts the payrolls, tagged with the run, and marks the
+   run completed in the same transaction.
+
+A request that finds the period locked does not calculate again: it waits
+for the run in flight and returns that run. The unique (worker_id, month,
+year) constraint on MonthlyPayroll backs all of this up when the lock is
+only per process (SQLite).
+"""
+from __future__ import annotations
+from datetime import datetime
+from typing import List, Tuple
+from fastapi import HTTPException
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from app.core.locks import advisory_lock
+from app.models import MonthlyPayroll, PayrollRun, Staff, TeaPlucking
+from app.services import archive, ledger, worker_balance
+
+RUNNING, COMPLETED, FAILED = "running", "completed", "failed"
+
+LOCK_NAMESPACE = 0x70617972  # "payr"
+
+
+def calculate(session: Session, run: PayrollRun) -> List[MonthlyPayroll]:
+    """Insert payrolls for every per-kilo worker who has none for the run's month"""
+    month, year = run.month, run.year
+    month_start = datetime(year, month, 1)
+    month_end = datetime(year + month // 12, month % 12 + 1, 1)
+
+    # Tea plucking workers without a payroll for the month yet
+    worker_ids = session.exec(
+        select(Staff.id).where(
+            Staff.pay_type == "per_kilo",
+            Staff.id.not_in(
+                select(MonthlyPayroll.worker_id).where(
+                    MonthlyPayroll.month == month,
+                    MonthlyPayroll.year == year
+                )
+            )
+        )
+    ).all()
+    if not worker_ids:
+        return []
+
+    # Kilos and earnings per worker in one grouped query
+    # (a plain date range, so Postgres only scans that year's partition)
+    earnings = {
+        worker_id: (total_kg or 0.0, gross or 0.0)
+        for worker_id, total_kg, gross in session.exec(
+            select(
+                TeaPlucking.worker_id,
+                func.sum(TeaPlucking.quantity),
+                func.sum(func.coalesce(TeaPlucking.worker_payment, 0.0))
+            )
+            .where(
+                TeaPlucking.worker_id.in_(worker_ids),
+                TeaPlucking.date >= month_start,
+                TeaPlucking.date < month_end
+            )
+            .group_by(TeaPlucking.worker_id)
+        ).all()
+    }
+
+    # Advances owed, carried forward from earlier months included
+    dues = worker_balance.dues(session, worker_ids, month, year)
+
+    created_at = datetime.now()
+    payrolls = []
+    for worker_id in worker_ids:
+        total_kg, gross_earnings = earnings.get(worker_id, (0.0, 0.0))
+        month_advances, due = dues[worker_id]
+
+        # Recover what this month's pay covers; the rest carries forward
+        recovered = min(due, gross_earnings)
+        payrolls.append(MonthlyPayroll(
+            worker_id=worker_id,
+            run_id=run.id,
+            month=month,
+            year=year,
+            total_kg=total_kg,
+            gross_earnings=gross_earnings,
+            total_advances=recovered,
+            brought_forward=due - month_advances,
+            carried_forward=due - recovered,
+            net_pay=gross_earnings - recovered,
+            paid=False,
+            created_at=created_at
+        ))
+
+    session.add_all(payrolls)
+    session.flush()
+    worker_balance.close_advances(session, worker_ids, month, year)
+    worker_balance.book_payrolls(session, payrolls)
+    ledger.book_many(session, MonthlyPayroll, payrolls, new=True)
+    return payrolls
+
+
+def _finished_run(session: Session, month: int, year: int, since: datetime):
+    """The period's latest run to finish at or after ``since``"""
+    return session.exec(
+        select(PayrollRun)
+        .where(PayrollRun.month == month, PayrollRun.year == year, PayrollRun.finished_at >= since)
+        .order_by(PayrollRun.id.desc())
+    ).first()
+
+
+def run_payroll(session: Session, month: int, year: int) -> Tuple[PayrollRun, bool]:
+    """
+    Calculate the month's payroll, or join a calculation already in flight.
+    Returns the run and whether it was another request's (coalesced).
+    """
+    if month < 1 or month > 12:
+        raise HTTPException(400, "Invalid month. Must be between 1 and 12")
+    archive.ensure_writable(session, "monthlypayroll", year)
+    requested_at = datetime.now()
+    engine = session.get_bind()
+
+    with advisory_lock(engine, LOCK_NAMESPACE, year * 12 + month) as acquired:
+        if not acquired:
+            # Another request held the period: report the run it just finished
+            session.expire_all()
+            run = _finished_run(session, month, year, requested_at)
+            if run is not None and run.status == COMPLETED:
+                return run, True
+
+        if engine.dialect.name == "postgresql":
+            # The lock is shared by every process, so a run still marked
+            # running died with its process
+            session.exec(
+                update(PayrollRun)
+                .where(PayrollRun.month == month, PayrollRun.year == year, PayrollRun.status == RUNNING)
+                .values(status=FAILED, error="Abandoned", finished_at=requested_at)
+            )
+        run = PayrollRun(month=month, year=year, status=RUNNING, started_at=requested_at)
+        session.add(run)
+        session.commit()
+
+        try:
+            payrolls = calculate(session, run)
+            run.status = COMPLETED
+            run.workers_processed = len(payrolls)
+            run.finished_at = datetime.now()
+            session.add(run)
+            session.commit()
+        except Exception as error:
+            session.rollback()
+            run.status = FAILED
+            run.error = str(error)[:500]
+            run.finished_at = datetime.now()
+            session.add(run)
+            session.commit()
+            if isinstance(error, IntegrityError):
+                raise HTTPException(409, f"Payroll for {month}/{year} was written by a concurrent run; try again")
+            raise
+    session.refresh(run)
+    return run, False
+
+
+def run_payrolls(session: Session, run: PayrollRun) -> List[MonthlyPayroll]:
+    """The payrolls a run inserted"""
+    return session.exec(
+        select(MonthlyPayroll).where(MonthlyPayroll.run_id == run.id).order_by(MonthlyPayroll.worker_id)
+    ).all()
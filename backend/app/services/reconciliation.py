@@ -0,0 +1,209 @@
+"""
+Factory statement reconciliation.
+
+A factory's monthly statement (CSV or XLSX, one row per delivery) is checked
+against our own TeaPlucking records for that factory and month:
+
+1. the statement is read with pandas and summed per day;
+2. our records are summed per day in SQL (or from Parquet for archived
+   years);
+3. the two are hash-joined on the day (an outer DataFrame.merge) and every
+   day is flagged vectorized: ok, kg_mismatch, amount_mismatch,
+   missing_in_records or missing_in_statement.
+
+The result replaces any earlier reconciliation of the same factory and month
+in one transaction, with the per-day lines written as a bulk INSERT.
+"""
+from __future__ import annotations
+from datetime import datetime
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import delete, func, insert
+from sqlmodel import Session, select
+from app.core.lazy import lazy_import
+from app.models import Factory, FactoryReconciliation, ReconciliationLine, TeaPlucking
+from app.services import archive
+
+np = lazy_import("numpy")
+openpyxl = lazy_import("openpyxl")
+pd = lazy_import("pandas")
+
+KG_TOLERANCE = 0.5      # kg either way before a day is flagged
+AMOUNT_TOLERANCE = 1.0  # KES either way
+
+AMOUNT_BASES = {"net": "factory_net_to_farm", "gross": "factory_gross"}
+
+# Accepted statement headers (lower-cased) for each column we need
+DATE_COLUMNS = ("date", "delivery date", "day")
+KG_COLUMNS = ("kg", "kgs", "net kg", "quantity", "weight")
+AMOUNT_COLUMNS = ("amount", "amount paid", "paid", "value", "net amount")
+
+
+def _pick(frame, names):
+    return next((name for name in names if name in frame.columns), None)
+
+
+def read_statement(upload: UploadFile, month: int, year: int):
+    """Statement kilos (and amounts, when present) per day of the month"""
+    upload.file.seek(0)
+    if upload.filename.lower().endswith(".csv"):
+        frame = pd.read_csv(upload.file)
+    elif upload.filename.lower().endswith(".xlsx"):
+        workbook = openpyxl.load_workbook(upload.file, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, ())
+            frame = pd.DataFrame(list(rows), columns=header)
+        finally:
+            workbook.close()
+    elif upload.filename.lower().endswith(".xls"):
+        frame = pd.read_excel(upload.file)
+    else:
+        raise HTTPException(400, "Statement must be a CSV or Excel file")
+    frame.columns = [str(column).strip().lower() for column in frame.columns]
+
+    date_column, kg_column = _pick(frame, DATE_COLUMNS), _pick(frame, KG_COLUMNS)
+    if not date_column or not kg_column:
+        raise HTTPException(400, "Statement needs a date (or day) column and a kg column")
+    amount_column = _pick(frame, AMOUNT_COLUMNS)
+
+    dates = frame[date_column]
+    if pd.api.types.is_numeric_dtype(dates):
+        # Day-of-month numbers
+        days = pd.to_datetime(
+            pd.DataFrame({"year": year, "month": month, "day": dates}), errors="coerce"
+        )
+    else:
+        # ISO dates first, so 2024-03-05 is never read as 3 May; day-first
+        # (05/03/2024) only for what is not ISO
+        days = pd.to_datetime(dates, errors="coerce", format="ISO8601")
+        rest = days.isna() & dates.notna()
+        if rest.any():
+            days.loc[rest] = pd.to_datetime(dates[rest], errors="coerce", format="mixed", dayfirst=True)
+    dated = dates.notna() & dates.astype(str).str.strip().ne("")
+    unreadable = np.flatnonzero(dated & days.isna())
+    if len(unreadable):
+        # Sheet rows, counting the header as row 1
+        rows = ", ".join(str(position + 2) for position in unreadable[:10])
+        raise HTTPException(400, f"Statement has dates that cannot be read on rows {rows}")
+
+    statement = pd.DataFrame({
+        "day": days.astype("datetime64[ns]").dt.normalize(),
+        "statement_kg": pd.to_numeric(frame[kg_column], errors="coerce"),
+        "statement_amount": pd.to_numeric(frame[amount_column], errors="coerce") if amount_column else np.nan,
+    }).dropna(subset=["day", "statement_kg"])
+    in_month = (statement["day"].dt.month == month) & (statement["day"].dt.year == year)
+    if not in_month.any():
+        raise HTTPException(400, f"Statement has no deliveries in {month}/{year}")
+
+    grouped = statement[in_month].groupby("day", as_index=False).agg(
+        statement_kg=("statement_kg", "sum"),
+        statement_amount=("statement_amount", lambda values: values.sum(min_count=1)),
+    )
+    return grouped, amount_column is not None
+
+
+def recorded_deliveries(session: Session, factory_id: int, month: int, year: int, amount_basis: str):
+    """Our kilos and factory amounts per day for the factory and month"""
+    amount_column = AMOUNT_BASES[amount_basis]
+    month_start = datetime(year, month, 1)
+    month_end = datetime(year + month // 12, month % 12 + 1, 1)
+
+    if archive.is_archived(session, "teaplucking", year):
+        records = archive.read_archived(session, TeaPlucking, year, month, factory_id=factory_id)
+        rows = [(record.date, record.quantity, getattr(record, amount_column)) for record in records]
+    else:
+        day = func.date(TeaPlucking.date)
+        rows = session.exec(
+            select(day, func.sum(TeaPlucking.quantity), func.sum(getattr(TeaPlucking, amount_column)))
+            .where(
+                TeaPlucking.factory_id == factory_id,
+                TeaPlucking.date >= month_start,
+                TeaPlucking.date < month_end,
+            )
+            .group_by(day)
+        ).all()
+
+    frame = pd.DataFrame(rows, columns=["day", "recorded_kg", "recorded_amount"]).astype(
+        {"recorded_kg": "float64", "recorded_amount": "float64"}
+    )
+    frame["day"] = pd.to_datetime(frame["day"]).astype("datetime64[ns]").dt.normalize()
+    return frame.groupby("day", as_index=False).agg(
+        recorded_kg=("recorded_kg", "sum"),
+        recorded_amount=("recorded_amount", "sum"),
+    )
+
+
+def compare(statement, recorded, has_amounts: bool):
+    """Outer hash-join on the day and flag every day that disagrees"""
+    lines = statement.merge(recorded, on="day", how="outer", indicator=True).sort_values("day")
+    lines["kg_difference"] = lines["statement_kg"].fillna(0) - lines["recorded_kg"].fillna(0)
+    lines["amount_difference"] = (
+        lines["statement_amount"] - lines["recorded_amount"].fillna(0) if has_amounts else np.nan
+    )
+    lines["status"] = np.select(
+        [
+            lines["_merge"] == "left_only",
+            lines["_merge"] == "right_only",
+            lines["kg_difference"].abs() > KG_TOLERANCE,
+            lines["amount_difference"].abs() > AMOUNT_TOLERANCE,
+        ],
+        ["missing_in_records", "missing_in_statement", "kg_mismatch", "amount_mismatch"],
+        default="ok",
+    )
+    return lines.drop(columns="_merge")
+
+
+def reconcile(
+    session: Session,
+    factory_id: int,
+    month: int,
+    year: int,
+    upload: UploadFile,
+    amount_basis: str = "net",
+) -> FactoryReconciliation:
+    """Check a statement against our records and store the outcome"""
+    if not session.get(Factory, factory_id):
+        raise HTTPException(404, "Factory not found")
+    if month < 1 or month > 12:
+        raise HTTPException(400, "Invalid month. Must be between 1 and 12")
+    if amount_basis not in AMOUNT_BASES:
+        raise HTTPException(400, f"amount_basis must be one of {', '.join(AMOUNT_BASES)}")
+
+    statement, has_amounts = read_statement(upload, month, year)
+    lines = compare(statement, recorded_deliveries(session, factory_id, month, year, amount_basis), has_amounts)
+    flagged = int((lines["status"] != "ok").sum())
+
+    previous = session.exec(
+        select(FactoryReconciliation.id).where(
+            FactoryReconciliation.factory_id == factory_id,
+            FactoryReconciliation.month == month,
+            FactoryReconciliation.year == year,
+        )
+    ).first()
+    if previous is not None:
+        session.exec(delete(ReconciliationLine).where(ReconciliationLine.reconciliation_id == previous))
+        session.exec(delete(FactoryReconciliation).where(FactoryReconciliation.id == previous))
+
+    result = FactoryReconciliation(
+        factory_id=factory_id,
+        month=month,
+        year=year,
+        statement_file=upload.filename,
+        amount_basis=amount_basis,
+        statement_kg=float(lines["statement_kg"].sum()),
+        recorded_kg=float(lines["recorded_kg"].sum()),
+        statement_amount=float(lines["statement_amount"].sum()) if has_amounts else None,
+        recorded_amount=float(lines["recorded_amount"].sum()),
+        days_matched=len(lines) - flagged,
+        days_with_discrepancies=flagged,
+        status="discrepancies" if flagged else "matched",
+    )
+    session.add(result)
+    session.flush()
+
+    records = lines.assign(reconciliation_id=result.id, day=lines["day"].dt.to_pydatetime())
+    records = records.astype(object).where(records.notna(), None).to_dict("records")
+    session.execute(insert(ReconciliationLine), records)
+    session.commit()
+    session.refresh(result)
+    return result
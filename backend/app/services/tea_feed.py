@@ -0,0 +1,106 @@
+"""
+Live weigh-in feed behind GET /teaplucking/stream.
+
+Once a write to tea records commits, it publishes one compact delta that
+dashboards apply instead of re-fetching the whole listing:
+
+    event: weighin
+    data: {"op": "added",
+           "records": [{"id": 7, "worker_id": 3, "factory_id": 1, "kg": 12.5, "date": "..."}],
+           "totals": [{"date": "2024-03-01", "factories": [{"factory_id": 1, "kg": 412.5}]}]}
+
+``totals`` hold the running total per factory of every day the write
+touched, read back from the database rather than added up in memory, so a
+client replaces its copy of those days with them. A new subscriber first gets
+today's totals (event ``totals``). Imports send a record count in place of
+the records. Edits send ``resync``, since the day a record moved from is not
+read any more (see the PUT handler).
+
+Nothing is queried unless someone is listening.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List
+from sqlalchemy import func
+from sqlmodel import Session, select
+from app.core.pubsub import RESYNC, Hub, event_frame
+from app.database import engine
+from app.models import TeaPlucking
+
+ADDED, DELETED, IMPORTED = "added", "deleted", "imported"
+
+feed = Hub()
+
+
+def _day(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def daily_totals(session: Session, days: Iterable[date]) -> List[dict]:
+    """Kilos per factory on each of ``days``, in one grouped query over their date range"""
+    days = sorted(set(days))
+    if not days:
+        return []
+    day = func.date(TeaPlucking.date)
+    rows = session.exec(
+        select(day, TeaPlucking.factory_id, func.sum(TeaPlucking.quantity))
+        .where(
+            TeaPlucking.date >= datetime.combine(days[0], time.min),
+            TeaPlucking.date < datetime.combine(days[-1] + timedelta(days=1), time.min)
+        )
+        .group_by(day, TeaPlucking.factory_id)
+        .order_by(day, TeaPlucking.factory_id)
+    ).all()
+    factories = {}
+    for row_day, factory_id, kg in rows:
+        # SQLite returns the day as text, Postgres as a date
+        factories.setdefault(str(row_day), []).append({"factory_id": factory_id, "kg": kg or 0.0})
+    return [{"date": d.isoformat(), "factories": factories.get(d.isoformat(), [])} for d in days]
+
+
+def publish(session: Session, op: str, records: list) -> None:
+    """Publish committed added or deleted records with their days' new totals"""
+    if not feed.has_subscribers or not records:
+        return
+    feed.publish(event_frame("weighin", {
+        "op": op,
+        "records": [
+            {
+                "id": record.id,
+                "worker_id": record.worker_id,
+                "factory_id": record.factory_id,
+                "kg": record.quantity,
+                "date": record.date.isoformat(),
+            }
+            for record in records
+        ],
+        "totals": daily_totals(session, (_day(record.date) for record in records)),
+    }))
+
+
+def publish_import(session: Session, year: int, month: int, count: int) -> None:
+    """Publish a committed import of ``count`` records into a month"""
+    if not feed.has_subscribers or not count:
+        return
+    start = date(year, month, 1)
+    end = date(year + month // 12, month % 12 + 1, 1)
+    feed.publish(event_frame("weighin", {
+        "op": IMPORTED,
+        "count": count,
+        "totals": daily_totals(session, (start + timedelta(days=n) for n in range((end - start).days))),
+    }))
+
+
+def publish_resync() -> None:
+    """Ask every client to reload (a change whose earlier state is unknown)"""
+    feed.publish(RESYNC)
+
+
+def _opening() -> List[bytes]:
+    # Its own short session: the stream outlives the request's
+    with Session(engine) as session:
+        return [event_frame("totals", {"totals": daily_totals(session, [date.today()])})]
+
+
+def stream():
+    """Today's totals, then every delta published from now on"""
+    return feed.stream(_opening)
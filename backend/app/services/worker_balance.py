@@ -0,0 +1,196 @@
+"""
+Per-worker outstanding advance balances.
+
+A worker's balance is what they owe in advances that payroll has not yet
+recovered. It is kept as one WorkerBalance row per worker (keyed by the
+worker, so a lookup is a primary-key read) and moved by every write that
+changes it with an atomic UPDATE ... RETURNING. Each move is journaled in
+WorkerBalanceEntry with the balance after it:
+
+    advance given, edited or deleted     + what it owes now - what it owed
+    advance marked deducted by hand      - its amount
+    payroll run                          - advances recovered from the pay
+
+An advance owes its amount until it is deducted (owed()). A payroll run
+recovers the balance due for its month (the earlier balance plus the month's
+advances, but not advances already given for later months) up to the month's
+gross pay. Whatever the pay cannot cover stays on the balance and is carried
+forward to the next run, so net pay no longer goes negative.
+
+rebuild() recomputes every balance from the tables: undeducted advances plus
+what each worker's latest payroll carried forward. It reads hot rows only,
+which is enough because a year whose last payroll still carries a worker's
+debt forward cannot be archived (archive.closed_year_problems).
+"""
+from __future__ import annotations
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, case, func, insert, or_, update
+from sqlmodel import Session, select
+from app.database import dialect_insert
+from app.models import MonthlyPayroll, WorkerAdvance, WorkerBalance, WorkerBalanceEntry
+
+TOLERANCE = 1e-6
+
+ADVANCE, PAYROLL, BACKFILL = "workeradvance", "monthlypayroll", "backfill"
+
+Owed = Tuple[int, float]  # (worker, amount)
+Change = Tuple[int, str, Optional[int], float]  # (worker, source, source id, change)
+
+
+def owed(advance) -> Owed:
+    """What an advance adds to its worker's balance: its amount until deducted"""
+    return advance.worker_id, 0.0 if advance.deducted else advance.amount
+
+
+def post(session: Session, changes: Iterable[Change]) -> Dict[int, float]:
+    """Apply and journal balance changes; returns the new balance of every worker moved"""
+    changes = [change for change in changes if abs(change[3]) >= TOLERANCE]
+    totals: Dict[int, float] = defaultdict(float)
+    for worker_id, _, _, change in changes:
+        totals[worker_id] += change
+
+    now = datetime.now()
+    balances: Dict[int, float] = {}
+    # An upsert, so two first moves for a worker cannot both insert its row;
+    # workers in order against deadlocks
+    upsert = dialect_insert(session.get_bind())(WorkerBalance.__table__)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=["worker_id"],
+        set_={"outstanding": WorkerBalance.outstanding + upsert.excluded.outstanding, "updated_at": upsert.excluded.updated_at},
+    ).returning(WorkerBalance.outstanding)
+    for worker_id, total in sorted(totals.items()):
+        balances[worker_id] = session.execute(
+            upsert.values(worker_id=worker_id, outstanding=total, updated_at=now)
+        ).scalar_one()
+
+    running = {worker_id: balances[worker_id] - total for worker_id, total in totals.items()}
+    entries = []
+    for worker_id, source, source_id, change in changes:
+        running[worker_id] += change
+        entries.append({
+            "worker_id": worker_id,
+            "source": source,
+            "source_id": source_id,
+            "change": change,
+            "balance_after": running[worker_id],
+            "created_at": now,
+        })
+    if entries:
+        session.execute(insert(WorkerBalanceEntry), entries)
+    return balances
+
+
+def move_advance(session: Session, advance_id: int, before: Optional[Owed], after: Optional[Owed]) -> None:
+    """
+    Move balances from what an advance owed (``before``, None when new) to
+    what it owes now (``after``, None when deleted).
+    """
+    move_advances(session, [(advance_id, before, after)])
+
+
+def move_advances(session: Session, moves: Iterable[Tuple[int, Optional[Owed], Optional[Owed]]]) -> None:
+    """move_advance() for many (advance id, before, after) at once, in one posting"""
+    changes: Dict[Tuple[int, int], float] = defaultdict(float)
+    for advance_id, before, after in moves:
+        if before:
+            changes[before[0], advance_id] -= before[1]
+        if after:
+            changes[after[0], advance_id] += after[1]
+    post(session, [(worker_id, ADVANCE, advance_id, change) for (worker_id, advance_id), change in changes.items()])
+
+
+def book_advances(session: Session, advances: Iterable) -> None:
+    """Add newly inserted advances (records or rows) to their workers' balances"""
+    post(session, [(advance.worker_id, ADVANCE, advance.id, owed(advance)[1]) for advance in advances])
+
+
+def dues(session: Session, worker_ids: List[int], month: int, year: int) -> Dict[int, Tuple[float, float]]:
+    """(advances for the month, balance due for the month) per worker, for a payroll run"""
+    if not worker_ids:
+        return {}
+    outstanding = dict(session.exec(
+        select(WorkerBalance.worker_id, WorkerBalance.outstanding)
+        .where(WorkerBalance.worker_id.in_(worker_ids))
+    ).all())
+
+    this_month = and_(WorkerAdvance.year == year, WorkerAdvance.month == month)
+    later = or_(WorkerAdvance.year > year, and_(WorkerAdvance.year == year, WorkerAdvance.month > month))
+    pending = {
+        worker_id: (month_amount, later_amount)
+        for worker_id, month_amount, later_amount in session.exec(
+            select(
+                WorkerAdvance.worker_id,
+                func.sum(case((this_month, WorkerAdvance.amount), else_=0.0)),
+                func.sum(case((later, WorkerAdvance.amount), else_=0.0)),
+            )
+            .where(WorkerAdvance.worker_id.in_(worker_ids), WorkerAdvance.deducted == False)  # noqa: E712
+            .group_by(WorkerAdvance.worker_id)
+        ).all()
+    }
+
+    result = {}
+    for worker_id in worker_ids:
+        month_amount, later_amount = pending.get(worker_id, (0.0, 0.0))
+        result[worker_id] = (month_amount or 0.0, outstanding.get(worker_id, 0.0) - (later_amount or 0.0))
+    return result
+
+
+def close_advances(session: Session, worker_ids: List[int], month: int, year: int) -> None:
+    """Mark advances up to the month deducted: a payroll run has taken them into its reckoning"""
+    if not worker_ids:
+        return
+    session.exec(
+        update(WorkerAdvance)
+        .where(
+            WorkerAdvance.worker_id.in_(worker_ids),
+            WorkerAdvance.deducted == False,  # noqa: E712
+            or_(WorkerAdvance.year < year, and_(WorkerAdvance.year == year, WorkerAdvance.month <= month)),
+        )
+        .values(deducted=True, version=WorkerAdvance.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def book_payrolls(session: Session, payrolls: Iterable[MonthlyPayroll]) -> None:
+    """Take the advances each payroll recovered off its worker's balance"""
+    post(session, [(payroll.worker_id, PAYROLL, payroll.id, -payroll.total_advances) for payroll in payrolls])
+
+
+def rebuild(session: Session) -> int:
+    """
+    Recompute every balance from the tables and journal any correction.
+    Returns the number of workers corrected.
+    """
+    expected: Dict[int, float] = defaultdict(float)
+    for worker_id, amount in session.exec(
+        select(WorkerAdvance.worker_id, func.sum(WorkerAdvance.amount))
+        .where(WorkerAdvance.deducted == False)  # noqa: E712
+        .group_by(WorkerAdvance.worker_id)
+    ).all():
+        expected[worker_id] += amount
+
+    latest = (
+        select(
+            MonthlyPayroll.worker_id,
+            MonthlyPayroll.carried_forward,
+            func.row_number().over(
+                partition_by=MonthlyPayroll.worker_id,
+                order_by=(MonthlyPayroll.year.desc(), MonthlyPayroll.month.desc()),
+            ).label("position"),
+        )
+        .subquery()
+    )
+    for worker_id, carried in session.exec(
+        select(latest.c.worker_id, latest.c.carried_forward).where(latest.c.position == 1)
+    ).all():
+        expected[worker_id] += carried
+
+    current = dict(session.exec(select(WorkerBalance.worker_id, WorkerBalance.outstanding)).all())
+    changes = [
+        (worker_id, BACKFILL, None, expected.get(worker_id, 0.0) - current.get(worker_id, 0.0))
+        for worker_id in set(expected) | set(current)
+    ]
+    post(session, changes)
+    return sum(1 for change in changes if abs(change[3]) >= TOLERANCE)
@@ -0,0 +1,83 @@
+"""
+Peak-memory check for the streaming Excel import.
+
+Generates tea sheets of increasing size (one worker row and one ADV row per
+worker), imports each into a scratch SQLite database through
+app.services.excel_import and records the tracemalloc peak. The import holds
+one chunk of rows at a time, so the peak for the largest sheet must stay
+within --ratio of the smallest. Run from backend/:
+
+    python scripts/bench_import_memory.py [--workers 500 2000 8000] [--ratio 1.5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import UploadFile  # noqa: E402
+from openpyxl import Workbook  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlmodel import Session, SQLModel  # noqa: E402
+from app.models import Factory  # noqa: E402
+from app.services import excel_import  # noqa: E402
+
+
+def write_sheet(path: Path, workers: int) -> None:
+    """A month sheet in the daily-grid layout, written without holding it in memory"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("NOV 2024")
+    sheet.append(["DATE", *range(1, 31)])
+    for i in range(workers):
+        sheet.append([f"Worker {i:05d}", *(10 + (i + day) % 25 for day in range(30))])
+        sheet.append(["ADV", *(500 if day == 14 else None for day in range(30))])
+    sheet.append(["TOTALS"])
+    workbook.save(path)
+
+
+def peak_import_memory(path: Path, database: Path) -> tuple:
+    engine = create_engine(f"sqlite:///{database}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        factory = Factory(name="KTDA", rate_per_kg=22.0)
+        session.add(factory)
+        session.commit()
+        session.refresh(factory)
+
+        with open(path, "rb") as handle:
+            upload = UploadFile(handle, filename=path.name)
+            tracemalloc.start()
+            sheet_name, rows = excel_import.open_sheet(upload)
+            summary = excel_import.import_tea_sheet(session, rows, 11, 2024, sheet_name, factory)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    engine.dispose()
+    return peak, summary["tea_records_imported"]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[500, 2000, 8000])
+    parser.add_argument("--ratio", type=float, default=1.5, help="allowed peak growth from smallest to largest sheet")
+    args = parser.parse_args()
+
+    peaks = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for workers in sorted(args.workers):
+            workbook = Path(scratch, f"tea_{workers}.xlsx")
+            write_sheet(workbook, workers)
+            peak, records = peak_import_memory(workbook, Path(scratch, f"tea_{workers}.db"))
+            peaks.append(peak)
+            size = os.path.getsize(workbook) / 2**20
+            print(f"{workers:>6} workers  {records:>8} records  {size:6.1f} MB file  peak {peak / 2**20:6.1f} MB")
+
+    growth = peaks[-1] / peaks[0]
+    print(f"peak growth {growth:.2f}x (allowed {args.ratio:.2f}x)")
+    return 0 if growth <= args.ratio else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
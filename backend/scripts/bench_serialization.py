@@ -0,0 +1,123 @@
+"""
+Serialization benchmark for the tea plucking listing.
+
+Renders the same in-memory TeaPlucking listing two ways and reports the time
+per request:
+
+  legacy  {**record.dict(), "worker_name": ...} per row, stdlib JSONResponse
+  typed   joined rows validated into TeaRecordRead, ORJSONResponse
+
+No database is involved, so only the response pipeline is measured. Run from
+backend/:
+
+    python scripts/bench_serialization.py [--rows 50000] [--runs 5]
+"""
+import argparse
+import statistics
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from app.models import TeaPlucking  # noqa: E402
+from app.schemas import TeaRecordRead  # noqa: E402
+
+COLUMNS = [column.name for column in TeaPlucking.__table__.columns]
+Row = namedtuple("Row", COLUMNS + ["worker_name", "factory_name"])
+
+
+def build_rows(count: int):
+    """Model instances (legacy path) and joined result rows (typed path)"""
+    start = datetime(2024, 1, 1, 7, 30)
+    records, rows = [], []
+    for i in range(count):
+        record = TeaPlucking(
+            id=i + 1,
+            worker_id=i % 40 + 1,
+            factory_id=i % 6 + 1,
+            quantity=12.5 + i % 30,
+            date=start + timedelta(hours=i),
+            comment=None,
+            worker_rate=8.0,
+            factory_rate=22.0,
+            transport_deduction=3.0,
+            worker_payment=100.0,
+            factory_gross=275.0,
+            factory_net_to_farm=237.5,
+            farm_profit=137.5,
+        )
+        records.append(record)
+        rows.append(Row(
+            *(getattr(record, name) for name in COLUMNS),
+            worker_name=f"Worker {record.worker_id}",
+            factory_name=f"Factory {record.factory_id}",
+        ))
+    return records, rows
+
+
+def build_app(records, rows) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/legacy", response_class=JSONResponse)
+    def legacy():
+        return [
+            {
+                **record.dict(),
+                "worker_name": f"Worker {record.worker_id}",
+                "factory_name": f"Factory {record.factory_id}",
+            }
+            for record in records
+        ]
+
+    @app.get("/typed", response_model=List[TeaRecordRead], response_class=ORJSONResponse)
+    def typed():
+        return rows
+
+    return app
+
+
+def measure(client: TestClient, path: str, runs: int) -> tuple:
+    timings, size = [], 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append(time.perf_counter() - start)
+        response.raise_for_status()
+        size = len(response.content)
+    return statistics.median(timings), size
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    records, rows = build_rows(args.rows)
+    client = TestClient(build_app(records, rows))
+
+    # The two paths must produce the same records
+    legacy_body = client.get("/legacy").json()
+    typed_body = client.get("/typed").json()
+    if len(legacy_body) != len(typed_body) or legacy_body[0]["quantity"] != typed_body[0]["quantity"]:
+        print("FAIL: legacy and typed listings differ")
+        return 1
+
+    legacy, legacy_size = measure(client, "/legacy", args.runs)
+    typed, typed_size = measure(client, "/typed", args.runs)
+    print(f"{args.rows} rows, median of {args.runs} runs")
+    print(f"  legacy: {legacy * 1000:8.1f} ms  ({legacy_size / 1e6:.1f} MB)")
+    print(f"  typed:  {typed * 1000:8.1f} ms  ({typed_size / 1e6:.1f} MB)")
+    print(f"  speedup: {legacy / typed:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Cold-start benchmark for the API.
+
+Imports app.main in fresh interpreters (no warm module cache) and fails if the
+median exceeds the budget, or if a lazily-loaded dependency was pulled in at
+startup. Run from backend/:
+
+    python scripts/bench_startup.py [--runs 5] [--budget 2.0]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS", "2.0"))
+
+# Heavy modules that must only load on first use, never at import time
+LAZY_MODULES = ["pandas", "numpy", "openpyxl", "pyarrow", "duckdb"]
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+loaded = [m for m in {lazy!r} if m in sys.modules]
+print(f"{{elapsed:.6f}} {{','.join(loaded)}}")
+"""
+
+
+def measure_once() -> tuple:
+    env = {**os.environ, "PYTHONPATH": str(BACKEND_DIR), "PYTHONDONTWRITEBYTECODE": "1"}
+    env.setdefault("DATABASE_URL", "sqlite:///./startup-bench.db")
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(lazy=LAZY_MODULES)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    elapsed, _, loaded = result.stdout.strip().rpartition("\n")[-1].partition(" ")
+    return float(elapsed), [m for m in loaded.split(",") if m]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SECONDS)
+    args = parser.parse_args()
+
+    timings, eager = [], set()
+    for _ in range(args.runs):
+        elapsed, loaded = measure_once()
+        timings.append(elapsed)
+        eager.update(loaded)
+
+    median = statistics.median(timings)
+    print(f"import app.main: median {median:.3f}s, min {min(timings):.3f}s, "
+          f"max {max(timings):.3f}s over {args.runs} runs (budget {args.budget:.2f}s)")
+
+    failed = False
+    if median > args.budget:
+        print(f"FAIL: cold start exceeds budget by {median - args.budget:.3f}s")
+        failed = True
+    if eager:
+        print(f"FAIL: loaded eagerly at startup: {', '.join(sorted(eager))}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
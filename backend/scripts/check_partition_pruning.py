@@ -0,0 +1,90 @@
+"""
+Partition pruning check for the yearly-partitioned history tables.
+
+EXPLAINs the month- and range-bounded queries the payroll, dairy and analytics
+code runs and fails unless Postgres plans them against that year's partition
+only. Needs a migrated Postgres database (python -m app.init_db). Run from
+backend/:
+
+    DATABASE_URL=postgresql://... python scripts/check_partition_pruning.py
+"""
+import json
+import sys
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import func, text  # noqa: E402
+from sqlmodel import select  # noqa: E402
+from app.core.partitions import ensure_partitions, partition_name  # noqa: E402
+from app.database import engine  # noqa: E402
+from app.models import MilkRecord, TeaPlucking  # noqa: E402
+
+
+def scanned_relations(conn, statement) -> set:
+    """Relations the planner will read for ``statement``"""
+    sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    relations, nodes = set(), [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if "Relation Name" in node:
+            relations.add(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return relations
+
+
+def checks(year: int):
+    month_start = datetime(year, 3, 1)
+    month_end = datetime(year, 4, 1)
+    week_start = datetime.combine(date(year, 6, 1), time.min)
+    yield (
+        "payroll month (teaplucking)",
+        select(TeaPlucking).where(
+            TeaPlucking.worker_id == 1,
+            TeaPlucking.date >= month_start,
+            TeaPlucking.date < month_end,
+        ),
+        {partition_name("teaplucking", year)},
+    )
+    yield (
+        "worker stats window (teaplucking)",
+        select(TeaPlucking.worker_id, func.sum(TeaPlucking.quantity))
+        .where(TeaPlucking.date >= week_start, TeaPlucking.date < week_start + timedelta(days=7))
+        .group_by(TeaPlucking.worker_id),
+        {partition_name("teaplucking", year)},
+    )
+    yield (
+        "milk records range (milkrecord)",
+        select(MilkRecord).where(
+            MilkRecord.cow_id == 1,
+            MilkRecord.date_recorded >= month_start,
+            MilkRecord.date_recorded < month_end,
+        ),
+        {partition_name("milkrecord", year)},
+    )
+
+
+def main() -> int:
+    if engine.dialect.name != "postgresql":
+        print("SKIP: partitioning only applies to Postgres")
+        return 0
+
+    ensure_partitions(engine)
+    year = date.today().year
+    failed = False
+    with engine.connect() as conn:
+        for label, statement, expected in checks(year):
+            scanned = scanned_relations(conn, statement)
+            ok = scanned == expected
+            failed |= not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {label}: scans {', '.join(sorted(scanned)) or 'nothing'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,30 @@
 
 // Service Worker for C. Sambu Farm Manager PWA
 const CACHE_NAME = 'cs-farm-v1';
+const API_CACHE_NAME = 'cs-farm-api-v1';
+
+// Backend routes whose reads are served stale-while-revalidate and whose
+// writes invalidate them. The API sends weak ETags, so revalidation is usually
+// a body-less 304.
+const API_PREFIXES = [
+    '/staff/', '/factories/', '/teaplucking/', '/advances/', '/payroll/',
+    '/bonus/', '/fertilizer/', '/avocado/', '/dairy/', '/poultry/',
+    '/dogs/', '/finance/', '/inventory/', '/import/',
+];
+
+// Reads a write to a resource also makes stale: lists that join its names,
+// balances and payrolls it feeds, and the ledger it posts to
+const DEPENDENTS = {
+    '/staff/': ['/teaplucking/', '/advances/', '/payroll/'],
+    '/factories/': ['/teaplucking/', '/fertilizer/', '/bonus/'],
+    '/teaplucking/': ['/staff/', '/payroll/', '/finance/'],
+    '/advances/': ['/staff/', '/payroll/', '/finance/'],
+    '/payroll/': ['/staff/', '/advances/', '/finance/'],
+    '/bonus/': ['/fertilizer/', '/finance/'],
+    '/fertilizer/': ['/bonus/', '/finance/'],
+    '/avocado/': ['/finance/'],
+    '/import/': ['/staff/', '/teaplucking/', '/advances/', '/payroll/', '/finance/'],
+};
 const urlsToCache = [
     '/',
     '/index.html',
@@ -30,7 +54,7 @@ self.addEventListener('activate', (event) => {
         caches.keys().then((cacheNames) => {
             return Promise.all(
                 cacheNames.map((cacheName) => {
-                    if (cacheName !== CACHE_NAME) {
+                    if (cacheName !== CACHE_NAME && cacheName !== API_CACHE_NAME) {
                         console.log('Deleting old cache:', cacheName);
                         return caches.delete(cacheName);
                     }
@@ -41,8 +65,107 @@ self.addEventListener('activate', (event) => {
     self.clients.claim();
 });
 
-// Fetch event - serve from cache, fallback to network
+// Server-sent event streams never end, so they are never cached or answered
+// by the worker: the browser talks to the API directly
+const isEventStream = (request, url) =>
+    url.pathname.endsWith('/stream') ||
+    (request.headers.get('Accept') || '').includes('text/event-stream');
+
+const isApiRequest = (url) =>
+    url.origin !== self.location.origin &&
+    API_PREFIXES.some((prefix) => (url.pathname + '/').startsWith(prefix));
+
+// Tell open pages that a cached API response they were given has changed
+const notifyUpdated = async (url) => {
+    const windows = await self.clients.matchAll({ type: 'window' });
+    windows.forEach((client) => client.postMessage({ type: 'api-updated', url }));
+};
+
+// Fetch from the network, revalidating the cached copy with its ETag
+const revalidate = async (cache, request, cached) => {
+    const headers = new Headers(request.headers);
+    const etag = cached && cached.headers.get('ETag');
+    if (etag) {
+        headers.set('If-None-Match', etag);
+    }
+
+    try {
+        const response = await fetch(request.url, {
+            headers,
+            mode: 'cors',
+            credentials: request.credentials,
+            cache: 'no-store',
+        });
+        if (response.status === 304 && cached) {
+            return cached;
+        }
+        const contentType = response.headers.get('Content-Type') || '';
+        if (response.ok && !contentType.includes('text/event-stream')) {
+            await cache.put(request, response.clone());
+            if (cached) {
+                notifyUpdated(request.url);
+            }
+        }
+        return response;
+    } catch (err) {
+        // Offline: fall back to whatever we had
+        if (cached) {
+            return cached;
+        }
+        throw err;
+    }
+};
+
+const staleWhileRevalidate = async (event) => {
+    const cache = await caches.open(API_CACHE_NAME);
+    const cached = await cache.match(event.request);
+    const network = revalidate(cache, event.request, cached);
+    if (cached) {
+        event.waitUntil(network);
+        return cached;
+    }
+    return network;
+};
+
+// A successful write makes every cached read under the same resource, and
+// under the resources that depend on it, stale
+const invalidateResource = async (url) => {
+    const resource = '/' + url.pathname.split('/')[1] + '/';
+    const stale = [resource, ...(DEPENDENTS[resource] || [])];
+    const cache = await caches.open(API_CACHE_NAME);
+    const keys = await cache.keys();
+    await Promise.all(
+        keys
+            .filter((key) => stale.some((prefix) => (new URL(key.url).pathname + '/').startsWith(prefix)))
+            .map((key) => cache.delete(key))
+    );
+};
+
+// Fetch event - API reads are stale-while-revalidate, writes invalidate them,
+// everything else is served from cache with a network fallback
 self.addEventListener('fetch', (event) => {
+    const url = new URL(event.request.url);
+    if (isEventStream(event.request, url)) {
+        return;
+    }
+    if (isApiRequest(url)) {
+        if (event.request.method === 'GET') {
+            event.respondWith(staleWhileRevalidate(event));
+        } else {
+            // The page re-fetches as soon as the write returns, so the cache
+            // is cleared before the response is handed over
+            event.respondWith(
+                fetch(event.request).then(async (response) => {
+                    if (response.ok) {
+                        await invalidateResource(url);
+                    }
+                    return response;
+                })
+            );
+        }
+        return;
+    }
+
     event.respondWith(
         caches.match(event.request)
             .then((response) => {
@@ -1 +0,0 @@
-// service worker placeholder; add caching strategies in production
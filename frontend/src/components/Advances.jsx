@@ -1,5 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import axios from 'axios'
+import { afterError, attempt, newSubmission } from '../services/idempotency'
+import { useApiUpdates } from '../services/apiUpdates'
 
 const API_BASE = 'http://localhost:8000'
 
@@ -15,9 +17,12 @@ export default function Advances() {
     notes: ''
   })
   const [loading, setLoading] = useState(true)
+  const [submission, setSubmission] = useState(newSubmission)
   const [filterMonth, setFilterMonth] = useState(new Date().getMonth() + 1)
   const [filterYear, setFilterYear] = useState(new Date().getFullYear())
 
+  useApiUpdates({ '/advances/': () => fetchAdvances(), '/staff/': () => fetchStaff() })
+
   useEffect(() => {
     fetchAdvances()
     fetchStaff()
@@ -47,16 +52,19 @@ export default function Advances() {
 
   const handleSubmit = async (e) => {
     e.preventDefault()
+    const current = attempt(submission)
+    setSubmission(current)
     try {
       await axios.post(`${API_BASE}/advances/`, {
         worker_id: parseInt(form.worker_id),
         amount: parseFloat(form.amount),
         month: parseInt(form.month),
         year: parseInt(form.year),
-        date: form.date ? new Date(form.date).toISOString() : new Date().toISOString(),
+        date: form.date ? new Date(form.date).toISOString() : current.at,
         deducted: false,
         notes: form.notes || null
-      })
+      }, { headers: { 'Idempotency-Key': current.key } })
+      setSubmission(newSubmission())
       setForm({
         worker_id: '',
         amount: 0,
@@ -68,6 +76,7 @@ export default function Advances() {
       fetchAdvances()
       alert('Advance recorded successfully!')
     } catch (error) {
+      setSubmission(afterError(error, current))
       console.error('Error adding advance:', error)
       alert('Error recording advance. Please check your input.')
     }
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react'
 import axios from 'axios'
+import { useApiUpdates } from '../services/apiUpdates'
 
 const API_BASE = 'http://localhost:8000'
 
@@ -26,6 +27,11 @@ export default function Avocado() {
     notes: ''
   })
 
+  // Stock bucket the sale is drawn from (sent as query params)
+  const [saleStock, setSaleStock] = useState({ variety: 'hass', grade: 'A' })
+
+  useApiUpdates({ '/avocado/': () => fetchData() })
+
   useEffect(() => {
     fetchData()
   }, [])
@@ -73,13 +79,13 @@ export default function Avocado() {
         quantity_kg: parseFloat(saleForm.quantity_kg),
         price_per_kg: parseFloat(saleForm.price_per_kg),
         date: saleForm.date ? new Date(saleForm.date).toISOString() : new Date().toISOString()
-      })
+      }, { params: saleStock })
       setSaleForm({ quantity_kg: 0, price_per_kg: 20, buyer_name: '', date: '', payment_status: 'pending', notes: '' })
       fetchData()
       alert('Sale recorded successfully!')
     } catch (error) {
       console.error('Error recording sale:', error)
-      alert('Error recording sale')
+      alert(error.response?.data?.detail || 'Error recording sale')
     }
   }
 
@@ -245,6 +251,24 @@ export default function Avocado() {
           <h2 className="farm-card-title">💰 Record Sale</h2>
         </div>
         <form onSubmit={handleSaleSubmit} className="farm-form">
+          <div className="farm-form-group">
+            <label className="farm-form-label">Variety / Grade</label>
+            <select 
+              className="farm-select"
+              value={`${saleStock.variety}:${saleStock.grade}`}
+              onChange={e => {
+                const [variety, grade] = e.target.value.split(':')
+                setSaleStock({ variety, grade })
+              }}
+            >
+              {['hass', 'fuerte'].flatMap(variety => ['A', 'B', 'C'].map(grade => (
+                <option key={`${variety}:${grade}`} value={`${variety}:${grade}`}>
+                  {variety.charAt(0).toUpperCase() + variety.slice(1)} - Grade {grade}
+                </option>
+              )))}
+            </select>
+          </div>
+
           <div className="farm-form-group">
             <label className="farm-form-label">Quantity (kg)</label>
             <input
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react'
 import axios from 'axios'
+import { useApiUpdates } from '../services/apiUpdates'
 
 const API_BASE = 'http://localhost:8000'
 
@@ -16,6 +17,8 @@ export default function Bonus() {
   })
   const [loading, setLoading] = useState(true)
 
+  useApiUpdates({ '/bonus/': () => fetchBonuses(), '/factories/': () => fetchFactories() })
+
   useEffect(() => {
     fetchBonuses()
     fetchFactories()
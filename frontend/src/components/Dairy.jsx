@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react'
 import axios from 'axios'
+import { useApiUpdates } from '../services/apiUpdates'
 
 const API_BASE = 'http://localhost:8000'
 
@@ -8,6 +9,8 @@ export default function Dairy() {
   const [form, setForm] = useState({ type: 'milk', quantity: 0, date: '', notes: '' })
   const [loading, setLoading] = useState(true)
 
+  useApiUpdates({ '/dairy/': () => fetchRecords() })
+
   useEffect(() => {
     fetchRecords()
   }, [])
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react'
 import axios from 'axios'
+import { useApiUpdates } from '../services/apiUpdates'
 
 const API_BASE = 'http://localhost:8000'
 
@@ -16,10 +17,34 @@ export default function Dashboard() {
   const [factories, setFactories] = useState([])
   const [loading, setLoading] = useState(true)
 
+  useApiUpdates({ '/staff/': () => fetchDashboardData(), '/teaplucking/': () => fetchDashboardData(), '/factories/': () => fetchDashboardData() })
+
   useEffect(() => {
     fetchDashboardData()
   }, [])
 
+  // Live weigh-ins: each event carries the running totals of the days it touched
+  useEffect(() => {
+    const source = new EventSource(`${API_BASE}/teaplucking/stream`)
+    const now = new Date()
+    const today = [
+      now.getFullYear(),
+      String(now.getMonth() + 1).padStart(2, '0'),
+      String(now.getDate()).padStart(2, '0')
+    ].join('-')
+    const applyTotals = (event) => {
+      const day = JSON.parse(event.data).totals.find(t => t.date === today)
+      if (day) {
+        const kg = day.factories.reduce((sum, f) => sum + f.kg, 0)
+        setStats(prev => ({ ...prev, todayProduction: kg }))
+      }
+    }
+    source.addEventListener('totals', applyTotals)
+    source.addEventListener('weighin', applyTotals)
+    source.addEventListener('resync', () => fetchDashboardData())
+    return () => source.close()
+  }, [])
+
   const fetchDashboardData = async () => {
     setLoading(true)
     try {
@@ -1,5 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import axios from 'axios'
+import { useApiUpdates } from '../services/apiUpdates'
+import { ifMatch, isConflict } from '../services/versioning'
 
 const API_BASE = 'http://localhost:8000'
 
@@ -16,6 +18,8 @@ export default function Fertilizer() {
   })
   const [loading, setLoading] = useState(true)
 
+  useApiUpdates({ '/fertilizer/': () => { fetchPurchases(); fetchSummary() }, '/factories/': () => fetchFactories() })
+
   useEffect(() => {
     fetchPurchases()
     fetchFactories()
@@ -93,13 +97,19 @@ export default function Fertilizer() {
     }
   }
 
-  const markAsPaid = async (purchaseId) => {
+  const markAsPaid = async (purchase) => {
     try {
-      await axios.put(`${API_BASE}/fertilizer/${purchaseId}/mark-paid`)
+      await axios.put(`${API_BASE}/fertilizer/${purchase.id}/mark-paid`, null, { headers: ifMatch(purchase) })
       fetchPurchases()
       fetchSummary()
       alert('Purchase marked as paid!')
     } catch (error) {
+      if (isConflict(error)) {
+        fetchPurchases()
+        fetchSummary()
+        alert('This purchase was changed by someone else. The list has been reloaded; please check it and try again.')
+        return
+      }
       console.error('Error marking as paid:', error)
     }
   }
@@ -317,7 +327,7 @@ export default function Fertilizer() {
                       <div style={{display: 'flex', gap: '0.5rem', flexWrap: 'wrap'}}>
                         {!p.paid && (
                           <button 
-                            onClick={() => markAsPaid(p.id)}
+                            onClick={() => markAsPaid(p)}
                             className="farm-btn farm-btn-success"
                             style={{padding: '0.3rem 0.6rem', fontSize: '0.85rem'}}
                           >
@@ -223,6 +223,20 @@ function ImportData() {
                     </ul>
                   </div>
                 )}
+
+                {result.errors && result.errors.length > 0 && (
+                  <div className="farm-worker-list">
+                    <strong>Cells Left Out ({result.summary.cells_rejected}):</strong>
+                    <ul>
+                      {result.errors.map((row) => (
+                        <li key={`${row.row}-${row.kind}`}>
+                          Row {row.row} ({row.worker}{row.kind === 'advance' ? ', advance' : ''}):{' '}
+                          {row.cells.map(cell => `day ${cell.day} "${cell.value}" - ${cell.message}`).join('; ')}
+                        </li>
+                      ))}
+                    </ul>
+                  </div>
+                )}
               </div>
             ) : (
               <div>
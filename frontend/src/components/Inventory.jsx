@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react'
 import axios from 'axios'
+import { useApiUpdates } from '../services/apiUpdates'
 
 const API_BASE = 'http://localhost:8000'
 
@@ -8,6 +9,8 @@ export default function Inventory() {
   const [form, setForm] = useState({ item_name: '', quantity: 0, unit: '', category: '', notes: '' })
   const [loading, setLoading] = useState(true)
 
+  useApiUpdates({ '/inventory/': () => fetchItems() })
+
   useEffect(() => { fetchItems() }, [])
 
   const fetchItems = async () => {
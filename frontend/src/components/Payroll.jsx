@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react'
 import axios from 'axios'
 import jsPDF from 'jspdf'
 import 'jspdf-autotable'
+import { useApiUpdates } from '../services/apiUpdates'
 
 const API_BASE = 'http://localhost:8000'
 
@@ -12,6 +13,8 @@ export default function Payroll() {
   const [year, setYear] = useState(new Date().getFullYear())
   const [loading, setLoading] = useState(false)
 
+  useApiUpdates({ '/payroll/': () => fetchPayroll() })
+
   useEffect(() => {
     fetchPayroll()
   }, [month, year])
@@ -37,7 +40,7 @@ export default function Payroll() {
   const calculatePayroll = async () => {
     setLoading(true)
     try {
-      await axios.get(`${API_BASE}/payroll/calculate/${month}/${year}`)
+      await axios.post(`${API_BASE}/payroll/calculate/${month}/${year}`)
       alert('Payroll calculated successfully!')
       fetchPayroll()
     } catch (error) {
@@ -256,6 +259,14 @@ export default function Payroll() {
               📄 Export PDF Report
             </button>
           )}
+          <a 
+            href={`${API_BASE}/payroll/export/${month}/${year}`}
+            className="farm-btn farm-btn-secondary"
+            style={{marginLeft: payroll.length > 0 ? '0.5rem' : 'auto'}}
+            download
+          >
+            📊 Export Workbook
+          </a>
         </div>
 
         {payroll.length === 0 ? (
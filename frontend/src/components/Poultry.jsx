@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react'
 import axios from 'axios'
+import { useApiUpdates } from '../services/apiUpdates'
 
 const API_BASE = 'http://localhost:8000'
 
@@ -8,6 +9,8 @@ export default function Poultry() {
   const [form, setForm] = useState({ type: 'eggs', quantity: 0, date: '', notes: '' })
   const [loading, setLoading] = useState(true)
 
+  useApiUpdates({ '/poultry/': () => fetchRecords() })
+
   useEffect(() => {
     fetchRecords()
   }, [])
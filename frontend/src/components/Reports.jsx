@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react'
 import axios from 'axios'
 import jsPDF from 'jspdf'
 import 'jspdf-autotable'
+import { useApiUpdates } from '../services/apiUpdates'
 
 const API_BASE = 'http://localhost:8000'
 
@@ -22,6 +23,8 @@ export default function Reports() {
     staff: []
   })
 
+  useApiUpdates({ '/teaplucking/': () => fetchAllData(), '/staff/': () => fetchAllData(), '/fertilizer/': () => fetchAllData() })
+
   useEffect(() => {
     fetchAllData()
   }, [dateRange])
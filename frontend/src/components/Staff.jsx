@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react'
 import axios from 'axios'
+import { useApiUpdates } from '../services/apiUpdates'
 
 const API_BASE = 'http://localhost:8000'
 
@@ -8,6 +9,8 @@ export default function Staff() {
   const [form, setForm] = useState({ name: '', role: '', pay_type: 'monthly', pay_rate: 0 })
   const [loading, setLoading] = useState(true)
 
+  useApiUpdates({ '/staff/': () => fetchStaff() })
+
   useEffect(() => {
     fetchStaff()
   }, [])
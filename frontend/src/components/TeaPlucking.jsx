@@ -1,5 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import axios from 'axios'
+import { afterError, attempt, newSubmission } from '../services/idempotency'
+import { useApiUpdates } from '../services/apiUpdates'
 
 const API_BASE = 'http://localhost:8000'
 
@@ -9,6 +11,9 @@ export default function TeaPlucking() {
   const [factories, setFactories] = useState([])
   const [form, setForm] = useState({ worker_id: '', factory_id: '', quantity: 0, date: '', comment: '' })
   const [loading, setLoading] = useState(true)
+  const [submission, setSubmission] = useState(newSubmission)
+
+  useApiUpdates({ '/teaplucking/': () => fetchRecords(), '/staff/': () => fetchStaff(), '/factories/': () => fetchFactories() })
 
   useEffect(() => {
     fetchRecords()
@@ -48,17 +53,21 @@ export default function TeaPlucking() {
 
   const handleSubmit = async (e) => {
     e.preventDefault()
+    const current = attempt(submission)
+    setSubmission(current)
     try {
       await axios.post(`${API_BASE}/teaplucking/`, {
         worker_id: parseInt(form.worker_id),
         factory_id: parseInt(form.factory_id),
         quantity: parseFloat(form.quantity),
-        date: form.date ? new Date(form.date).toISOString() : new Date().toISOString(),
+        date: form.date ? new Date(form.date).toISOString() : current.at,
         comment: form.comment || null
-      })
+      }, { headers: { 'Idempotency-Key': current.key } })
+      setSubmission(newSubmission())
       setForm({ worker_id: '', factory_id: '', quantity: 0, date: '', comment: '' })
       fetchRecords()
     } catch (error) {
+      setSubmission(afterError(error, current))
       console.error('Error adding tea plucking record:', error)
       alert('Error adding record. Please check your input.')
     }
@@ -0,0 +1,28 @@
+// The service worker answers API reads from its cache and fetches a fresh copy
+// behind them. When that copy differs it posts { type: 'api-updated', url } to
+// the open pages, which re-fetch whatever they show from that resource.
+import { useEffect, useRef } from 'react'
+
+// `refetchers` maps resource prefixes ('/staff/', '/teaplucking/') to the
+// function that reloads the page's data from them
+export const useApiUpdates = (refetchers) => {
+    const latest = useRef(refetchers)
+    latest.current = refetchers
+
+    useEffect(() => {
+        if (!('serviceWorker' in navigator)) {
+            return undefined
+        }
+        const onMessage = (event) => {
+            if (!event.data || event.data.type !== 'api-updated') {
+                return
+            }
+            const path = new URL(event.data.url).pathname + '/'
+            Object.entries(latest.current)
+                .filter(([prefix]) => path.startsWith(prefix))
+                .forEach(([, refetch]) => refetch())
+        }
+        navigator.serviceWorker.addEventListener('message', onMessage)
+        return () => navigator.serviceWorker.removeEventListener('message', onMessage)
+    }, [])
+}
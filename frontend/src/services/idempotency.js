@@ -0,0 +1,19 @@
+// Idempotency keys for POSTs that a dropped connection may make the user resend.
+// The backend answers a retry carrying the same key with its first response
+// instead of recording the entry twice, so a resend must repeat the first
+// attempt exactly: same key, same default timestamp.
+
+const newKey = () =>
+    (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        // randomUUID needs a secure context, and the app is also opened over plain http on the farm LAN
+        : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+
+// `at` is fixed by the first attempt and reused by resends
+export const newSubmission = () => ({ key: newKey(), at: null });
+
+export const attempt = (submission) => ({ ...submission, at: submission.at || new Date().toISOString() });
+
+// Start afresh once the server has answered; after a network failure the
+// entry may already be saved, so keep the submission for the resend
+export const afterError = (error, submission) => (error.response ? newSubmission() : submission);
@@ -0,0 +1,8 @@
+// Optimistic concurrency for edits. Every record the API lists carries a
+// `version`; an edit sends it back as If-Match and the backend refuses it
+// with 409 if someone changed the record since, instead of silently
+// overwriting their change with this (possibly offline, stale) copy.
+
+export const ifMatch = (record) => ({ 'If-Match': `W/"${record.version}"` })
+
+export const isConflict = (error) => Boolean(error.response && error.response.status === 409)